@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Per-water running aggregates for the summary stats.
+
+Lifetime figures only change when a water gets new records, so instead of
+recomputing them from every record on every build this keeps, per water:
+
+    sig         signature(): [record count, chained digest up to the newest
+                record, chained digest of the records before it]
+    fish        lifetime fish total
+    species     {species: [count, newest ordinal, position within that day]}
+    months      {month: [count, newest ordinal, position within that day]}
+    hatcheries  sorted hatchery names
+    days        [[date ordinal, records that day], ...] ascending
+    length_sum  exact sum of length midpoints as [numerator, denominator]
+    length_n    number of records with a length
+    horizon     first ordinal kept in the tail
+    tail        [[ordinal, species, quantity, length midpoint], ...] for
+                records on or after the horizon, in record order
+
+The (ordinal, position) pairs reproduce generate_summary_stats()'s
+first-seen dict order; the tail answers the 6-month "recent" figures. A water
+whose records were only prepended (a new report, newer than anything it had)
+is updated from the new records alone; any other change rebuilds that water,
+from the columnar snapshot's parsed columns when the caller has one
+(columnar.py; the pipeline does).
+
+State is kept in .build_cache/aggregates.json.
+
+Usage:
+    python aggregates.py [stocking_data.json]   # update the state and check it against generate_summary_stats
+"""
+
+import hashlib
+import inspect
+import json
+import math
+import os
+import sys
+from datetime import datetime, date
+from fractions import Fraction
+
+from json_writer import write_json
+from stats_engine import parse_date, parse_quantity, parse_length, recent_cutoff
+
+STATE_FILE = os.path.join(".build_cache", "aggregates.json")
+STATE_VERSION = 3
+
+
+def _link(digest, record):
+    """Digest of `record` chained onto `digest`, the chained digest of the records older than it."""
+    return hashlib.sha1((digest + json.dumps(record, sort_keys=True)).encode('utf-8')).hexdigest()[:20]
+
+
+def extend_signature(sig, new_records):
+    """The signature once `new_records` (newest first) are added at the front; O(new records)."""
+    count, digest, before = sig
+    for record in reversed(new_records):
+        before, digest = digest, _link(digest, record)
+    return [count + len(new_records), digest, before]
+
+
+def signature(records):
+    """
+    [record count, chained digest, chained digest without the newest record]
+    for `records` (newest first). Each record is hashed onto the digest of
+    the records older than it, so the digest covers the whole list, but
+    checking it again (signature_matches(), prepended_records()) hashes one
+    record. A change to an older record that leaves the count and the newest
+    record alone is not seen: published records do not change, and a
+    cleanup merge changes the count.
+    """
+    return extend_signature([0, "", ""], records)
+
+
+def signature_matches(sig, records):
+    """True if `records` still have signature `sig` (same count and newest record); O(1)."""
+    count, digest, before = sig
+    return count == len(records) and (not records or _link(before, records[0]) == digest)
+
+
+def prepended_records(sig, records):
+    """
+    The records added at the front of `records` since it had signature `sig`
+    (the record after them is the one that was newest), or None if anything
+    else changed (or nothing did).
+    """
+    count, digest, before = sig
+    added = len(records) - count
+    if added <= 0 or count == 0:
+        return None
+    if _link(before, records[added]) != digest:
+        return None
+    return records[:added]
+
+
+def _first_seen(entry, ordinal, position):
+    """Keep the (ordinal, position) that comes first in newest-first order."""
+    if ordinal > entry[1] or (ordinal == entry[1] and position < entry[2]):
+        entry[1], entry[2] = ordinal, position
+
+
+def _record_rows(records):
+    """(ordinal, month, species, quantity, hatchery, length) for each dated record, in record order."""
+    for r in records:
+        if 'date' not in r:
+            continue
+        ordinal, month = parse_date(r['date'])
+        if ordinal < 0:
+            continue
+        yield (ordinal, month, r.get('species', 'Unknown'), parse_quantity(r.get('quantity', 0)),
+               r.get('hatchery'), parse_length(r.get('length', '')))
+
+
+def _snapshot_rows(snapshot, w):
+    """_record_rows() of the records of water `w`, read from a columnar snapshot."""
+    start, end = snapshot["water_offsets"][w:w + 2].tolist()
+    tables = snapshot["tables"]
+    columns = [snapshot[name][start:end].tolist() for name in ("date", "month", "species", "quantity", "hatchery", "length")]
+    for ordinal, month, species, quantity, hatchery, length in zip(*columns):
+        if ordinal >= 0:
+            yield ordinal, month, tables["species"][species], quantity, tables["hatcheries"][hatchery], length
+
+
+def _accumulate(agg, rows):
+    """
+    Fold `rows` (_record_rows(), in record order) into `agg`. Their dates must
+    all be new to `agg`, which holds for a fresh aggregate and for prepended
+    records newer than everything already counted.
+    """
+    day_counts = {}
+    hatcheries = set(agg["hatcheries"])
+    length_sum = Fraction(*agg["length_sum"])
+    tail = []
+    for ordinal, month, species, quantity, hatchery, length in rows:
+        position = day_counts.get(ordinal, 0)
+        day_counts[ordinal] = position + 1
+
+        for table, key in ((agg["species"], species), (agg["months"], str(month))):
+            entry = table.get(key)
+            if entry is None:
+                table[key] = [1, ordinal, position]
+            else:
+                entry[0] += 1
+                _first_seen(entry, ordinal, position)
+
+        agg["fish"] += quantity
+        if hatchery:
+            hatcheries.add(hatchery)
+        if math.isnan(length):
+            length = None
+        else:
+            length_sum += Fraction(length)
+            agg["length_n"] += 1
+        if ordinal >= agg["horizon"]:
+            tail.append([ordinal, species, quantity, length])
+
+    agg["hatcheries"] = sorted(hatcheries)
+    agg["length_sum"] = [length_sum.numerator, length_sum.denominator]
+    agg["days"] = agg["days"] + sorted([d, n] for d, n in day_counts.items())
+    agg["tail"] = tail + [t for t in agg["tail"] if t[0] >= agg["horizon"]]
+    return agg
+
+
+def build_aggregate(records, horizon, rows=None):
+    """Aggregate of `records`; `rows` are their _record_rows() if already at hand."""
+    agg = {"sig": signature(records), "fish": 0, "species": {}, "months": {}, "hatcheries": [],
+           "days": [], "length_sum": [0, 1], "length_n": 0, "horizon": horizon, "tail": []}
+    return _accumulate(agg, _record_rows(records) if rows is None else rows)
+
+
+def extend_aggregate(agg, records, horizon):
+    """
+    Bring `agg` up to date with `records` in O(new records) if the only change
+    since it was built is new records at the front, all newer than its latest
+    day. Returns None when that does not hold and the water needs a rebuild.
+    """
+    new_records = prepended_records(agg["sig"], records)
+    if new_records is None or horizon < agg["horizon"] or not agg["days"]:
+        return None
+    latest = agg["days"][-1][0]
+    if any('date' not in r or parse_date(r['date'])[0] <= latest for r in new_records):
+        return None
+    agg["horizon"] = horizon
+    agg["sig"] = extend_signature(agg["sig"], new_records)
+    return _accumulate(agg, _record_rows(new_records))
+
+
+def _lifetime_avg_length(agg, records):
+    """
+    round(sum(lengths) / n, 1) as generate_summary_stats() computes it: a
+    float sum, newest record first. The exact running sum rounds the same way
+    unless the mean is within float error of a rounding boundary; only then
+    are the water's `records` summed again.
+    """
+    n = agg["length_n"]
+    if not n:
+        return None
+    mean = Fraction(*agg["length_sum"]) / n
+    tenths = mean * 10
+    if abs(tenths - math.floor(tenths) - Fraction(1, 2)) > Fraction(1, 10 ** 6):
+        return round(float(mean), 1)
+    dated = [(parse_date(r['date'])[0], r) for r in records if 'date' in r]
+    dated.sort(key=lambda t: t[0], reverse=True)
+    lengths = [parse_length(r.get('length', '')) for ordinal, r in dated if ordinal >= 0]
+    lengths = [length for length in lengths if not math.isnan(length)]
+    return round(sum(lengths) / len(lengths), 1)
+
+
+def stats_from_aggregate(agg, now, records):
+    """Same dict as generate_summary_stats(records, now), or None."""
+    days = agg["days"]
+    if not days:
+        return None
+    cutoff = recent_cutoff(now)
+    if cutoff < agg["horizon"]:
+        raise ValueError("aggregate tail does not reach back to the recent window")
+
+    recent = sorted((t for t in agg["tail"] if t[0] >= cutoff), key=lambda t: t[0], reverse=True)
+    recent_species_counts = {}
+    for t in recent:
+        recent_species_counts[t[1]] = recent_species_counts.get(t[1], 0) + 1
+    recent_lengths = [t[3] for t in recent if t[3] is not None]
+
+    def first_seen_order(table):
+        return sorted(table.items(), key=lambda kv: (-kv[1][1], kv[1][2]))
+
+    months = sorted(first_seen_order(agg["months"]), key=lambda kv: kv[1][0], reverse=True)
+    most_recent, earliest = days[-1][0], days[0][0]
+    return {
+        'total_stockings': agg["sig"][0],
+        'total_fish': agg["fish"],
+        'species_counts': {name: entry[0] for name, entry in first_seen_order(agg["species"])},
+        'hatcheries': list(agg["hatcheries"]),
+        'most_recent': date.fromordinal(most_recent).strftime('%Y-%m-%d'),
+        'earliest': date.fromordinal(earliest).strftime('%Y-%m-%d'),
+        'recent_stockings': len(recent),
+        'recent_fish': sum(t[2] for t in recent),
+        'recent_species_counts': recent_species_counts,
+        'recent_avg_length': round(sum(recent_lengths) / len(recent_lengths), 1) if recent_lengths else None,
+        'days_since_last': now.toordinal() - most_recent,
+        'avg_days_between': round((most_recent - earliest) / (len(days) - 1)) if len(days) >= 2 else None,
+        'peak_months': [int(m) for m, _ in months[:3]],
+        'lifetime_avg_length': _lifetime_avg_length(agg, records),
+    }
+
+
+def _rules_hash():
+    source = "".join(inspect.getsource(f) for f in (_accumulate, _record_rows, _snapshot_rows,
+                                                    parse_date, parse_quantity, parse_length))
+    return hashlib.sha256(f"{STATE_VERSION}:{source}".encode('utf-8')).hexdigest()
+
+
+def load_state(path=STATE_FILE):
+    """Saved aggregates, or {} if missing, unreadable or built by other code."""
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(state, dict) or state.get("rules") != _rules_hash():
+        return {}
+    return state
+
+
+def save_state(state, path=STATE_FILE):
+    return write_json(path, state, inline_depth=2)
+
+
+def update_aggregates(state, data, now=None, snapshot=None):
+    """
+    Bring the aggregates in `state` up to date with `data`. Waters that need a
+    rebuild are read from `snapshot` (columnar.load_snapshot() of `data`) when
+    given, instead of parsing their records again.
+    Returns (new_state, {water name: stats}, {"unchanged"/"extended"/"rebuilt": count}).
+    """
+    now = now or datetime.now()
+    horizon = recent_cutoff(now)
+    previous = state.get("waters", {})
+    if snapshot is not None and snapshot["tables"]["waters"] != list(data):
+        snapshot = None
+    index = {name: w for w, name in enumerate(data)}
+    waters, stats = {}, {}
+    counts = {"unchanged": 0, "extended": 0, "rebuilt": 0}
+    for name, water in data.items():
+        records = water.get("records", [])
+        agg = previous.get(name)
+        if agg is not None and signature_matches(agg["sig"], records) and horizon >= agg["horizon"]:
+            agg["horizon"] = horizon
+            agg["tail"] = [t for t in agg["tail"] if t[0] >= horizon]
+            counts["unchanged"] += 1
+        else:
+            agg = extend_aggregate(agg, records, horizon) if agg is not None else None
+            if agg is not None:
+                counts["extended"] += 1
+            else:
+                rows = _snapshot_rows(snapshot, index[name]) if snapshot is not None else None
+                agg = build_aggregate(records, horizon, rows)
+                counts["rebuilt"] += 1
+        waters[name] = agg
+        stats[name] = stats_from_aggregate(agg, now, records)
+    return {"rules": _rules_hash(), "waters": waters}, stats, counts
+
+
+def main():
+    from scraper import generate_summary_stats
+    source = sys.argv[1] if len(sys.argv) > 1 else "stocking_data.json"
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    now = datetime.now()
+    state, stats, counts = update_aggregates(load_state(), data, now)
+    save_state(state)
+    print(f"{STATE_FILE}: {counts['unchanged']} unchanged, {counts['extended']} extended, "
+          f"{counts['rebuilt']} rebuilt")
+    mismatched = [name for name, water in data.items()
+                  if json.dumps(stats[name]) != json.dumps(generate_summary_stats(water.get("records", []), now))]
+    if mismatched:
+        print(f"{len(mismatched)} water(s) differ from generate_summary_stats(): {mismatched[:10]}")
+        return 1
+    print(f"Aggregated stats match generate_summary_stats() for all {len(data)} waters")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
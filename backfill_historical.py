@@ -10,6 +10,19 @@ This script:
 
 Run this manually when historical data gaps are detected.
 
+Crash-safe and resumable:
+  Every report's new records are appended to the journal as soon as it is
+  parsed, and every CHECKPOINT_EVERY reports (or CHECKPOINT_SECONDS) the
+  journal is compacted into stocking_data_clean.json and the set of attempted
+  reports is saved to backfill_checkpoint.json. Rerunning after a crash or a
+  timeout picks up where the last run stopped. A long backfill can be split
+  across scheduled runs:
+
+    python backfill_historical.py --max-reports 40
+    python backfill_historical.py --time-budget 1500     # seconds
+    python backfill_historical.py --retry-failed         # re-attempt unparseable PDFs
+    python backfill_historical.py --restart              # ignore the checkpoint
+
 Known parser limitation (older 2022 PDFs):
   When a large stocking's weight column wraps to the next line alongside
   "(PARKVIEW)", the parser misreads the length field as "HATCHERY" and
@@ -18,28 +31,63 @@ Known parser limitation (older 2022 PDFs):
   this wrapping case before running.
 """
 
+import argparse
 import json
 import re
-import shutil
 import os
+import time
 import requests
 from datetime import datetime
+import record_journal
+from json_writer import write_json
 from scraper import (
     get_pdf_links_for_rebuild,
     extract_text_from_pdf,
     final_parser,
     enrich_data_with_coordinates,
+    merge_water_records,
     generate_static_pages,
     generate_sitemap,
     ARCHIVE_PAGE_URL,
     OUTPUT_FILE,
-    BACKUP_FILE,
     OUTPUT_DIR,
     MANUAL_COORDS_FILE
 )
 
 CLEAN_DATA_FILE = "stocking_data_clean.json"
 REPORTS_DIR = "public/reports"
+CHECKPOINT_FILE = "backfill_checkpoint.json"
+CHECKPOINT_EVERY = 10      # reports
+CHECKPOINT_SECONDS = 120
+
+
+def normalize_url(url):
+    return url.split('&refresh=')[0].split('?refresh=')[0]
+
+
+def load_checkpoint(path=CHECKPOINT_FILE):
+    """Attempted reports from an interrupted run: {normalized_url: status}."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f).get("attempted", {})
+    except (ValueError, AttributeError):
+        print(f"  [!] {path} is unreadable, ignoring it")
+        return {}
+
+
+def save_checkpoint(final_data, attempted, path=CHECKPOINT_FILE):
+    """
+    Make everything merged so far durable in the snapshot and record which
+    reports were attempted. Both files are replaced atomically, snapshot first,
+    so a crash in between only means a few reports are looked at again.
+    """
+    record_journal.compact(final_data, CLEAN_DATA_FILE)
+    write_json(path, {
+        "updated": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "attempted": attempted,
+    })
 
 
 def is_valid_length(length_str):
@@ -80,7 +128,14 @@ def download_pdf(url, filename):
         return False
 
 
-def backfill():
+def backfill(max_reports=None, time_budget=None, retry_failed=False, restart=False):
+    """
+    Parse and merge every archived report that is not in the dataset yet.
+
+    Stops early after `max_reports` reports or once `time_budget` seconds have
+    elapsed; rerunning continues from the checkpoint.
+    """
+    started = time.monotonic()
     print("=" * 80)
     print("HISTORICAL BACKFILL")
     print(f"Run time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -90,15 +145,12 @@ def backfill():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
     # Load existing clean data
-    print(f"\nLoading existing data from {CLEAN_DATA_FILE}...")
-    try:
-        with open(CLEAN_DATA_FILE, 'r') as f:
-            final_data = json.load(f)
-        total_existing = sum(len(v['records']) for v in final_data.values())
-        print(f"Loaded {len(final_data)} water bodies, {total_existing} total records")
-    except FileNotFoundError:
-        print("No existing data found, starting fresh")
-        final_data = {}
+    print(f"\nLoading existing data from {CLEAN_DATA_FILE} + {record_journal.JOURNAL_FILE}...")
+    if not os.path.exists(CLEAN_DATA_FILE):
+        print("No existing snapshot found, starting fresh")
+    final_data = record_journal.load_dataset(CLEAN_DATA_FILE)
+    total_existing = sum(len(v['records']) for v in final_data.values())
+    print(f"Loaded {len(final_data)} water bodies, {total_existing} total records")
 
     # Load manual coordinates
     manual_coords = {}
@@ -111,72 +163,95 @@ def backfill():
     for water_data in final_data.values():
         for record in water_data.get("records", []):
             if "reportUrl" in record:
-                url = record["reportUrl"].split('&refresh=')[0].split('?refresh=')[0]
-                processed_urls.add(url)
+                processed_urls.add(normalize_url(record["reportUrl"]))
     print(f"Already processed {len(processed_urls)} unique report URLs")
 
+    # Reports a previous run already looked at without getting records from
+    # them (nothing new, or unparseable) are skipped too
+    attempted = {} if restart else load_checkpoint()
+    if attempted:
+        print(f"Resuming from {CHECKPOINT_FILE}: {len(attempted)} reports already attempted")
+    skip_urls = processed_urls | {url for url, status in attempted.items()
+                                  if not (retry_failed and status == "failed")}
+
     # Crawl the full archive
     print(f"\nCrawling full NMDGF archive at {ARCHIVE_PAGE_URL}...")
     all_pdf_links = get_pdf_links_for_rebuild(ARCHIVE_PAGE_URL)
     print(f"Found {len(all_pdf_links)} total report URLs in archive")
 
     # Find unprocessed URLs
-    new_pdf_links = []
-    for link in all_pdf_links:
-        normalized = link.split('&refresh=')[0].split('?refresh=')[0]
-        if normalized not in processed_urls:
-            new_pdf_links.append(link)
+    new_pdf_links = [link for link in all_pdf_links if normalize_url(link) not in skip_urls]
 
     if not new_pdf_links:
         print("\nNo missing reports found - data is already complete!")
+        if os.path.exists(CHECKPOINT_FILE):
+            os.remove(CHECKPOINT_FILE)
         return
 
+    remaining_after_run = 0
+    if max_reports is not None and len(new_pdf_links) > max_reports:
+        remaining_after_run = len(new_pdf_links) - max_reports
+        new_pdf_links = new_pdf_links[:max_reports]
+        print(f"\n--max-reports {max_reports}: {remaining_after_run} reports left for later runs")
+
     print(f"\nFound {len(new_pdf_links)} reports not yet in the database:")
     for i, link in enumerate(new_pdf_links, 1):
         print(f"  {i}. {link}")
 
-    # Download missing PDFs to public/reports/
-    print(f"\n--- Downloading {len(new_pdf_links)} PDFs ---\n")
-    download_failures = []
-    for pdf_url in new_pdf_links:
-        try:
-            parts = pdf_url.split('/download/')[1].split('?')[0].strip('/')
-            filename = parts + '.pdf'
-            if not download_pdf(pdf_url, filename):
-                download_failures.append(pdf_url)
-        except Exception as e:
-            print(f"  [!] Could not process URL {pdf_url}: {e}")
-            download_failures.append(pdf_url)
-
-    if download_failures:
-        print(f"\nWarning: {len(download_failures)} PDFs failed to download:")
-        for url in download_failures:
-            print(f"  {url}")
-
-    # Parse and merge missing PDFs
+    # Download (to public/reports/), parse and merge missing PDFs one at a
+    # time, so the time budget covers the downloads too
     print("\n--- Processing Missing Reports ---\n")
+    download_failures = []
     new_records_count = 0
     skipped_malformed = 0
     parse_failures = []
+    changed_waters = set()
+    key_cache = {}
+    since_checkpoint = 0
+    last_checkpoint = time.monotonic()
 
     for i, link in enumerate(new_pdf_links, 1):
+        if time_budget is not None and time.monotonic() - started > time_budget:
+            remaining_after_run += len(new_pdf_links) - i + 1
+            print(f"\n--time-budget {time_budget:g}s used up; "
+                  f"{remaining_after_run} reports left for later runs")
+            break
+
+        if since_checkpoint >= CHECKPOINT_EVERY or time.monotonic() - last_checkpoint > CHECKPOINT_SECONDS:
+            save_checkpoint(final_data, attempted)
+            print(f"  Checkpoint saved ({len(attempted)} reports attempted)")
+            since_checkpoint = 0
+            last_checkpoint = time.monotonic()
+        since_checkpoint += 1
+
         print(f"[{i}/{len(new_pdf_links)}] {link}")
 
+        try:
+            filename = link.split('/download/')[1].split('?')[0].strip('/') + '.pdf'
+            if not download_pdf(link, filename):
+                download_failures.append(link)
+        except Exception as e:
+            print(f"  [!] Could not process URL {link}: {e}")
+            download_failures.append(link)
+
         raw_text = extract_text_from_pdf(link)
         if not raw_text:
             print(f"  [!] Failed to extract text - skipping")
             parse_failures.append(link)
+            attempted[normalize_url(link)] = "failed"
             continue
 
         parsed_data = final_parser(raw_text, link)
         if not parsed_data:
             print(f"  [!] No records parsed - PDF format may be unrecognized")
             parse_failures.append(link)
+            attempted[normalize_url(link)] = "failed"
             continue
 
         report_records = sum(len(v['records']) for v in parsed_data.values())
         print(f"  Parsed {len(parsed_data)} water bodies, {report_records} records")
 
+        report_added = {}
         for water_body, data in parsed_data.items():
             valid_records = []
             for rec in data['records']:
@@ -189,28 +264,38 @@ def backfill():
             if not valid_records:
                 continue
 
-            if water_body not in final_data:
-                final_data[water_body] = {"records": valid_records}
-                new_records_count += len(valid_records)
-            else:
-                existing_set = {json.dumps(rec, sort_keys=True) for rec in final_data[water_body]['records']}
-                added = 0
-                for new_record in valid_records:
-                    if json.dumps(new_record, sort_keys=True) not in existing_set:
-                        final_data[water_body]['records'].append(new_record)
-                        added += 1
-                        new_records_count += 1
+            added = merge_water_records(final_data, water_body, valid_records, key_cache)
+            if added:
+                new_records_count += len(added)
+                changed_waters.add(water_body)
+                report_added[water_body] = added
+
+        if report_added:
+            record_journal.append_batch(link, report_added)
+        attempted[normalize_url(link)] = "merged" if report_added else "empty"
 
     print(f"\n--- Processing Complete ---")
     print(f"New records added:      {new_records_count}")
     print(f"Malformed records skipped: {skipped_malformed}")
+    print(f"Water bodies changed:   {len(changed_waters)}")
     print(f"Total water bodies:     {len(final_data)}")
 
+    if download_failures:
+        print(f"\nWarning: {len(download_failures)} PDFs failed to download:")
+        for url in download_failures:
+            print(f"  {url}")
+
     if parse_failures:
         print(f"\nWarning: {len(parse_failures)} PDFs could not be parsed:")
         for url in parse_failures:
             print(f"  {url}")
 
+    if remaining_after_run:
+        save_checkpoint(final_data, attempted)
+        print(f"\nCheckpoint saved to {CHECKPOINT_FILE}; rerun to process the remaining {remaining_after_run} reports")
+    elif os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
+
     if new_records_count == 0:
         print("\nNo new records were added.")
         return
@@ -218,27 +303,12 @@ def backfill():
     # Enrich coordinates for any new water bodies
     final_data = enrich_data_with_coordinates(final_data, manual_coords)
 
-    # Sort records by date for each water body
-    for water_body in final_data:
-        unique_records = list({json.dumps(rec, sort_keys=True): rec for rec in final_data[water_body]['records']}.values())
-        unique_records.sort(key=lambda x: x['date'], reverse=True)
-        final_data[water_body]['records'] = unique_records
-
-    # Backup and save
+    # A backfill adds many batches at once, so fold them straight into the snapshot
     print(f"\nSaving updated data...")
-    if os.path.exists(CLEAN_DATA_FILE):
-        backup = CLEAN_DATA_FILE.replace('.json', '_backup.json')
-        shutil.copy(CLEAN_DATA_FILE, backup)
-        print(f"Backup saved: {backup}")
-
-    with open(CLEAN_DATA_FILE, "w") as f:
-        json.dump(final_data, f, indent=4)
-    print(f"Saved: {CLEAN_DATA_FILE}")
-
-    if os.path.exists(OUTPUT_FILE):
-        shutil.copy(OUTPUT_FILE, BACKUP_FILE)
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(final_data, f, indent=4)
+    record_journal.compact(final_data, CLEAN_DATA_FILE)
+    print(f"Saved: {CLEAN_DATA_FILE} (journal compacted)")
+
+    write_json(OUTPUT_FILE, final_data)
     print(f"Saved: {OUTPUT_FILE}")
 
     # Regenerate static pages and sitemap
@@ -248,15 +318,23 @@ def backfill():
 
     total_after = sum(len(v['records']) for v in final_data.values())
     print("\n" + "=" * 80)
-    print("BACKFILL COMPLETE!")
+    print("BACKFILL COMPLETE!" if not remaining_after_run else "BACKFILL PAUSED (rerun to continue)")
     print(f"Added {new_records_count} historical stocking records")
     print(f"Total: {len(final_data)} water bodies, {total_after} records")
     print("=" * 80)
     print("\nNext steps:")
-    print("  git add stocking_data_clean.json stocking_data.json public/")
+    checkpoint = f" {CHECKPOINT_FILE}" if remaining_after_run else ""
+    print(f"  git add stocking_data_clean.json stocking_data.json stocking_journal.jsonl{checkpoint} public/")
     print("  git commit -m 'Backfill historical stocking data'")
     print("  git push")
 
 
 if __name__ == "__main__":
-    backfill()
+    parser = argparse.ArgumentParser(description="Backfill historical stocking data from the NMDGF archive.")
+    parser.add_argument("--max-reports", type=int, help="Process at most this many reports, then checkpoint")
+    parser.add_argument("--time-budget", type=float, help="Stop starting new reports after this many seconds")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-attempt reports that failed to parse")
+    parser.add_argument("--restart", action="store_true", help=f"Ignore {CHECKPOINT_FILE}")
+    args = parser.parse_args()
+    backfill(max_reports=args.max_reports, time_budget=args.time_budget,
+             retry_failed=args.retry_failed, restart=args.restart)
@@ -0,0 +1,156 @@
+"""
+Minimal build graph: stages with declared dependencies, content-hash
+fingerprints and concurrent execution.
+
+Each Stage names the stages it depends on, an optional `fingerprint(ctx)`
+callable returning the things its result depends on (file paths via
+file_input(), in-memory data via data_input(), code via source_input(), or
+plain strings), and the files it writes. A stage is skipped when its
+fingerprint matches the one saved after its last successful run and all of
+its outputs still exist. Stages whose dependencies are done run concurrently
+in a thread pool (the slow ones are network or disk bound).
+
+Stages share state through the `ctx` dict; a skipped stage may provide
+`skip(ctx)` to load whatever downstream stages need from its outputs.
+Fingerprints are saved to .build_cache/build_graph.json.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from json_writer import dumps, write_json
+
+STATE_FILE = os.path.join(".build_cache", "build_graph.json")
+
+
+class Stage:
+    def __init__(self, name, run, deps=(), fingerprint=None, outputs=(), skip=None):
+        self.name = name
+        self.run = run
+        self.deps = tuple(deps)
+        self.fingerprint = fingerprint
+        self.outputs = tuple(outputs)
+        self.skip = skip
+
+
+def file_input(path):
+    """Fingerprint part for a file's content ("missing" if absent)."""
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    except OSError:
+        return f"file:{path}:missing"
+    return f"file:{path}:{h.hexdigest()}"
+
+
+def data_input(name, value):
+    """Fingerprint part for an in-memory JSON-compatible value."""
+    digest = hashlib.sha256(dumps(value, inline_depth=0).encode('utf-8')).hexdigest()
+    return f"data:{name}:{digest}"
+
+
+def source_input(obj):
+    """Fingerprint part for the source code of a module or function."""
+    digest = hashlib.sha256(inspect.getsource(obj).encode('utf-8')).hexdigest()
+    return f"source:{getattr(obj, '__name__', obj)}:{digest}"
+
+
+def _digest(parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def run_graph(stages, ctx, force=False, max_workers=4, state_path=STATE_FILE):
+    """
+    Run `stages` (a list of Stage) in dependency order.
+    Returns {name: (status, seconds)}, status being "ran", "skipped",
+    "failed" or "blocked" (a dependency failed).
+    """
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        missing = [d for d in s.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"Stage {s.name!r} depends on unknown stage(s) {missing}")
+
+    state = load_state(state_path)
+    new_state = dict(state)
+    lock = threading.Lock()
+    results = {}
+
+    def execute(stage):
+        start = time.perf_counter()
+        fingerprint = None
+        try:
+            if stage.fingerprint is not None:
+                fingerprint = _digest(stage.fingerprint(ctx))
+                outputs_exist = all(os.path.exists(p) for p in stage.outputs)
+                if not force and outputs_exist and state.get(stage.name) == fingerprint:
+                    if stage.skip:
+                        stage.skip(ctx)
+                    print(f"[{stage.name}] inputs unchanged, skipped")
+                    return "skipped", time.perf_counter() - start
+            stage.run(ctx)
+        except Exception:
+            print(f"[{stage.name}] FAILED")
+            traceback.print_exc()
+            return "failed", time.perf_counter() - start
+        if fingerprint is not None:
+            with lock:
+                new_state[stage.name] = fingerprint
+        return "ran", time.perf_counter() - start
+
+    pending = list(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for stage in list(pending):
+                dep_status = [results[d][0] for d in stage.deps if d in results]
+                if len(dep_status) < len(stage.deps):
+                    continue
+                pending.remove(stage)
+                if any(s in ("failed", "blocked") for s in dep_status):
+                    results[stage.name] = ("blocked", 0.0)
+                    with lock:
+                        new_state.pop(stage.name, None)
+                    continue
+                running[pool.submit(execute, stage)] = stage.name
+            if not running:
+                if pending and not any(all(d in results for d in s.deps) for s in pending):
+                    raise ValueError(f"Dependency cycle among {[s.name for s in pending]}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+    # Stages finish in any order; json_writer keeps top-level key order
+    write_json(state_path, dict(sorted(new_state.items())))
+    return results
+
+
+def print_timings(results, stages):
+    total = sum(seconds for _, seconds in results.values())
+    print(f"\n{'STAGE TIMINGS':=<80}")
+    for stage in stages:
+        status, seconds = results.get(stage.name, ("-", 0.0))
+        print(f"  {stage.name:<14} {status:<8} {seconds:>8.2f}s")
+    print(f"  {'total (sum)':<14} {'':<8} {total:>8.2f}s")
@@ -4,15 +4,30 @@ Clean up the stocking data by:
 1. Merging duplicate/similar water body names
 2. Removing malformed entries with hatchery names in water names
 3. Creating a clean master JSON file
+
+The raw-name -> normalized-name map and each name group's members are saved
+in .build_cache/cleanup_state.json. A daily run then only normalizes names it
+has not seen before, only re-merges groups whose members changed, and leaves
+the clean file alone when nothing changed. --full ignores the saved state.
 """
 
+import hashlib
+import inspect
 import json
+import os
 import re
+import sys
 from collections import defaultdict
 
+import record_journal
+from json_writer import write_json
+from scraper import record_key
+
 INPUT_FILE = "stocking_data.json"
 OUTPUT_FILE = "stocking_data_clean.json"
 BACKUP_FILE = "stocking_data_clean.json.bak"
+STATE_FILE = ".build_cache/cleanup_state.json"
+STATE_VERSION = 1
 
 def normalize_name(name):
     """Normalize a water body name for comparison."""
@@ -128,7 +143,7 @@ def merge_records(record_lists):
     for records in record_lists:
         for rec in records:
             # Create a unique key for deduplication
-            key = json.dumps(rec, sort_keys=True)
+            key = record_key(rec)
             if key not in seen:
                 seen.add(key)
                 merged.append(rec)
@@ -137,92 +152,158 @@ def merge_records(record_lists):
     merged.sort(key=lambda x: x['date'], reverse=True)
     return merged
 
-def cleanup_data():
-    """Main cleanup function."""
-    print("=" * 80)
-    print("CLEANING UP STOCKING DATA")
-    print("=" * 80)
-
-    # Load data
-    with open(INPUT_FILE, 'r') as f:
-        data = json.load(f)
-
-    print(f"\nOriginal: {len(data)} water bodies")
-
-    # Step 1: Group ALL names first (including malformed ones)
+def _rules_hash():
+    """Changes whenever the naming/merging rules are edited, invalidating saved state."""
+    source = "".join(inspect.getsource(f) for f in (normalize_name, is_malformed, find_best_name, merge_records))
+    return hashlib.sha256(f"{STATE_VERSION}:{source}".encode('utf-8')).hexdigest()
+
+def _signature(water):
+    """
+    Change check for one raw entry: a digest of every record's identity
+    (record_key()) in list order, so any added, removed, corrected or
+    reordered record is noticed, plus the coords.
+    """
+    records = water.get('records', [])
+    digest = hashlib.sha1(repr([record_key(r) for r in records]).encode('utf-8')).hexdigest()
+    return [len(records), digest, water.get('coords')]
+
+def _output_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+def load_state(path=STATE_FILE):
+    """Saved cleanup state, or {} if missing, unreadable or built with other rules."""
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(state, dict) or state.get("rules") != _rules_hash():
+        return {}
+    return state
+
+def merge_group(data, variations, malformed):
+    """
+    Merge one group of name variations.
+    Returns (best_name, water), or (None, None) if every variation is malformed.
+    """
+    print(f"\n  Merging {len(variations)} variations:")
+    for v in variations:
+        malformed_status = " [MALFORMED]" if malformed[v] else ""
+        print(f"    - \"{v}\" ({len(data[v]['records'])} records){malformed_status}")
+
+    # Pick best name (prefer non-malformed)
+    non_malformed = [v for v in variations if not malformed[v]]
+    if not non_malformed:
+        # All are malformed, skip this group entirely
+        print(f"  -> All variations are malformed, discarding")
+        return None, None
+    best_name = find_best_name(non_malformed)
+
+    print(f"  -> Using: \"{best_name}\"")
+
+    # Merge all records (including from malformed entries)
+    all_records = [data[v]['records'] for v in variations]
+    merged_records = merge_records(all_records)
+
+    for v in variations:
+        if malformed[v] and v != best_name:
+            print(f"  -> Rescued {len(data[v]['records'])} records from \"{v}\"")
+
+    # Use coords from any variation that has them (prefer non-malformed)
+    coords = None
+    for v in non_malformed:
+        if data[v].get('coords'):
+            coords = data[v]['coords']
+            break
+    if not coords:  # Try malformed if no coords found
+        for v in variations:
+            if data[v].get('coords'):
+                coords = data[v]['coords']
+                break
+
+    print(f"  -> Total: {len(merged_records)} unique records")
+    return best_name, {'records': merged_records, 'coords': coords}
+
+def clean(data, state):
+    """
+    Group, merge and filter `data` (a raw stocking dataset), reusing whatever
+    `state` (from load_state()) still applies.
+    Returns (final_data, new_state).
+    """
+    known_names = state.get("names", {})
+    prev_groups = state.get("groups", {})
+    prev_merged = state.get("merged", {})
+
+    # Step 1: Group ALL names first (including malformed ones). Only names
+    # never seen before go through the normalization regexes.
     print("\nStep 1: Grouping similar names (including malformed)...")
     grouped = defaultdict(list)
+    names = {}
+    new_names = 0
 
     for name in data.keys():
-        normalized = normalize_name(name)
-        grouped[normalized].append(name)
-
-    # Step 2: Merge duplicates and handle malformed entries
+        entry = known_names.get(name)
+        if entry is None:
+            entry = [normalize_name(name), is_malformed(name)]
+            new_names += 1
+        names[name] = entry
+        grouped[entry[0]].append(name)
+    malformed = {name: entry[1] for name, entry in names.items()}
+    print(f"  Normalized {new_names} new name(s), {len(data) - new_names} already known")
+
+    # Step 2: Merge duplicates and handle malformed entries. A group whose
+    # members have not changed since the last run reuses its saved merge.
     print("\nStep 2: Merging duplicates and rescuing malformed data...")
     final_data = {}
     merge_count = 0
+    remerged = 0
     malformed_rescued = []
     malformed_discarded = []
+    groups = {}
+    merged = {}
 
     for normalized, variations in grouped.items():
+        members = [[v, _signature(data[v])] for v in variations]
+        prev = prev_groups.get(normalized)
+        unchanged = prev is not None and prev["members"] == members
+
         if len(variations) > 1:
-            print(f"\n  Merging {len(variations)} variations:")
-            for v in variations:
-                malformed_status = " [MALFORMED]" if is_malformed(v) else ""
-                print(f"    - \"{v}\" ({len(data[v]['records'])} records){malformed_status}")
-
-            # Pick best name (prefer non-malformed)
-            non_malformed = [v for v in variations if not is_malformed(v)]
-            if non_malformed:
-                best_name = find_best_name(non_malformed)
+            if unchanged and (prev["best"] is None or prev["best"] in prev_merged):
+                best_name = prev["best"]
+                water = prev_merged.get(best_name)
             else:
-                # All are malformed, skip this group entirely
-                print(f"  -> All variations are malformed, discarding")
+                best_name, water = merge_group(data, variations, malformed)
+                remerged += 1
+            groups[normalized] = {"members": members, "best": best_name}
+
+            if best_name is None:
                 malformed_discarded.extend(variations)
                 continue
 
-            print(f"  -> Using: \"{best_name}\"")
-
-            # Merge all records (including from malformed entries)
-            all_records = [data[v]['records'] for v in variations]
-            merged_records = merge_records(all_records)
-
             # Track which malformed entries had their data rescued
-            for v in variations:
-                if is_malformed(v) and v != best_name:
-                    malformed_rescued.append(v)
-                    print(f"  -> Rescued {len(data[v]['records'])} records from \"{v}\"")
-
-            # Use coords from any variation that has them (prefer non-malformed)
-            coords = None
-            for v in non_malformed:
-                if data[v].get('coords'):
-                    coords = data[v]['coords']
-                    break
-            if not coords:  # Try malformed if no coords found
-                for v in variations:
-                    if data[v].get('coords'):
-                        coords = data[v]['coords']
-                        break
-
-            final_data[best_name] = {
-                'records': merged_records,
-                'coords': coords
-            }
-
+            malformed_rescued.extend(v for v in variations if malformed[v] and v != best_name)
+            final_data[best_name] = water
+            merged[best_name] = water
             merge_count += 1
-            print(f"  -> Total: {len(merged_records)} unique records")
         else:
             # Single entry - check if it's malformed
             name = variations[0]
-            if is_malformed(name):
-                print(f"\n  Discarding isolated malformed entry: \"{name}\"")
+            groups[normalized] = {"members": members, "best": None}
+            if malformed[name]:
+                if not unchanged:
+                    print(f"\n  Discarding isolated malformed entry: \"{name}\"")
                 malformed_discarded.append(name)
             else:
                 # No duplicates, just copy
                 final_data[name] = data[name]
+                groups[normalized]["best"] = name
 
-    print(f"\nMerged {merge_count} sets of duplicates")
+    print(f"\nRe-merged {remerged} changed group(s)")
+    print(f"Merged {merge_count} sets of duplicates")
     print(f"Malformed entries rescued: {len(malformed_rescued)}")
     print(f"Malformed entries discarded: {len(malformed_discarded)}")
     print(f"Final count: {len(final_data)} water bodies")
@@ -231,10 +312,69 @@ def cleanup_data():
     total_records = sum(len(v['records']) for v in final_data.values())
     print(f"Total records: {total_records}")
 
-    # Save cleaned data
-    print(f"\nSaving to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(final_data, f, indent=4)
+    new_state = {"rules": _rules_hash(), "names": names, "groups": groups, "merged": merged}
+    return final_data, new_state
+
+def save_cleaned(final_data, new_state, prev_state, force=False, path=OUTPUT_FILE, deferrable=True):
+    """
+    Save the cleanup state and, when due, write the clean snapshot (compacting
+    the journal). Returns True if the snapshot was written.
+
+    With `deferrable` (the data was loaded from the snapshot + journal, as in
+    the pipeline) the snapshot is only rewritten when the journal is due for
+    compaction (record_journal.needs_compaction()) or `force` is set: the
+    snapshot + journal replay to the same data, which is cleaned again on the
+    next run, so rewriting it every time a group changed (that is, on every
+    run that ingests a report) would only defeat the journal. Otherwise (the
+    data came from elsewhere) it is rewritten whenever a group changed or the
+    file on disk is not the one the previous state was saved alongside.
+    """
+    stamp = prev_state.get("output")
+    unchanged = (new_state["groups"] == prev_state.get("groups")
+                 and stamp and stamp == _output_stamp(path))
+    if deferrable:
+        due = force or record_journal.needs_compaction()
+    else:
+        due = force or not unchanged
+    if not due:
+        if unchanged:
+            print(f"\nNothing changed since the last cleanup; {path} left as is")
+        else:
+            print(f"\nCleanup state saved; {path} waits for the next journal compaction")
+            write_json(STATE_FILE, {**new_state, "output": _output_stamp(path)})
+        return False
+
+    # The new snapshot contains every journaled record, so this is a compaction
+    print(f"\nSaving to {path}...")
+    record_journal.compact(final_data, path)
+    write_json(STATE_FILE, {**new_state, "output": _output_stamp(path)})
+    return True
+
+def cleanup_data(full=False):
+    """Main cleanup function. `full` ignores the saved state and redoes every group."""
+    print("=" * 80)
+    print("CLEANING UP STOCKING DATA")
+    print("=" * 80)
+
+    # Load data
+    with open(INPUT_FILE, 'r') as f:
+        data = json.load(f)
+
+    # Fold in any journaled batches that never made it into INPUT_FILE (e.g. an
+    # update that crashed before saving); replay skips records already present.
+    replayed = record_journal.replay(data)
+    if replayed:
+        print(f"Replayed {replayed} journaled batch(es) from {record_journal.JOURNAL_FILE}")
+
+    print(f"\nOriginal: {len(data)} water bodies")
+
+    state = {} if full else load_state()
+    if state:
+        print(f"Using saved state from {STATE_FILE}")
+
+    final_data, new_state = clean(data, state)
+    # The data comes from INPUT_FILE, not the snapshot, so nothing can wait for compaction
+    save_cleaned(final_data, new_state, state, force=bool(replayed), deferrable=False)
 
     print("\n" + "=" * 80)
     print("CLEANUP COMPLETE!")
@@ -242,10 +382,8 @@ def cleanup_data():
     print(f"\nBefore: {len(data)} water bodies")
     print(f"After:  {len(final_data)} water bodies")
     print(f"Removed: {len(data) - len(final_data)} duplicates/malformed")
-    print(f"  - Rescued and merged: {len(malformed_rescued)} malformed entries")
-    print(f"  - Discarded: {len(malformed_discarded)} isolated malformed entries")
 
     return final_data
 
 if __name__ == "__main__":
-    cleanup_data()
+    cleanup_data(full="--full" in sys.argv)
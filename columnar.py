@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Columnar snapshot of the stocking dataset for analytics.
+
+stocking_data.json is nested dicts of strings, so every analysis has to
+json.load the whole file and loop over it in Python. This writes the
+stats_engine.build_arrays() columns of the same records as one NumPy array
+per column, which np.load(mmap_mode='r') maps in without parsing, plus a
+small JSON file holding the dictionary tables:
+
+    .build_cache/columnar/
+        water.npy         int64    index into tables["waters"]
+        date.npy          int64    date.toordinal(), -1 if unparseable
+        month.npy         int64    1-12, 0 if the date is unparseable
+        quantity.npy      int64    fish stocked, 0 if unparseable
+        length.npy        float64  inches (midpoint of "6-8"), NaN if unparseable
+        species.npy       int64    index into tables["species"]
+        hatchery.npy      int64    index into tables["hatcheries"] (null: none given)
+        report.npy        int64    index into tables["reports"], -1 if missing
+        water_offsets.npy int64    rows of water i are offsets[i]:offsets[i + 1]
+        tables.json
+
+Rows keep the dataset's order: waters in file order, each water's records
+newest first. The species and hatchery tables are in first-seen order, as
+build_arrays() makes them. The pipeline writes the snapshot once per run,
+and its stats, forecast and trends stages read their columns from it (see
+stats_engine.arrays_for()).
+
+Usage:
+    python columnar.py [stocking_data.json] [output_dir]
+
+    snap = columnar.load_snapshot()
+    fish_per_species = np.bincount(snap["species"], weights=snap["quantity"])
+"""
+
+import io
+import json
+import os
+import sys
+
+import stats_engine
+from json_writer import write_bytes, write_json
+from stats_engine import np
+
+SNAPSHOT_DIR = os.path.join(".build_cache", "columnar")
+SNAPSHOT_VERSION = 2
+
+COLUMNS = ("water", "date", "month", "quantity", "length", "species", "hatchery", "report")
+
+
+def build_columns(data):
+    """Return (columns, tables) for a stocking dataset dict."""
+    columns, tables = stats_engine.build_arrays(data)
+    urls = [r.get("reportUrl") for water in data.values() for r in water.get("records", [])]
+    reports = sorted({url for url in urls if url})
+    ids = {url: i for i, url in enumerate(reports)}
+    columns["report"] = np.array([ids.get(url, -1) for url in urls], dtype=np.int64)
+    sizes = [len(water.get("records", [])) for water in data.values()]
+    columns["water_offsets"] = np.concatenate(([0], np.cumsum(sizes, dtype=np.int64)))
+    return columns, {**tables, "reports": reports}
+
+
+def write_snapshot(data, out_dir=SNAPSHOT_DIR):
+    """
+    Write the columnar snapshot for `data`. Files whose bytes are unchanged are
+    left alone and columns no longer written are removed; tables.json goes
+    last, so a reader never sees new tables with stale columns. Returns the
+    number of files written or removed, or None without NumPy.
+    """
+    if np is None:
+        print("NumPy not installed; skipping columnar snapshot")
+        return None
+    columns, tables = build_columns(data)
+    written = 0
+    for name, array in columns.items():
+        buf = io.BytesIO()
+        np.save(buf, array, allow_pickle=False)
+        written += write_bytes(os.path.join(out_dir, f"{name}.npy"), buf.getvalue())
+    for filename in os.listdir(out_dir):
+        if filename.endswith(".npy") and filename[:-len(".npy")] not in columns:
+            os.remove(os.path.join(out_dir, filename))
+            written += 1
+    tables = {"version": SNAPSHOT_VERSION, "rows": int(columns["water_offsets"][-1]), **tables}
+    written += write_json(os.path.join(out_dir, "tables.json"), tables, inline_depth=1)
+    return written
+
+
+def load_snapshot(out_dir=SNAPSHOT_DIR, mmap_mode='r'):
+    """
+    Memory-map a snapshot written by write_snapshot(). Returns a dict of
+    arrays plus "tables". Raises ValueError if the files do not belong together.
+    """
+    if np is None:
+        raise ImportError("numpy is required to load the columnar snapshot")
+    with open(os.path.join(out_dir, "tables.json"), 'r', encoding='utf-8') as f:
+        tables = json.load(f)
+    if tables.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"{out_dir}: snapshot version {tables.get('version')}, expected {SNAPSHOT_VERSION}")
+    snap = {"tables": tables}
+    for name in COLUMNS + ("water_offsets",):
+        snap[name] = np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+        expected = len(tables["waters"]) + 1 if name == "water_offsets" else tables["rows"]
+        if len(snap[name]) != expected:
+            raise ValueError(f"{out_dir}: {name}.npy has {len(snap[name])} rows, expected {expected}")
+    return snap
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else "stocking_data.json"
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else SNAPSHOT_DIR
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    written = write_snapshot(data, out_dir)
+    if written is None:
+        return 1
+    print(f"Columnar snapshot of {source} in {out_dir} ({written} file(s) updated)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Dictionary-encoded copy of stocking_data.json for the browser.
+
+stocking_data.json repeats the same six keys on every record and spells out
+each ~100-byte report URL hundreds of times. The compact file keeps one
+entry per water with a column array per field, and moves every repeated
+string into a shared table:
+
+    {
+      "v": 1,
+      "species": [...], "hatcheries": [...], "lengths": [...], "reports": [...],
+      "waters": [
+        {"n": "<name>", "c": [lat, lon] | null,
+         "d": [days since 1970-01-01, ...],      # newest first, as in the JSON
+         "s": [species index, ...], "q": [quantity, ...], "l": [length index, ...],
+         "h": [hatchery index, ...], "r": [report index, ...]},
+        ...
+      ]
+    }
+
+Dates that are not ISO dates and quantities that are not plain integers are
+kept as strings, and "c" is omitted for waters without a coords key, so
+decode() gives back exactly the input. public/js/stocking-data.js is the
+browser-side decoder.
+
+Usage:
+    python compact_data.py [stocking_data.json] [public/data/stocking.min.json]
+"""
+
+import json
+import os
+import sys
+from datetime import date
+
+from json_writer import write_json
+
+COMPACT_FILE = os.path.join("public", "data", "stocking.min.json")
+FORMAT_VERSION = 1
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+RECORD_FIELDS = frozenset(("date", "species", "quantity", "length", "hatchery", "reportUrl"))
+
+# Record field -> (column key, shared table) for the dictionary-encoded fields
+ENCODED_FIELDS = (
+    ("species", "s", "species"),
+    ("length", "l", "lengths"),
+    ("hatchery", "h", "hatcheries"),
+    ("reportUrl", "r", "reports"),
+)
+
+
+def _encode_date(date_str):
+    try:
+        d = date.fromisoformat(date_str)
+    except (TypeError, ValueError):
+        return date_str
+    if d.isoformat() != date_str:
+        return date_str
+    return d.toordinal() - EPOCH_ORDINAL
+
+
+def _decode_date(value):
+    if isinstance(value, int):
+        return date.fromordinal(value + EPOCH_ORDINAL).isoformat()
+    return value
+
+
+def _encode_quantity(value):
+    if isinstance(value, str) and value.isdigit() and str(int(value)) == value:
+        return int(value)
+    return value
+
+
+def _decode_quantity(value):
+    return str(value) if isinstance(value, int) else value
+
+
+def encode(data):
+    """Encode a stocking dataset dict into the compact payload."""
+    values = {table: set() for _, _, table in ENCODED_FIELDS}
+    for water in data.values():
+        for r in water.get("records", []):
+            for field, _, table in ENCODED_FIELDS:
+                if field in r:
+                    values[table].add(r[field])
+    tables = {table: sorted(v) for table, v in values.items()}
+    ids = {table: {v: i for i, v in enumerate(t)} for table, t in tables.items()}
+
+    waters = []
+    for name in sorted(data):
+        water = data[name]
+        entry = {"n": name}
+        if "coords" in water:
+            coords = water["coords"]
+            if isinstance(coords, dict) and coords.keys() == {"lat", "lon"}:
+                coords = [coords["lat"], coords["lon"]]
+            entry["c"] = coords
+        extra = {k: v for k, v in water.items() if k not in ("records", "coords")}
+        if extra:
+            entry["x"] = extra
+
+        records = water.get("records", [])
+        if all(r.keys() == RECORD_FIELDS for r in records):
+            entry["d"] = [_encode_date(r["date"]) for r in records]
+            entry["q"] = [_encode_quantity(r["quantity"]) for r in records]
+            for field, key, table in ENCODED_FIELDS:
+                entry[key] = [ids[table][r[field]] for r in records]
+        else:
+            # Hand-edited records with other fields are shipped as-is
+            entry["R"] = records
+        waters.append(entry)
+
+    return {"v": FORMAT_VERSION, **tables, "waters": waters}
+
+
+def decode(payload):
+    """Inverse of encode(); mirrors decodeStockingData() in stocking-data.js."""
+    if payload.get("v") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact data version: {payload.get('v')}")
+    data = {}
+    for entry in payload["waters"]:
+        if "R" in entry:
+            records = entry["R"]
+        else:
+            records = []
+            for i, d in enumerate(entry["d"]):
+                records.append({
+                    "date": _decode_date(d),
+                    "species": payload["species"][entry["s"][i]],
+                    "quantity": _decode_quantity(entry["q"][i]),
+                    "length": payload["lengths"][entry["l"][i]],
+                    "hatchery": payload["hatcheries"][entry["h"][i]],
+                    "reportUrl": payload["reports"][entry["r"][i]],
+                })
+        water = {"records": records}
+        if "c" in entry:
+            c = entry["c"]
+            water["coords"] = {"lat": c[0], "lon": c[1]} if isinstance(c, list) else c
+        water.update(entry.get("x", {}))
+        data[entry["n"]] = water
+    return data
+
+
+def write_compact(data, path=COMPACT_FILE):
+    """Write the compact payload (single line, no whitespace). Returns True if it changed."""
+    return write_json(path, encode(data), inline_depth=0)
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else "stocking_data.json"
+    path = sys.argv[2] if len(sys.argv) > 2 else COMPACT_FILE
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    changed = write_compact(data, path)
+    size = os.path.getsize(path)
+    print(f"{path}: {size:,} bytes ({size / os.path.getsize(source):.0%} of {source})"
+          + ("" if changed else ", unchanged"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
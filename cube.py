@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Statewide aggregate cube: water x species x hatchery x year-month.
+
+Each cell holds [stockings, fish, length_sum, length_n] (length_sum in inches
+over the length_n records that have a length, so length_sum / length_n is the
+average size). Records whose date does not parse are left out.
+
+Per-water cells are kept in .build_cache/cube.json and, like aggregates.py,
+a water that only gained new records at the front is updated from those
+records alone. The roll-ups the home page's "Stocked So Far" summary reads
+are written to public/data/cube/ as compact JSON, each with its own
+dimension tables:
+
+    species_month.json       species, month
+    water_species_year.json  water, species, year
+
+A slice looks like
+    {"v": 1, "dims": ["species", "month"], "species": [...], "month": [...],
+     "fields": ["stockings", "fish", "length_sum", "length_n"],
+     "cells": [[species index, month index, stockings, fish, length_sum, length_n], ...]}
+
+Usage:
+    python cube.py [stocking_data.json]
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import sys
+from datetime import date
+
+from aggregates import signature, signature_matches, extend_signature, prepended_records
+from json_writer import write_json
+from stats_engine import parse_date, parse_quantity, parse_length
+
+STATE_FILE = os.path.join(".build_cache", "cube.json")
+STATE_VERSION = 3
+CUBE_DIR = os.path.join("public", "data", "cube")
+FORMAT_VERSION = 1
+
+FIELDS = ("stockings", "fish", "length_sum", "length_n")
+SLICES = {
+    "species_month": ("species", "month"),
+    "water_species_year": ("water", "species", "year"),
+}
+
+
+def _add_records(cells, records):
+    """Add `records` to one water's cells ({"species\\thatchery\\tmonth": [...]})."""
+    for r in records:
+        ordinal, _ = parse_date(r['date']) if 'date' in r else (-1, 0)
+        if ordinal < 0:
+            continue
+        key = "\t".join((r.get('species') or 'Unknown', r.get('hatchery') or '',
+                         date.fromordinal(ordinal).strftime('%Y-%m')))
+        cell = cells.setdefault(key, [0, 0, 0, 0])
+        cell[0] += 1
+        cell[1] += parse_quantity(r.get('quantity', 0))
+        length = parse_length(r.get('length', ''))
+        if length == length:  # not NaN
+            # Hundredths of an inch keep the running sum exact
+            cell[2] += round(length * 100)
+            cell[3] += 1
+    return cells
+
+
+def _rules_hash():
+    source = "".join(inspect.getsource(f) for f in (_add_records, parse_date, parse_quantity, parse_length))
+    return hashlib.sha256(f"{STATE_VERSION}:{source}".encode('utf-8')).hexdigest()
+
+
+def load_state(path=STATE_FILE):
+    """Saved per-water cells, or {} if missing, unreadable or built by other code."""
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(state, dict) or state.get("rules") != _rules_hash():
+        return {}
+    return state
+
+
+def update_cells(state, data):
+    """
+    Bring the per-water cells in `state` up to date with `data`.
+    Returns (new_state, {"unchanged"/"extended"/"rebuilt": count}).
+    """
+    previous = state.get("waters", {})
+    waters = {}
+    counts = {"unchanged": 0, "extended": 0, "rebuilt": 0}
+    for name, water in data.items():
+        records = water.get("records", [])
+        entry = previous.get(name)
+        if entry is not None and signature_matches(entry["sig"], records):
+            counts["unchanged"] += 1
+        else:
+            new_records = prepended_records(entry["sig"], records) if entry is not None else None
+            if new_records is not None:
+                entry = {"sig": extend_signature(entry["sig"], new_records),
+                         "cells": _add_records(entry["cells"], new_records)}
+                counts["extended"] += 1
+            else:
+                entry = {"sig": signature(records), "cells": _add_records({}, records)}
+                counts["rebuilt"] += 1
+        waters[name] = entry
+    return {"rules": _rules_hash(), "waters": waters}, counts
+
+
+def build_slices(state):
+    """{slice name: payload} for every entry in SLICES."""
+    rows = []
+    for water, entry in state["waters"].items():
+        for key, cell in entry["cells"].items():
+            species, hatchery, month = key.split("\t")
+            rows.append(({"water": water, "species": species, "hatchery": hatchery,
+                          "month": month, "year": month[:4]}, cell))
+
+    slices = {}
+    for slice_name, dims in SLICES.items():
+        totals = {}
+        for coords, cell in rows:
+            key = tuple(coords[d] for d in dims)
+            total = totals.setdefault(key, [0, 0, 0, 0])
+            for i, value in enumerate(cell):
+                total[i] += value
+        tables = {d: sorted({key[i] for key in totals}) for i, d in enumerate(dims)}
+        ids = {d: {v: i for i, v in enumerate(values)} for d, values in tables.items()}
+        cells = []
+        for key in sorted(totals):
+            stockings, fish, length_cs, length_n = totals[key]
+            cells.append([ids[d][v] for d, v in zip(dims, key)]
+                         + [stockings, fish, round(length_cs / 100, 2), length_n])
+        slices[slice_name] = {"v": FORMAT_VERSION, "dims": list(dims), **tables,
+                              "fields": list(FIELDS), "cells": cells}
+    return slices
+
+
+def write_cube(data, out_dir=CUBE_DIR, state_path=STATE_FILE):
+    """
+    Update the cells, write every slice and remove files of slices no longer
+    in SLICES. Returns the number of files written or removed.
+    """
+    state, counts = update_cells(load_state(state_path), data)
+    write_json(state_path, state, inline_depth=2)
+    print(f"Cube cells: {counts['unchanged']} unchanged, {counts['extended']} extended, "
+          f"{counts['rebuilt']} rebuilt")
+    written = 0
+    for name, payload in build_slices(state).items():
+        written += write_json(os.path.join(out_dir, f"{name}.json"), payload, inline_depth=0)
+    for filename in os.listdir(out_dir):
+        if filename.endswith(".json") and filename[:-len(".json")] not in SLICES:
+            os.remove(os.path.join(out_dir, filename))
+            written += 1
+    return written
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else "stocking_data.json"
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else CUBE_DIR
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    written = write_cube(data, out_dir)
+    for name in SLICES:
+        path = os.path.join(out_dir, f"{name}.json")
+        print(f"  {path}: {os.path.getsize(path):,} bytes")
+    print(f"{written} file(s) updated")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
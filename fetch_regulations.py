@@ -16,10 +16,15 @@ import json
 from typing import Dict, List, Any
 import time
 
+from json_writer import write_json
+
 
 # ArcGIS Feature Service base URL
 BASE_URL = "https://services2.arcgis.com/CjbW1bVhK4dB3WOa/arcgis/rest/services/Fishing_Waters_Map_WFL1/FeatureServer"
 
+RAW_OUTPUT_FILE = "regulations_raw.json"
+LOOKUP_OUTPUT_FILE = "regulations_data.json"
+
 # Layer IDs from the feature service
 LAYERS = {
     "Trophy_Bass_Waters": 0,
@@ -264,9 +269,13 @@ def build_water_lookup(regulations_data: Dict[str, Any]) -> Dict[str, Dict[str,
     return lookup
 
 
-def main():
-    """Main execution function."""
+def fetch_regulations() -> tuple:
+    """
+    Fetch every layer and build the lookup table without writing anything.
 
+    Returns:
+        (raw regulations data, lookup table in the regulations_data.json layout)
+    """
     # Fetch all regulation data
     regulations_data = fetch_all_regulations()
 
@@ -275,24 +284,27 @@ def main():
     water_lookup = build_water_lookup(regulations_data)
     print(f"Created lookup for {len(water_lookup)} water bodies\n")
 
-    # Save raw data
-    raw_output_file = "regulations_raw.json"
-    print(f"Saving raw data to {raw_output_file}...")
-    with open(raw_output_file, 'w', encoding='utf-8') as f:
-        json.dump(regulations_data, f, indent=2, ensure_ascii=False)
-    print(f"Saved raw data\n")
-
-    # Save lookup table
-    lookup_output_file = "regulations_data.json"
-    print(f"Saving lookup table to {lookup_output_file}...")
-
     output = {
         "waters": water_lookup,
         "metadata": regulations_data["metadata"]
     }
+    return regulations_data, output
+
+
+def main():
+    """Main execution function."""
 
-    with open(lookup_output_file, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
+    regulations_data, output = fetch_regulations()
+    water_lookup = output["waters"]
+
+    # Save raw data
+    print(f"Saving raw data to {RAW_OUTPUT_FILE}...")
+    write_json(RAW_OUTPUT_FILE, regulations_data)
+    print(f"Saved raw data\n")
+
+    # Save lookup table
+    print(f"Saving lookup table to {LOOKUP_OUTPUT_FILE}...")
+    write_json(LOOKUP_OUTPUT_FILE, output)
     print(f"Saved lookup table\n")
 
     # Print summary
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Next-stocking forecast for every water, in one vectorized pass.
+
+For each water, looking at the last HISTORY_DAYS before its latest stocking:
+
+  * intervals   gaps between consecutive stocking days, ignoring gaps longer
+                than MAX_SEASON_GAP days (the off-season break);
+  * seasonality for each calendar month, the share of years in the window in
+                which the water was stocked that month; months with at least
+                SEASON_MIN_SHARE (or the best months, if none reach it) are
+                "in season".
+
+The next window runs from last stocking + 25th percentile interval to last
+stocking + 75th percentile interval. If it starts outside the season it moves
+to the first day of the next in-season month. Waters with fewer than
+MIN_INTERVALS in-season intervals get no forecast.
+
+Only stocking history goes in, so the output changes when the data does, not
+with the calendar. Clients compare the window with their own date
+(see forecastStatus() in public/js/stocking-data.js):
+
+    public/data/forecast.json
+    {"v": 1, "waters": {"<name>": {"start": "YYYY-MM-DD", "end": "YYYY-MM-DD",
+                                   "interval": median days, "season": [months]}}}
+
+Usage:
+    python forecast.py [stocking_data.json] [public/data/forecast.json]
+"""
+
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+import stats_engine
+from json_writer import write_json
+from stats_engine import np
+
+FORECAST_FILE = os.path.join("public", "data", "forecast.json")
+FORMAT_VERSION = 1
+
+HISTORY_DAYS = 5 * 365
+MAX_SEASON_GAP = 120
+MIN_INTERVALS = 3
+SEASON_MIN_SHARE = 0.4
+
+
+def _grouped_quantiles(values, groups, n_groups, quantiles):
+    """Lower quantiles of `values` per group; -1 for empty groups."""
+    order = np.lexsort((values, groups))
+    values, groups = values[order], groups[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = []
+    for q in quantiles:
+        idx = starts + np.floor(q * np.maximum(counts - 1, 0)).astype(np.int64)
+        picked = values[np.minimum(idx, max(len(values) - 1, 0))] if len(values) else np.zeros(n_groups, np.int64)
+        result.append(np.where(counts > 0, picked, -1))
+    return counts, result
+
+
+def forecast_all(data, snapshot=None):
+    """
+    {water name: forecast dict} for every water with enough history.
+    `snapshot` is columnar.load_snapshot() of `data`, if at hand.
+    """
+    names = list(data)
+    n_waters = len(names)
+    if not n_waters:
+        return {}
+    columns, _ = stats_engine.arrays_for(data, snapshot)
+    dated = columns["date"] >= 0
+    water, ordinal = columns["water"][dated], columns["date"][dated]
+    if not len(ordinal):
+        return {}
+
+    last = np.full(n_waters, -1, dtype=np.int64)
+    np.maximum.at(last, water, ordinal)
+    recent = ordinal >= last[water] - HISTORY_DAYS
+    water, ordinal = water[recent], ordinal[recent]
+
+    # Distinct stocking days, grouped by water and sorted by date
+    span = int(ordinal.max()) + 1
+    days = np.unique(water * span + ordinal)
+    day_water, day = days // span, days % span
+
+    same_water = day_water[1:] == day_water[:-1]
+    gaps = (day[1:] - day[:-1])[same_water]
+    gap_water = day_water[1:][same_water]
+    in_season = gaps <= MAX_SEASON_GAP
+    n_gaps, (p25, p50, p75) = _grouped_quantiles(gaps[in_season], gap_water[in_season], n_waters,
+                                                 (0.25, 0.5, 0.75))
+
+    # Share of years with a stocking in each month
+    year, month = stats_engine.year_month(day)
+    stocked = np.unique((day_water * 10000 + year) * 12 + month - 1)
+    stocked_water, stocked_month = stocked // 12 // 10000, stocked % 12
+    month_years = np.bincount(stocked_water * 12 + stocked_month, minlength=n_waters * 12).reshape(n_waters, 12)
+    first_year = np.full(n_waters, 1 << 30, dtype=np.int64)
+    last_year = np.zeros(n_waters, dtype=np.int64)
+    np.minimum.at(first_year, day_water, year)
+    np.maximum.at(last_year, day_water, year)
+    years = np.maximum(last_year - first_year + 1, 1)
+    share = month_years / years[:, None]
+    season = share >= SEASON_MIN_SHARE
+    best = share >= share.max(axis=1, keepdims=True)
+    season = np.where(season.any(axis=1, keepdims=True), season, best)
+
+    forecasts = {}
+    for w in np.flatnonzero(n_gaps >= MIN_INTERVALS).tolist():
+        months = [m + 1 for m in np.flatnonzero(season[w]).tolist()]
+        start = date.fromordinal(int(last[w] + p25[w]))
+        width = int(p75[w] - p25[w])
+        if start.month not in months:
+            # First day of the next in-season month
+            y, m = start.year, start.month
+            while m not in months:
+                y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+            start = date(y, m, 1)
+        forecasts[names[w]] = {
+            "start": start.isoformat(),
+            "end": (start + timedelta(days=width)).isoformat(),
+            "interval": int(p50[w]),
+            "season": months,
+        }
+    return forecasts
+
+
+def write_forecast(data, path=FORECAST_FILE, snapshot=None):
+    """Write the forecast index. Returns True if it changed, None without NumPy."""
+    if np is None:
+        print("NumPy not installed; skipping stocking forecast")
+        return None
+    forecasts = forecast_all(data, snapshot)
+    return write_json(path, {"v": FORMAT_VERSION, "waters": forecasts}, inline_depth=2)
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else "stocking_data.json"
+    path = sys.argv[2] if len(sys.argv) > 2 else FORECAST_FILE
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    changed = write_forecast(data, path)
+    if changed is None:
+        return 1
+    with open(path, 'r', encoding='utf-8') as f:
+        count = len(json.load(f)["waters"])
+    print(f"{path}: forecasts for {count} of {len(data)} waters" + ("" if changed else ", unchanged"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,9 +9,14 @@ Conservative policy: only apply coords we're highly confident in.
 
 Run from the geocoding/ directory:
     python apply_coords.py
+
+pipeline.py calls apply_coords() on its in-memory dataset instead.
 """
 
-import csv, json
+import csv, json, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from json_writer import write_json
 
 # ── Waters where GNIS matched the WRONG feature ─────────────────────────────
 # Same name exists in multiple NM counties, or matched a completely different body of water.
@@ -90,99 +95,111 @@ APPROVED_SCORE_9 = {
 
 # ── Main ─────────────────────────────────────────────────────────────────────
 
-# GNIS results are only present locally (large file, not committed).
-# On the GitHub Actions runner this will be empty — that's fine, manual
-# coords still get applied and GNIS coords are already in stocking_data.json.
-import os
-if os.path.exists('gnis_results.csv'):
-    with open('gnis_results.csv', newline='', encoding='utf-8') as f:
-        rows = {r['water_name']: r for r in csv.DictReader(f)}
-else:
-    rows = {}
-    print("Note: gnis_results.csv not found — skipping GNIS matching (manual coords only)")
+GEOCODING_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(GEOCODING_DIR)
+GNIS_RESULTS_FILE = os.path.join(GEOCODING_DIR, 'gnis_results.csv')
+STOCKING_FILE = os.path.join(PROJECT_DIR, 'stocking_data.json')
+MANUAL_COORDS_FILE = os.path.join(PROJECT_DIR, 'manual_coordinates.json')
 
-with open('../stocking_data.json', encoding='utf-8') as f:
-    data = json.load(f)
-
-# Load human-verified coords — these are never overwritten or cleared.
-# Same file the scraper uses: manual_coordinates.json in the project root.
-with open('../manual_coordinates.json', encoding='utf-8') as f:
-    manual = json.load(f)
-
-applied = []
-manual_applied = []
-cleared = []
-skipped = []
-
-for water_name, info in data.items():
-    had_coords = bool(info.get('coords'))
-
-    # ── Human-verified coords take absolute priority ──────────────────────────
-    if water_name in manual:
-        data[water_name]['coords'] = manual[water_name]
-        manual_applied.append(water_name)
-        continue
-
-    if water_name not in rows:
-        skipped.append((water_name, 'Not in GNIS results'))
-        continue
-
-    row = rows[water_name]
-    score = float(row['confidence']) if row['confidence'] else 0
-    accept = False
-
-    if water_name in GNIS_EXCLUSIONS:
-        reason = 'Known bad GNIS match (wrong county or wrong feature)'
-    elif not row['gnis_lat']:
-        reason = 'No GNIS match found'
-    elif score == 10:
-        accept = True
-        reason = 'Score 10 — exact GNIS match'
-    elif score == 9 and water_name in APPROVED_SCORE_9:
-        accept = True
-        reason = 'Score 9 — near-exact, verified correct'
-    elif score == 7:
-        accept = True
-        reason = 'Score 7 — manually computed river-segment midpoint'
-    else:
-        reason = f'Score {score:.0f} — below confidence threshold (not verified)'
-
-    if accept:
-        data[water_name]['coords'] = {
-            'lat': float(row['gnis_lat']),
-            'lon': float(row['gnis_lon']),
-        }
-        applied.append((water_name, reason))
-    else:
-        if had_coords:
-            del data[water_name]['coords']
-            cleared.append((water_name, reason))
+
+def load_gnis_rows(path=GNIS_RESULTS_FILE):
+    # GNIS results are only present locally (large file, not committed).
+    # On the GitHub Actions runner this will be empty — that's fine, manual
+    # coords still get applied and GNIS coords are already in stocking_data.json.
+    if os.path.exists(path):
+        with open(path, newline='', encoding='utf-8') as f:
+            return {r['water_name']: r for r in csv.DictReader(f)}
+    print("Note: gnis_results.csv not found — skipping GNIS matching (manual coords only)")
+    return {}
+
+
+def load_manual_coords(path=MANUAL_COORDS_FILE):
+    # Human-verified coords — these are never overwritten or cleared.
+    # Same file the scraper uses: manual_coordinates.json in the project root.
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def apply_coords(data, rows, manual):
+    """
+    Set or clear coords on every water in `data` (in place).
+    Returns (applied, manual_applied, cleared, skipped) for print_report().
+    """
+    applied = []
+    manual_applied = []
+    cleared = []
+    skipped = []
+
+    for water_name, info in data.items():
+        had_coords = bool(info.get('coords'))
+
+        # ── Human-verified coords take absolute priority ──────────────────────
+        if water_name in manual:
+            data[water_name]['coords'] = manual[water_name]
+            manual_applied.append(water_name)
+            continue
+
+        if water_name not in rows:
+            skipped.append((water_name, 'Not in GNIS results'))
+            continue
+
+        row = rows[water_name]
+        score = float(row['confidence']) if row['confidence'] else 0
+        accept = False
+
+        if water_name in GNIS_EXCLUSIONS:
+            reason = 'Known bad GNIS match (wrong county or wrong feature)'
+        elif not row['gnis_lat']:
+            reason = 'No GNIS match found'
+        elif score == 10:
+            accept = True
+            reason = 'Score 10 — exact GNIS match'
+        elif score == 9 and water_name in APPROVED_SCORE_9:
+            accept = True
+            reason = 'Score 9 — near-exact, verified correct'
+        elif score == 7:
+            accept = True
+            reason = 'Score 7 — manually computed river-segment midpoint'
+        else:
+            reason = f'Score {score:.0f} — below confidence threshold (not verified)'
+
+        if accept:
+            data[water_name]['coords'] = {
+                'lat': float(row['gnis_lat']),
+                'lon': float(row['gnis_lon']),
+            }
+            applied.append((water_name, reason))
         else:
-            skipped.append((water_name, reason))
+            if had_coords:
+                del data[water_name]['coords']
+                cleared.append((water_name, reason))
+            else:
+                skipped.append((water_name, reason))
+
+    return applied, manual_applied, cleared, skipped
 
-with open('../stocking_data.json', 'w', encoding='utf-8') as f:
-    json.dump(data, f, indent=2, ensure_ascii=False)
 
 # ── Report ────────────────────────────────────────────────────────────────────
 
-if manual_applied:
-    print(f"\n{'MANUAL (human-verified) — highest priority':=<70}")
-    for name in sorted(manual_applied):
-        print(f"  {name}")
+def print_report(applied, manual_applied, cleared, skipped):
+    if manual_applied:
+        print(f"\n{'MANUAL (human-verified) — highest priority':=<70}")
+        for name in sorted(manual_applied):
+            print(f"  {name}")
 
-print(f"\n{'APPLIED (GNIS) — on map':=<70}")
-for name, reason in sorted(applied):
-    print(f"  {name:<55} {reason}")
+    print(f"\n{'APPLIED (GNIS) — on map':=<70}")
+    for name, reason in sorted(applied):
+        print(f"  {name:<55} {reason}")
 
-print(f"\n{'CLEARED — had coords, now removed':=<70}")
-for name, reason in sorted(cleared):
-    print(f"  {name:<55} {reason}")
+    print(f"\n{'CLEARED — had coords, now removed':=<70}")
+    for name, reason in sorted(cleared):
+        print(f"  {name:<55} {reason}")
 
-print(f"\n{'SKIPPED — no coords assigned':=<70}")
-for name, reason in sorted(skipped):
-    print(f"  {name:<55} {reason}")
+    print(f"\n{'SKIPPED — no coords assigned':=<70}")
+    for name, reason in sorted(skipped):
+        print(f"  {name:<55} {reason}")
 
-print(f"""
+    print(f"""
 {'SUMMARY':=<70}
   Manual (human):     {len(manual_applied):>3} waters  (never overwritten)
   GNIS (auto):        {len(applied):>3} waters
@@ -191,3 +208,18 @@ print(f"""
 
 Add confirmed locations to manual_coordinates.json to protect them.
 """)
+
+
+def main():
+    rows = load_gnis_rows()
+    with open(STOCKING_FILE, encoding='utf-8') as f:
+        data = json.load(f)
+    manual = load_manual_coords()
+
+    results = apply_coords(data, rows, manual)
+    write_json(STOCKING_FILE, data)
+    print_report(*results)
+
+
+if __name__ == '__main__':
+    main()
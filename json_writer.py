@@ -0,0 +1,115 @@
+"""
+Shared writer for every JSON (and text) artifact the pipeline produces.
+
+- Canonical layout: the top-level object keeps its key order (a dataset's
+  waters stay in the order the site lists them), deeper keys are sorted;
+  containers above `inline_depth` one item per line, everything deeper on a
+  single compact line. For the stocking data that means one line per record,
+  which keeps git diffs readable.
+- Fast: `json.dump(..., indent=N)` falls back to CPython's pure-Python encoder.
+  Here every compact chunk goes through the C encoder. It is the only
+  encoder used, so the bytes never depend on what happens to be installed.
+- Atomic: output goes to a temp file in the same directory and is renamed
+  over the destination, so a crash can never leave a truncated file.
+- Write-if-changed: when the bytes on disk are already identical, nothing is
+  written and the file's mtime is left alone.
+"""
+
+import json
+import os
+import tempfile
+
+INLINE_DEPTH = 3
+INDENT = "  "
+
+_encoders = {
+    sort_keys: json.JSONEncoder(sort_keys=sort_keys, separators=(',', ':'), ensure_ascii=False)
+    for sort_keys in (True, False)
+}
+
+
+def _encode(value, depth, inline_depth, sort_keys, parts):
+    encoder = _encoders[sort_keys]
+    if not isinstance(value, (dict, list)) or not value:
+        parts.append(encoder.encode(value))
+        return
+    keys = None
+    if isinstance(value, dict):
+        keys = list(value) if depth == 0 or not sort_keys else sorted(value)
+    if depth >= inline_depth:
+        if keys is not None and depth == 0:
+            # A single-line top-level object still keeps its key order
+            parts.append("{" + ",".join(encoder.encode(str(key)) + ":" + encoder.encode(value[key])
+                                        for key in keys) + "}")
+        else:
+            parts.append(encoder.encode(value))
+        return
+    pad = "\n" + INDENT * (depth + 1)
+    if isinstance(value, dict):
+        parts.append("{")
+        for i, key in enumerate(keys):
+            parts.append(("," if i else "") + pad + encoder.encode(str(key)) + ": ")
+            _encode(value[key], depth + 1, inline_depth, sort_keys, parts)
+        parts.append("\n" + INDENT * depth + "}")
+    else:
+        parts.append("[")
+        for i, item in enumerate(value):
+            parts.append(("," if i else "") + pad)
+            _encode(item, depth + 1, inline_depth, sort_keys, parts)
+        parts.append("\n" + INDENT * depth + "]")
+
+
+def dumps(data, inline_depth=INLINE_DEPTH, sort_keys=True):
+    """
+    Serialize `data` in the canonical layout. inline_depth=0 gives one compact
+    line; sort_keys=False keeps every object's key order (for hand-maintained
+    files such as vercel.json).
+    """
+    parts = []
+    _encode(data, 0, inline_depth, sort_keys, parts)
+    parts.append("\n")
+    return "".join(parts)
+
+
+def write_bytes(path, payload):
+    """
+    Atomically write `payload` to `path` unless the file already holds exactly
+    those bytes. Returns True if the file was written.
+    """
+    try:
+        if os.path.getsize(path) == len(payload):
+            with open(path, 'rb') as f:
+                if f.read() == payload:
+                    return False
+    except OSError:
+        pass
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+def write_text(path, text):
+    """write_bytes() for UTF-8 text."""
+    return write_bytes(path, text.encode('utf-8'))
+
+
+def write_json(path, data, inline_depth=INLINE_DEPTH, sort_keys=True):
+    """Write `data` as canonical JSON (see dumps()). Returns True if the file changed."""
+    return write_text(path, dumps(data, inline_depth, sort_keys))
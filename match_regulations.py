@@ -13,6 +13,10 @@ import json
 from difflib import SequenceMatcher
 from typing import Dict, List, Tuple, Any
 
+from json_writer import write_json
+
+OUTPUT_FILE = "matched_regulations.json"
+
 
 def load_json(filename: str) -> Dict:
     """Load JSON file."""
@@ -188,16 +192,13 @@ def create_manual_mapping() -> Dict[str, str]:
     return manual_mappings
 
 
-def main():
-    """Main execution function."""
-
-    # Load data files
-    print("Loading data files...")
-    stocking_data = load_json("stocking_data.json")
-    regulations_data = load_json("regulations_data.json")
-    print(f"  Loaded {len(stocking_data)} water bodies from stocking_data.json")
-    print(f"  Loaded {len(regulations_data['waters'])} water bodies from regulations_data.json")
+def build_matched_regulations(stocking_data: Dict, regulations_data: Dict) -> Dict:
+    """
+    Match regulations to stocking waters and apply the manual mappings.
 
+    Returns:
+        Dict in the matched_regulations.json layout
+    """
     # Match regulations to stocking waters
     matched = match_regulations_to_stocking(stocking_data, regulations_data)
 
@@ -215,8 +216,7 @@ def main():
                 }
                 print(f"  MANUAL: '{stocking_name}' -> '{regulation_name}'")
 
-    # Save matched data
-    output = {
+    return {
         "matched_waters": matched,
         "metadata": {
             "total_stocking_waters": len(stocking_data),
@@ -227,10 +227,23 @@ def main():
         }
     }
 
-    output_file = "matched_regulations.json"
-    print(f"\nSaving matched data to {output_file}...")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
+
+def main():
+    """Main execution function."""
+
+    # Load data files
+    print("Loading data files...")
+    stocking_data = load_json("stocking_data.json")
+    regulations_data = load_json("regulations_data.json")
+    print(f"  Loaded {len(stocking_data)} water bodies from stocking_data.json")
+    print(f"  Loaded {len(regulations_data['waters'])} water bodies from regulations_data.json")
+
+    output = build_matched_regulations(stocking_data, regulations_data)
+    matched = output["matched_waters"]
+
+    # Save matched data
+    print(f"\nSaving matched data to {OUTPUT_FILE}...")
+    write_json(OUTPUT_FILE, output)
     print(f"Saved matched data")
 
     print("\nMatching complete!")
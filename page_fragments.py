@@ -0,0 +1,73 @@
+"""
+Content-keyed cache of rendered water-page fragments.
+
+A page is mostly made of blocks that depend on small inputs that rarely
+change: one table row per record (records are immutable once published),
+the regulation block, the water image, the species-present list and the
+schema.org JSON-LD. Each rendered block is stored under its water, its kind
+and a key derived from exactly those inputs, so rendering a page that did
+change is mostly a matter of stitching cached fragments together. A page
+job carries only its own water's fragments to the worker rendering it.
+
+    .build_cache/page_fragments.json
+    {"rules": <hash of the page rendering code>,
+     "waters": {"<water>": {"row": {"<record key>": "<tr>...</tr>"}, "regulations": {...}, ...}}}
+
+A different rules hash (template or rendering code changed) empties the
+cache. A rendered page's fragments replace that water's old ones, so
+fragments it no longer uses are dropped.
+"""
+
+import hashlib
+import json
+import os
+
+from json_writer import dumps, write_json
+
+STATE_FILE = os.path.join(".build_cache", "page_fragments.json")
+
+
+def content_key(*inputs):
+    """Key for a fragment rendered from `inputs` (anything JSON-serializable)."""
+    return hashlib.sha1(dumps(list(inputs), inline_depth=0).encode('utf-8')).hexdigest()[:20]
+
+
+def load_fragments(rules, path=STATE_FILE):
+    """{water: {kind: {key: html}}} saved by a build with the same `rules`, else {}."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(state, dict) or state.get("rules") != rules:
+        return {}
+    return state.get("waters", {})
+
+
+def cached(fragments, used, kind, key, render):
+    """
+    The `kind` fragment stored under `key` in `fragments` (one water's), or
+    `render()` if there is none. Either way it is recorded in `used`, the
+    fragments this water's page needs.
+    """
+    html = fragments.get(kind, {}).get(key)
+    if html is None:
+        html = render()
+    used.setdefault(kind, {})[key] = html
+    return html
+
+
+def merge_used(used, more):
+    for kind, table in more.items():
+        used.setdefault(kind, {}).update(table)
+    return used
+
+
+def save_fragments(fragments, used, rules, waters, path=STATE_FILE):
+    """
+    Save the fragments of `waters`: `used` ({water: {kind: {key: html}}}) for
+    the pages rendered this build, the older `fragments` for the rest.
+    """
+    kept = {water: used[water] if water in used else fragments[water]
+            for water in waters if water in used or water in fragments}
+    return write_json(path, {"rules": rules, "waters": kept}, inline_depth=3)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Daily pipeline in a single process.
+
+Runs the stages the workflow used to run as separate scripts, on one
+in-memory dataset that is loaded once, as a build graph (see build_graph.py):
+
+    load          stocking_data_clean.json + journal
+    ingest        new report PDFs -> records (weekly_update.py)      after load
+    fetch_regs    ArcGIS -> regulations_raw.json / regulations_data.json
+                  (fetch_regulations.py), concurrently with load/ingest
+    cleanup       merge duplicate / malformed names (cleanup_data.py) after ingest
+    match_regs    regulations + cleaned names -> matched_regulations.json
+    coords        verified coordinates (geocoding/apply_coords.py)    after cleanup
+    columnar      columnar snapshot -> .build_cache/columnar/ (columnar.py)
+    stats         per-water summary stats from the running aggregates (aggregates.py)
+    cube          statewide aggregate cube -> public/data/cube/ (cube.py)
+    forecast      next-stocking windows -> public/data/forecast.json (forecast.py)
+    trends        sparkline series -> public/data/trends/ (trends.py)
+    recent        week-bucketed index -> public/data/recent.json (recent_index.py)
+    pages         records + aux JSON + template.html -> public/waters/; orphaned
+                  pages redirected (vercel.json) and removed (redirects.py)
+    sitemap       page manifest -> public/sitemap.xml                after pages
+    publish       stocking_data.json, the clean snapshot and the compact data
+
+Stages with a fingerprint are skipped when their inputs hash the same as on
+their last successful run. Data files go through json_writer, so files whose
+content did not change are not touched. A per-stage timing table is printed
+at the end. The individual scripts still work on their own.
+
+Usage:
+    python pipeline.py                  # daily run
+    python pipeline.py --no-ingest      # rebuild outputs without fetching reports
+    python pipeline.py --no-regulations # keep the regulation files as they are
+    python pipeline.py --full-cleanup   # ignore the saved cleanup state
+    python pipeline.py --force          # ignore fingerprints, run every stage
+    python pipeline.py --workers 4      # render pages in 4 processes (default: CPU count)
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import aggregates
+import build_graph
+import cleanup_data
+import columnar
+import compact_data
+import cube
+import fetch_regulations
+import forecast
+import match_regulations
+import recent_index
+import record_journal
+import redirects
+import scraper
+import stats_engine
+import trends
+import weekly_update
+from build_graph import Stage, file_input, data_input, source_input
+from geocoding import apply_coords
+from json_writer import write_json
+from scraper import generate_static_pages, generate_sitemap, OUTPUT_FILE, OUTPUT_DIR, TEMPLATE_FILE
+
+CLEAN_DATA_FILE = cleanup_data.OUTPUT_FILE
+
+# Extra JSON files generate_static_pages() reads besides the dataset
+PAGE_AUX_FILES = ("water_species.json", scraper.WATER_IMAGES_FILE, "consumption_advisories.json",
+                  match_regulations.OUTPUT_FILE)
+
+
+def load(ctx):
+    ctx["data"] = record_journal.load_dataset(CLEAN_DATA_FILE)
+    ctx["journaled"] = len(record_journal.read_batches())
+    print(f"Loaded {len(ctx['data'])} water bodies ({ctx['journaled']} journaled batch(es) replayed)")
+    ctx["manual_coords"] = weekly_update.load_manual_coords()
+
+
+def ingest(ctx):
+    ctx["new_records"] = 0
+    if ctx["options"]["ingest"]:
+        new_records = weekly_update.ingest_new_reports(ctx["data"], ctx["manual_coords"])
+        if new_records is None:
+            raise RuntimeError("Archive could not be read")
+        ctx["new_records"] = new_records
+    if not ctx["data"]:
+        raise RuntimeError(f"No data in {CLEAN_DATA_FILE} or the journal; refusing to publish an empty dataset")
+
+
+def fetch_regs(ctx):
+    ctx["regulations"] = None
+    if not ctx["options"]["regulations"]:
+        print("Regulation fetch disabled; keeping existing files")
+        return
+    raw, lookup = fetch_regulations.fetch_regulations()
+    if not lookup["waters"]:
+        # Every layer query failed (they return [] on errors)
+        print("Warning: ArcGIS returned no regulation data; keeping existing files")
+        return
+    write_json(fetch_regulations.RAW_OUTPUT_FILE, raw)
+    write_json(fetch_regulations.LOOKUP_OUTPUT_FILE, lookup)
+    ctx["regulations"] = lookup
+
+
+def cleanup(ctx):
+    state = {} if ctx["options"]["full_cleanup"] else cleanup_data.load_state()
+    ctx["cleanup_prev_state"] = state
+    ctx["cleaned"], ctx["cleanup_state"] = cleanup_data.clean(ctx["data"], state)
+
+
+def _regulations_lookup(ctx):
+    if ctx.get("regulations") is not None:
+        return ctx["regulations"]
+    with open(fetch_regulations.LOOKUP_OUTPUT_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def match_regs_fingerprint(ctx):
+    return [data_input("regulations", _regulations_lookup(ctx)),
+            data_input("water_names", sorted(ctx["cleaned"])),
+            source_input(match_regulations)]
+
+
+def match_regs(ctx):
+    output = match_regulations.build_matched_regulations(ctx["cleaned"], _regulations_lookup(ctx))
+    write_json(match_regulations.OUTPUT_FILE, output)
+    ctx["matched"] = output["matched_waters"]
+
+
+def match_regs_skip(ctx):
+    ctx["matched"] = None  # generate_static_pages() reads matched_regulations.json
+
+
+def coords(ctx):
+    # Coordinates go on the published copy only; the clean snapshot keeps
+    # whatever coords the scraper stored, exactly as the separate scripts did
+    published = {name: dict(water) for name, water in ctx["cleaned"].items()}
+    results = apply_coords.apply_coords(published, apply_coords.load_gnis_rows(),
+                                        apply_coords.load_manual_coords())
+    apply_coords.print_report(*results)
+    ctx["published"] = published
+    ctx["published_input"] = data_input("published", published)
+
+
+def build_columnar(ctx):
+    # stats, forecast and trends read their columns from the snapshot
+    ctx["snapshot"] = None
+    if columnar.write_snapshot(ctx["published"]) is not None:
+        ctx["snapshot"] = columnar.load_snapshot()
+
+
+def stats(ctx):
+    state, ctx["stats"], counts = aggregates.update_aggregates(aggregates.load_state(), ctx["published"],
+                                                               snapshot=ctx["snapshot"])
+    aggregates.save_state(state)
+    print(f"Aggregates: {counts['unchanged']} unchanged, {counts['extended']} extended, "
+          f"{counts['rebuilt']} rebuilt")
+
+
+def build_cube(ctx):
+    cube.write_cube(ctx["published"])
+
+
+def build_forecast(ctx):
+    forecast.write_forecast(ctx["published"], snapshot=ctx["snapshot"])
+
+
+def build_trends(ctx):
+    trends.write_trends(ctx["published"], snapshot=ctx["snapshot"])
+
+
+def build_recent(ctx):
+    recent_index.write_recent(ctx["published"])
+
+
+def pages_fingerprint(ctx):
+    # Report links are validated on every run: a link that broke or came back
+    # changes the pages that show it, even when no data did
+    ctx["url_status"] = scraper.validate_report_urls(ctx["published"])
+    broken = sorted(url for url, valid in ctx["url_status"].items() if not valid)
+    return ([ctx["published_input"], file_input(TEMPLATE_FILE), source_input(scraper),
+             source_input(stats_engine), source_input(aggregates), source_input(redirects),
+             data_input("merge_redirects", redirects.merge_redirects(ctx["cleanup_state"]["groups"])),
+             data_input("broken_report_links", [(url, scraper.get_fallback_url(url)) for url in broken])]
+            + [file_input(path) for path in PAGE_AUX_FILES])
+
+
+def pages(ctx):
+    generate_static_pages(ctx["published"], ctx.get("matched"), ctx["stats"], force=ctx["options"]["force"],
+                          workers=ctx["options"]["workers"], merge_groups=ctx["cleanup_state"]["groups"],
+                          url_status=ctx["url_status"])
+
+
+def sitemap_fingerprint(ctx):
+    # lastmod comes from the page manifest
+    return [data_input("water_names", sorted(ctx["published"])), file_input(scraper.PAGE_MANIFEST_FILE),
+            source_input(generate_sitemap), source_input(scraper._sitemap_xml)]
+
+
+def sitemap(ctx):
+    generate_sitemap(ctx["published"])
+
+
+def publish(ctx):
+    # The snapshot is compacted when the journal is due (record_journal.COMPACT_EVERY
+    # batches); until then new records live in the journal only
+    cleanup_data.save_cleaned(ctx["cleaned"], ctx["cleanup_state"], ctx["cleanup_prev_state"])
+    written = write_json(OUTPUT_FILE, ctx["published"])
+    print(f"{OUTPUT_FILE}: {'written' if written else 'unchanged'}")
+    compact_data.write_compact(ctx["published"])
+
+
+STAGES = [
+    Stage("load", load),
+    Stage("ingest", ingest, deps=["load"]),
+    Stage("fetch_regs", fetch_regs),
+    Stage("cleanup", cleanup, deps=["ingest"]),
+    Stage("match_regs", match_regs, deps=["fetch_regs", "cleanup"], fingerprint=match_regs_fingerprint,
+          outputs=[match_regulations.OUTPUT_FILE], skip=match_regs_skip),
+    Stage("coords", coords, deps=["cleanup"]),
+    Stage("columnar", build_columnar, deps=["coords"]),
+    Stage("stats", stats, deps=["columnar"]),
+    Stage("cube", build_cube, deps=["coords"]),
+    Stage("forecast", build_forecast, deps=["columnar"]),
+    Stage("trends", build_trends, deps=["columnar"]),
+    Stage("recent", build_recent, deps=["coords"]),
+    Stage("pages", pages, deps=["stats", "match_regs"], fingerprint=pages_fingerprint,
+          outputs=[OUTPUT_DIR, scraper.PAGE_MANIFEST_FILE, redirects.VERCEL_FILE]),
+    Stage("sitemap", sitemap, deps=["pages"], fingerprint=sitemap_fingerprint,
+          outputs=[scraper.SITEMAP_FILE]),
+    Stage("publish", publish, deps=["coords"]),
+]
+
+
+def run(ingest=True, regulations=True, full_cleanup=False, force=False, workers=None):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    ctx = {"options": {"ingest": ingest, "regulations": regulations, "full_cleanup": full_cleanup, "force": force,
+                       "workers": workers or os.cpu_count() or 1}}
+    results = build_graph.run_graph(STAGES, ctx, force=force)
+    build_graph.print_timings(results, STAGES)
+    return 1 if any(status in ("failed", "blocked") for status, _ in results.values()) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the daily stocking pipeline in one process.")
+    parser.add_argument("--no-ingest", action="store_true", help="Skip fetching new reports")
+    parser.add_argument("--no-regulations", action="store_true", help="Skip the ArcGIS regulation fetch")
+    parser.add_argument("--full-cleanup", action="store_true", help="Ignore the saved cleanup state")
+    parser.add_argument("--force", action="store_true", help="Run every stage even if its inputs are unchanged")
+    parser.add_argument("--workers", type=int, help="Processes rendering water pages (default: CPU count)")
+    args = parser.parse_args()
+    return run(ingest=not args.no_ingest, regulations=not args.no_regulations,
+               full_cleanup=args.full_cleanup, force=args.force, workers=args.workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+// Loader for /public/data/stocking.min.json, the dictionary-encoded copy of
+// stocking_data.json written by compact_data.py. decodeStockingData() gives
+// back the same { name: { records: [...], coords } } shape as the full file.
+// Until the pipeline has written the compact file and recent.json (a fresh
+// deploy), the loaders fall back to the full /stocking_data.json and to a
+// window worked out from it.
+// fetchCubeSlice() loads the pre-aggregated slices written by cube.py,
+// fetchRecentStockings() the latest-week window written by recent_index.py,
+// fetchForecasts() the next-stocking windows written by forecast.py, and
+// fetchTrend() the sparkline series written by trends.py, fetchHistoryChunk()
+// a water page's older stockings (scraper.write_history()). freshnessBadge()
+// and recentActivity() give the date-relative parts of a water page, which
+// the build leaves out so pages only change when their data does.
+
+const STOCKING_DATA_URL = '/public/data/stocking.min.json';
+const FULL_DATA_URL = '/stocking_data.json';
+const STOCKING_DATA_VERSION = 1;
+const CUBE_URL = '/public/data/cube/';
+const CUBE_VERSION = 1;
+const RECENT_URL = '/public/data/recent.json';
+const RECENT_VERSION = 1;
+const RECENT_WINDOW_DAYS = 7;  // recent_index.RECENT_DAYS
+const FORECAST_URL = '/public/data/forecast.json';
+const FORECAST_VERSION = 1;
+const FORECAST_SOON_DAYS = 7;
+const TRENDS_URL = '/public/data/trends/';
+const TRENDS_VERSION = 1;
+const HISTORY_URL = '/public/data/history/';
+const HISTORY_VERSION = 1;
+const MS_PER_DAY = 24 * 60 * 60 * 1000;
+const RECENT_DAYS = 182;
+
+async function fetchCompactStockingData() {
+    const response = await fetch(STOCKING_DATA_URL + '?v=' + new Date().getTime());
+    if (response.status === 404) {
+        return fetchFullStockingData();
+    }
+    if (!response.ok) {
+        throw new Error(`Failed to load data (${response.status})`);
+    }
+    const payload = JSON.parse(await response.text());
+    if (payload.v !== STOCKING_DATA_VERSION) {
+        throw new Error(`Unsupported data version ${payload.v}`);
+    }
+    return payload;
+}
+
+// The full file in the compact payload's shape: raw records under R, the
+// other fields (coords included) under x, as decodeStockingData() reads them
+async function fetchFullStockingData() {
+    const response = await fetch(FULL_DATA_URL + '?v=' + new Date().getTime());
+    if (!response.ok) {
+        throw new Error(`Failed to load data (${response.status})`);
+    }
+    const data = JSON.parse(await response.text());
+    return {
+        v: STOCKING_DATA_VERSION,
+        waters: Object.entries(data).map(([n, { records, ...x }]) => ({ n, R: records || [], x }))
+    };
+}
+
+// Names only; avoids expanding any records.
+function compactWaterNames(payload) {
+    return payload.waters.map(w => w.n);
+}
+
+function decodeStockingData(payload) {
+    const data = {};
+    const dateStrings = new Map();  // only a few hundred distinct stocking days
+    const dateString = d => {
+        if (typeof d !== 'number') return d;
+        let s = dateStrings.get(d);
+        if (s === undefined) {
+            s = new Date(d * MS_PER_DAY).toISOString().slice(0, 10);
+            dateStrings.set(d, s);
+        }
+        return s;
+    };
+    for (const w of payload.waters) {
+        let records;
+        if (w.R) {
+            records = w.R;
+        } else {
+            records = new Array(w.d.length);
+            for (let i = 0; i < w.d.length; i++) {
+                records[i] = {
+                    date: dateString(w.d[i]),
+                    species: payload.species[w.s[i]],
+                    quantity: String(w.q[i]),
+                    length: payload.lengths[w.l[i]],
+                    hatchery: payload.hatcheries[w.h[i]],
+                    reportUrl: payload.reports[w.r[i]]
+                };
+            }
+        }
+        const water = { records };
+        if ('c' in w) {
+            water.coords = Array.isArray(w.c) ? { lat: w.c[0], lon: w.c[1] } : w.c;
+        }
+        data[w.n] = Object.assign(water, w.x || {});
+    }
+    return data;
+}
+
+async function loadStockingData() {
+    return decodeStockingData(await fetchCompactStockingData());
+}
+
+// name: "species_month" or "water_species_year"
+async function fetchCubeSlice(name) {
+    const response = await fetch(CUBE_URL + name + '.json?v=' + new Date().getTime());
+    if (!response.ok) {
+        throw new Error(`Failed to load ${name} (${response.status})`);
+    }
+    const slice = await response.json();
+    if (slice.v !== CUBE_VERSION) {
+        throw new Error(`Unsupported ${name} version ${slice.v}`);
+    }
+    return slice;
+}
+
+// Map of `dim` value -> summed `field` over the cells of a cube slice whose
+// values pass `where` ({ dim: value => bool }), largest first
+function cubeTotals(slice, dim, field, where = {}) {
+    const dimIndex = slice.dims.indexOf(dim);
+    const fieldIndex = slice.dims.length + slice.fields.indexOf(field);
+    const tests = Object.entries(where).map(([d, test]) => [slice.dims.indexOf(d), slice[d], test]);
+    const totals = new Map();
+    for (const cell of slice.cells) {
+        if (!tests.every(([i, values, test]) => test(values[cell[i]]))) continue;
+        const key = slice[dim][cell[dimIndex]];
+        totals.set(key, (totals.get(key) || 0) + cell[fieldIndex]);
+    }
+    return new Map([...totals.entries()].sort((a, b) => b[1] - a[1]));
+}
+
+// { start, end, waters: [{ n: name, q: fish, s: [species], d: latest date }] };
+// without recent.json, the same window from data (decodeStockingData() shape)
+async function fetchRecentStockings(data = null) {
+    const response = await fetch(RECENT_URL + '?v=' + new Date().getTime());
+    if (response.status === 404 && data) {
+        return recentStockings(data);
+    }
+    if (!response.ok) {
+        throw new Error(`Failed to load recent stockings (${response.status})`);
+    }
+    const recent = await response.json();
+    if (recent.v !== RECENT_VERSION) {
+        throw new Error(`Unsupported recent stockings version ${recent.v}`);
+    }
+    return recent;
+}
+
+// Same window as recent_index.recent_window(): every water stocked in the
+// RECENT_WINDOW_DAYS days up to the newest stocking date
+function recentStockings(data) {
+    let end = null;
+    for (const water of Object.values(data)) {
+        for (const r of water.records) {
+            if (end === null || r.date > end) end = r.date;
+        }
+    }
+    if (end === null) {
+        return { v: RECENT_VERSION, start: null, end: null, waters: [] };
+    }
+    const start = new Date(Date.parse(end) - (RECENT_WINDOW_DAYS - 1) * MS_PER_DAY).toISOString().slice(0, 10);
+    const waters = [];
+    for (const name of Object.keys(data).sort()) {
+        const recent = data[name].records.filter(r => r.date >= start && r.date <= end);
+        if (recent.length === 0) continue;
+        waters.push({
+            n: name,
+            q: recent.reduce((sum, r) => sum + (parseInt(r.quantity) || 0), 0),
+            s: [...new Set(recent.map(r => r.species))],
+            d: recent.reduce((latest, r) => r.date > latest ? r.date : latest, recent[0].date)
+        });
+    }
+    return { v: RECENT_VERSION, start, end, waters };
+}
+
+// { name: { start, end, interval, season } } for waters with enough history
+async function fetchForecasts() {
+    const response = await fetch(FORECAST_URL + '?v=' + new Date().getTime());
+    if (!response.ok) {
+        throw new Error(`Failed to load forecasts (${response.status})`);
+    }
+    const payload = await response.json();
+    if (payload.v !== FORECAST_VERSION) {
+        throw new Error(`Unsupported forecast version ${payload.v}`);
+    }
+    return payload.waters;
+}
+
+// "due" inside the window, "soon" within FORECAST_SOON_DAYS of it,
+// "later" before that, "past" after it; null without a forecast.
+function forecastStatus(forecast, now = new Date()) {
+    if (!forecast) return null;
+    const today = Date.UTC(now.getFullYear(), now.getMonth(), now.getDate());
+    const start = Date.parse(forecast.start);
+    const end = Date.parse(forecast.end);
+    if (today > end) return 'past';
+    if (today >= start) return 'due';
+    if (today >= start - FORECAST_SOON_DAYS * MS_PER_DAY) return 'soon';
+    return 'later';
+}
+
+// Same slug as scraper.water_slug()
+function waterSlug(waterName) {
+    return waterName.toLowerCase().replace(/[^a-z0-9]+/g, '-').replace(/^-+|-+$/g, '');
+}
+
+// Weekly and monthly series for one water, or statewide when name is null
+async function fetchTrend(waterName) {
+    const path = waterName === null ? 'statewide.json' : `waters/${waterSlug(waterName)}.json`;
+    const response = await fetch(TRENDS_URL + path + '?v=' + new Date().getTime());
+    if (!response.ok) {
+        throw new Error(`Failed to load trend (${response.status})`);
+    }
+    const trend = await response.json();
+    if (trend.v !== TRENDS_VERSION) {
+        throw new Error(`Unsupported trend version ${trend.v}`);
+    }
+    return trend;
+}
+
+// { year, fields, rows: [[date, species, quantity, length, hatchery, report], ...] },
+// newest first, for the stockings of one water in one year; for year
+// 'earlier', { through, fields, rows: [[year, species, stockings, fish,
+// avg length, [hatcheries]], ...] } totals for the years before those
+async function fetchHistoryChunk(waterName, year) {
+    const response = await fetch(`${HISTORY_URL}${waterSlug(waterName)}/${year}.json`);
+    if (!response.ok) {
+        throw new Error(`Failed to load ${year} stockings (${response.status})`);
+    }
+    const chunk = await response.json();
+    if (chunk.v !== HISTORY_VERSION) {
+        throw new Error(`Unsupported history version ${chunk.v}`);
+    }
+    return chunk;
+}
+
+// Bar sparkline of a series as an inline SVG string
+function sparklineSvg(values, width = 240, height = 32, color = '#2563eb') {
+    const max = Math.max(...values, 1);
+    const barWidth = width / values.length;
+    const bars = values.map((v, i) => {
+        const h = v > 0 ? Math.max(1, Math.round(v / max * height)) : 0;
+        return `<rect x="${(i * barWidth).toFixed(1)}" y="${height - h}" width="${Math.max(barWidth - 1, 1).toFixed(1)}" height="${h}"/>`;
+    });
+    return `<svg width="${width}" height="${height}" viewBox="0 0 ${width} ${height}" fill="${color}" aria-hidden="true">${bars.join('')}</svg>`;
+}
+
+function daysSince(dateStr, now = new Date()) {
+    const today = Date.UTC(now.getFullYear(), now.getMonth(), now.getDate());
+    return Math.max(0, Math.round((today - Date.parse(dateStr)) / MS_PER_DAY));
+}
+
+// { label, classes } for a water last stocked on lastStocked ("YYYY-MM-DD"),
+// or null once that is more than RECENT_DAYS ago
+function freshnessBadge(lastStocked, now = new Date()) {
+    const days = daysSince(lastStocked, now);
+    if (days === 0) {
+        return { label: 'Stocked Today — Prime Fishing Window!', classes: 'bg-green-100 text-green-800 border-green-300' };
+    }
+    if (days <= 7) {
+        return { label: `Stocked ${days} day${days > 1 ? 's' : ''} ago — Prime Fishing Window`, classes: 'bg-green-100 text-green-800 border-green-300' };
+    }
+    if (days <= 21) {
+        return { label: `Stocked ${days} days ago — Fish Are Active`, classes: 'bg-yellow-100 text-yellow-800 border-yellow-300' };
+    }
+    if (days <= 60) {
+        return { label: `Stocked ${days} days ago — Worth a Trip`, classes: 'bg-orange-100 text-orange-800 border-orange-300' };
+    }
+    if (days <= RECENT_DAYS) {
+        const months = Math.round(days / 30);
+        return { label: `Last stocked ~${months} month${months > 1 ? 's' : ''} ago`, classes: 'bg-gray-100 text-gray-600 border-gray-300' };
+    }
+    return null;
+}
+
+// Past-6-months figures from [[date, species, fish, length or null], ...]
+// rows (newest first): { stockings, fish, species: [[name, count], ...] by
+// count, avgLength or null }
+function recentActivity(rows, now = new Date()) {
+    const recent = rows.filter(r => daysSince(r[0], now) < RECENT_DAYS);
+    const counts = new Map();
+    recent.forEach(r => counts.set(r[1], (counts.get(r[1]) || 0) + 1));
+    const lengths = recent.map(r => r[3]).filter(l => l !== null);
+    return {
+        stockings: recent.length,
+        fish: recent.reduce((sum, r) => sum + r[2], 0),
+        species: [...counts.entries()].sort((a, b) => b[1] - a[1]),
+        avgLength: lengths.length ? lengths.reduce((a, b) => a + b, 0) / lengths.length : null,
+    };
+}
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Week-bucketed index of stockings, and the "most recent stockings" window.
+
+The index in .build_cache/recent_index.json maps each stocking week (the
+Monday it starts on) to the waters stocked that week, with one entry per
+stocking day holding the day's summed quantity and its species in record
+order:
+
+    {"weeks": {"2026-08-17": {"<water>": [["2026-08-19", 5372, ["Rainbow Trout"]], ...]}},
+     "sigs": {"<water>": aggregates.signature(records)}}
+
+A water that only gained records at the front (aggregates.prepended_records)
+is added to its buckets from the new records alone; any other change
+re-buckets that water.
+
+recent.json is the window index.html's summary shows: every water stocked in
+the RECENT_DAYS days up to the newest stocking date, read from the one or two
+buckets the window overlaps:
+
+    public/data/recent.json
+    {"v": 1, "start": "YYYY-MM-DD", "end": "YYYY-MM-DD",
+     "waters": [{"n": name, "q": fish, "s": [species], "d": latest date}, ...]}
+
+Usage:
+    python recent_index.py [stocking_data.json] [public/data/recent.json]
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import re
+import sys
+from datetime import date, timedelta
+
+from aggregates import signature, signature_matches, extend_signature, prepended_records
+from json_writer import write_json
+
+STATE_FILE = os.path.join(".build_cache", "recent_index.json")
+STATE_VERSION = 3
+RECENT_FILE = os.path.join("public", "data", "recent.json")
+FORMAT_VERSION = 1
+RECENT_DAYS = 7
+
+_LEADING_INT = re.compile(r'\s*([+-]?\d+)')
+
+
+def _quantity(value):
+    """parseInt() semantics, as the home page used: leading digits, else 0."""
+    m = _LEADING_INT.match(str(value))
+    return int(m.group(1)) if m else 0
+
+
+def _week_of(date_str):
+    d = date.fromisoformat(date_str)
+    return (d - timedelta(days=d.weekday())).isoformat()
+
+
+def _indexed(weeks, name, date_str):
+    try:
+        week = _week_of(date_str)
+    except (TypeError, ValueError):
+        return False
+    return any(e[0] == date_str for e in weeks.get(week, {}).get(name, []))
+
+
+def _bucket(weeks, name, records):
+    """Add `records` (newest first) to the week buckets of water `name`."""
+    for r in records:
+        try:
+            week = _week_of(r['date'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        days = weeks.setdefault(week, {}).setdefault(name, [])
+        entry = next((e for e in days if e[0] == r['date']), None)
+        if entry is None:
+            entry = [r['date'], 0, []]
+            days.append(entry)
+        entry[1] += _quantity(r.get('quantity', ''))
+        if r.get('species') not in entry[2]:
+            entry[2].append(r.get('species'))
+        days.sort(key=lambda e: e[0], reverse=True)
+
+
+def _rules_hash():
+    source = inspect.getsource(_bucket) + inspect.getsource(_quantity)
+    return hashlib.sha256(f"{STATE_VERSION}:{source}".encode('utf-8')).hexdigest()
+
+
+def load_state(path=STATE_FILE):
+    """Saved index, or {} if missing, unreadable or built by other code."""
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(state, dict) or state.get("rules") != _rules_hash():
+        return {}
+    return state
+
+
+def update_index(state, data):
+    """
+    Bring the week buckets in `state` up to date with `data`.
+    Returns (new_state, {"unchanged"/"extended"/"rebuilt": count}).
+    """
+    weeks = state.get("weeks", {})
+    sigs = state.get("sigs", {})
+    counts = {"unchanged": 0, "extended": 0, "rebuilt": 0}
+    new_sigs = {}
+    extended = {}
+    rebuilt = {name for name in sigs if name not in data}
+    for name, water in data.items():
+        records = water.get("records", [])
+        sig = sigs.get(name)
+        if sig is not None and signature_matches(sig, records):
+            new_sigs[name] = sig
+            counts["unchanged"] += 1
+            continue
+        added = prepended_records(sig, records) if sig is not None else None
+        # A new record on a day already indexed would change that day's species order
+        if added is not None and not any(_indexed(weeks, name, r.get('date')) for r in added):
+            new_sigs[name] = extend_signature(sig, added)
+            extended[name] = added
+            counts["extended"] += 1
+        else:
+            new_sigs[name] = signature(records)
+            rebuilt.add(name)
+            counts["rebuilt"] += 1
+
+    # Waters that are gone or re-bucketed from scratch leave every bucket first
+    if rebuilt:
+        for week in list(weeks):
+            for name in rebuilt & weeks[week].keys():
+                del weeks[week][name]
+            if not weeks[week]:
+                del weeks[week]
+
+    for name, records in extended.items():
+        _bucket(weeks, name, records)
+    for name in rebuilt & data.keys():
+        _bucket(weeks, name, data[name].get("records", []))
+    return {"rules": _rules_hash(), "weeks": weeks, "sigs": new_sigs}, counts
+
+
+def recent_window(state, days=RECENT_DAYS):
+    """The recent.json payload for the `days` days up to the newest stocking."""
+    weeks = state.get("weeks", {})
+    if not weeks:
+        return {"v": FORMAT_VERSION, "start": None, "end": None, "waters": []}
+    latest_week = max(weeks)
+    end = max(e[0] for entries in weeks[latest_week].values() for e in entries)
+    start = (date.fromisoformat(end) - timedelta(days=days - 1)).isoformat()
+
+    by_water = {}
+    for week in sorted((w for w in weeks if w >= _week_of(start)), reverse=True):
+        for name, entries in weeks[week].items():
+            by_water.setdefault(name, []).extend(e for e in entries if start <= e[0] <= end)
+    waters = []
+    for name in sorted(by_water):
+        entries = by_water[name]
+        if not entries:
+            continue
+        species = []
+        for e in entries:
+            species.extend(s for s in e[2] if s not in species)
+        waters.append({"n": name, "q": sum(e[1] for e in entries), "s": species, "d": entries[0][0]})
+    return {"v": FORMAT_VERSION, "start": start, "end": end, "waters": waters}
+
+
+def write_recent(data, path=RECENT_FILE, state_path=STATE_FILE):
+    """Update the index and write recent.json. Returns True if recent.json changed."""
+    state, counts = update_index(load_state(state_path), data)
+    write_json(state_path, state, inline_depth=3)
+    print(f"Recent index: {counts['unchanged']} unchanged, {counts['extended']} extended, "
+          f"{counts['rebuilt']} rebuilt")
+    return write_json(path, recent_window(state), inline_depth=0)
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else "stocking_data.json"
+    path = sys.argv[2] if len(sys.argv) > 2 else RECENT_FILE
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    changed = write_recent(data, path)
+    print(f"{path}: {os.path.getsize(path):,} bytes" + ("" if changed else ", unchanged"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Append-only journal of merged stocking records.
+
+Instead of rewriting stocking_data_clean.json and copying the previous version
+to a backup file on every run, each processed report is appended to
+stocking_journal.jsonl as one batch (a single JSON line with a checksum):
+
+    {"batch": 3, "report": "<url>", "records": {"<water>": [...]}, "checksum": "<sha256>"}
+
+The clean snapshot plus the journal is the current dataset. The snapshot is
+only rewritten when the journal is compacted (every COMPACT_EVERY batches, or
+whenever cleanup_data.py writes a fresh snapshot), after which the journal is
+emptied.
+
+Because batches are only ever appended, a crash can at worst leave a torn last
+line; it fails its checksum and is dropped on the next read. Rolling back is
+just truncating the journal to a batch boundary:
+
+    python record_journal.py status
+    python record_journal.py rollback 2      # keep batches 1-2, drop the rest
+    python record_journal.py compact
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+from json_writer import write_json
+from scraper import merge_water_records, OUTPUT_FILE
+
+JOURNAL_FILE = "stocking_journal.jsonl"
+SNAPSHOT_FILE = "stocking_data_clean.json"
+COMPACT_EVERY = 8
+
+
+BATCH_KEYS = ("batch", "report", "records")
+
+
+def _checksum(batch):
+    payload = {k: batch[k] for k in BATCH_KEYS}
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def read_batches(path=JOURNAL_FILE):
+    """
+    Return a list of (batch, end_offset) for every intact batch in the journal.
+    Reading stops at the first torn or corrupt line.
+    """
+    batches = []
+    if not os.path.exists(path):
+        return batches
+    offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                batch = json.loads(line)
+            except ValueError:
+                break
+            # A line missing a batch key is as corrupt as one that fails its checksum
+            if (not isinstance(batch, dict) or not all(k in batch for k in BATCH_KEYS)
+                    or batch.get("checksum") != _checksum(batch)):
+                break
+            offset += len(line)
+            batches.append((batch, offset))
+    return batches
+
+
+def _truncate(path, offset):
+    with open(path, 'r+b') as f:
+        f.truncate(offset)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def append_batch(report_url, records_by_water, path=JOURNAL_FILE):
+    """Durably append one report's newly merged records. Returns the batch number."""
+    batches = read_batches(path)
+    end = batches[-1][1] if batches else 0
+    if os.path.exists(path) and os.path.getsize(path) != end:
+        # Drop a torn tail left by a crashed run before appending after it
+        _truncate(path, end)
+
+    batch = {
+        "batch": batches[-1][0]["batch"] + 1 if batches else 1,
+        "report": report_url,
+        "records": records_by_water,
+    }
+    batch["checksum"] = _checksum(batch)
+    with open(path, 'ab') as f:
+        f.write(json.dumps(batch, separators=(',', ':')).encode('utf-8') + b'\n')
+        f.flush()
+        os.fsync(f.fileno())
+    return batch["batch"]
+
+
+def replay(data, path=JOURNAL_FILE):
+    """Merge every journaled batch into `data` (idempotent). Returns the batch count."""
+    batches = read_batches(path)
+    key_cache = {}
+    for batch, _ in batches:
+        for water_name, records in batch["records"].items():
+            merge_water_records(data, water_name, records, key_cache)
+    return len(batches)
+
+
+def load_dataset(snapshot_path=SNAPSHOT_FILE, journal_path=JOURNAL_FILE):
+    """Snapshot + journal. Returns an empty dataset if neither exists."""
+    data = {}
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, 'r') as f:
+            data = json.load(f)
+    replay(data, journal_path)
+    return data
+
+
+def compact(data, snapshot_path=SNAPSHOT_FILE, journal_path=JOURNAL_FILE):
+    """Atomically write `data` as the new snapshot, then empty the journal."""
+    write_json(snapshot_path, data)
+    with open(journal_path, 'wb') as f:
+        os.fsync(f.fileno())
+
+
+def needs_compaction(path=JOURNAL_FILE):
+    return len(read_batches(path)) >= COMPACT_EVERY
+
+
+def rollback(to_batch, path=JOURNAL_FILE):
+    """Drop every batch after `to_batch`. Returns the number of batches removed."""
+    batches = read_batches(path)
+    keep = [(b, end) for b, end in batches if b["batch"] <= to_batch]
+    _truncate(path, keep[-1][1] if keep else 0)
+    return len(batches) - len(keep)
+
+
+def main():
+    args = sys.argv[1:]
+    command = args[0] if args else "status"
+
+    if command == "status":
+        batches = read_batches()
+        size = os.path.getsize(JOURNAL_FILE) if os.path.exists(JOURNAL_FILE) else 0
+        print(f"{JOURNAL_FILE}: {len(batches)} batches, {size:,} bytes")
+        for batch, _ in batches:
+            n = sum(len(r) for r in batch["records"].values())
+            print(f"  #{batch['batch']:<4} {n:>4} records  {batch['report']}")
+        if batches and size != batches[-1][1]:
+            print("  (torn tail after the last batch will be discarded on next append)")
+    elif command == "rollback" and len(args) == 2:
+        removed = rollback(int(args[1]))
+        print(f"Removed {removed} batch(es) from {JOURNAL_FILE}")
+        # Bring the published file back in line with snapshot + remaining journal
+        data = load_dataset()
+        write_json(OUTPUT_FILE, data)
+        print(f"Rewrote {OUTPUT_FILE} from {SNAPSHOT_FILE} + journal")
+    elif command == "compact":
+        data = load_dataset()
+        compact(data)
+        print(f"Compacted journal into {SNAPSHOT_FILE} ({len(data)} water bodies)")
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Optional SQLite-backed store for the stocking records.
+
+The JSON files (stocking_data.json / stocking_data_clean.json) remain the
+source the website reads. This store mirrors them in three indexed tables so
+that scripts can touch only the rows they need and ad-hoc questions become
+indexed lookups instead of full JSON scans:
+
+    waters   - one row per water body (name, position, coords/other keys)
+    reports  - one row per NMDGF report URL
+    records  - one row per stocking record, indexed on water, date, species,
+               hatchery and report
+
+Usage:
+    python record_store.py migrate [stocking_data.json]     # JSON -> SQLite
+    python record_store.py export  [stocking_data.json]     # SQLite -> JSON
+    python record_store.py query --species "Rainbow Trout" --month 3
+
+The export goes through json_writer, the same writer every pipeline stage
+uses: it holds the same JSON as the file the store was migrated from (same
+waters in the same order, same records), in json_writer's layout rather
+than necessarily the original bytes.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+from json_writer import write_json
+
+DB_FILE = os.environ.get("STOCKING_DB", "stocking_data.db")
+JSON_FILE = "stocking_data.json"
+
+# Fields every parser-produced record has. Records with any other set of keys
+# are stored verbatim in records.raw so the export can reproduce them exactly.
+RECORD_FIELDS = ("date", "species", "quantity", "length", "hatchery", "reportUrl")
+_RECORD_FIELD_SET = frozenset(RECORD_FIELDS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS waters (
+    id       INTEGER PRIMARY KEY,
+    name     TEXT NOT NULL UNIQUE,
+    position INTEGER NOT NULL,
+    meta     TEXT NOT NULL          -- water dict with "records": null
+);
+CREATE TABLE IF NOT EXISTS reports (
+    id             INTEGER PRIMARY KEY,
+    url            TEXT NOT NULL UNIQUE,
+    normalized_url TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    id        INTEGER PRIMARY KEY,  -- insertion order; breaks ties between same-date records
+    water_id  INTEGER NOT NULL REFERENCES waters(id),
+    report_id INTEGER REFERENCES reports(id),
+    date      TEXT,
+    month     INTEGER,
+    species   TEXT,
+    quantity  TEXT,
+    length    TEXT,
+    hatchery  TEXT,
+    raw       TEXT NOT NULL DEFAULT ''
+);
+-- SQLite treats NULLs as distinct in a unique index, so the nullable columns
+-- are compared through COALESCE; otherwise a record without a report URL
+-- would be inserted again on every import
+CREATE UNIQUE INDEX IF NOT EXISTS idx_records_key
+    ON records(water_id, COALESCE(date, ''), COALESCE(species, ''), COALESCE(quantity, ''),
+               COALESCE(length, ''), COALESCE(hatchery, ''), COALESCE(report_id, 0), raw);
+CREATE INDEX IF NOT EXISTS idx_records_water    ON records(water_id, date);
+CREATE INDEX IF NOT EXISTS idx_records_date     ON records(date);
+CREATE INDEX IF NOT EXISTS idx_records_species  ON records(species, month);
+CREATE INDEX IF NOT EXISTS idx_records_hatchery ON records(hatchery);
+CREATE INDEX IF NOT EXISTS idx_records_report   ON records(report_id);
+CREATE INDEX IF NOT EXISTS idx_reports_normalized ON reports(normalized_url);
+"""
+
+
+def normalize_report_url(url):
+    """Strip the refresh token NMDGF appends to download links."""
+    return url.split('&refresh=')[0].split('?refresh=')[0]
+
+
+def _drop_old_identity_index(conn):
+    """
+    Stores created with the old NULL-blind identity index may hold duplicate
+    records; keep the first copy of each before the new index is built.
+    """
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_records_identity'").fetchone():
+        return
+    with conn:
+        conn.execute(
+            "DELETE FROM records WHERE id NOT IN (SELECT MIN(id) FROM records GROUP BY water_id, "
+            "COALESCE(date, ''), COALESCE(species, ''), COALESCE(quantity, ''), COALESCE(length, ''), "
+            "COALESCE(hatchery, ''), COALESCE(report_id, 0), raw)")
+        conn.execute("DROP INDEX idx_records_identity")
+
+
+def open_store(path=DB_FILE):
+    """Open (creating if needed) the SQLite store and return the connection."""
+    conn = sqlite3.connect(path)
+    _drop_old_identity_index(conn)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _month(date_str):
+    try:
+        return int(date_str[5:7])
+    except (TypeError, ValueError):
+        return None
+
+
+def _report_id(conn, url, cache):
+    if url is None:
+        return None
+    if url not in cache:
+        conn.execute("INSERT OR IGNORE INTO reports (url, normalized_url) VALUES (?, ?)",
+                     (url, normalize_report_url(url)))
+        cache[url] = conn.execute("SELECT id FROM reports WHERE url = ?", (url,)).fetchone()[0]
+    return cache[url]
+
+
+def _water_id(conn, water_name, water_data=None):
+    row = conn.execute("SELECT id FROM waters WHERE name = ?", (water_name,)).fetchone()
+    if row:
+        return row[0]
+    meta = {k: (None if k == "records" else v) for k, v in (water_data or {"records": []}).items()}
+    position = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM waters").fetchone()[0]
+    cur = conn.execute("INSERT INTO waters (name, position, meta) VALUES (?, ?, ?)",
+                       (water_name, position, json.dumps(meta)))
+    return cur.lastrowid
+
+
+def add_records(conn, water_name, records, report_cache=None):
+    """
+    Insert records for one water, ignoring ones already stored.
+    Returns the number of rows actually inserted.
+    """
+    if report_cache is None:
+        report_cache = {}
+    water_id = _water_id(conn, water_name)
+    inserted = 0
+    for rec in records:
+        raw = "" if rec.keys() == _RECORD_FIELD_SET else json.dumps(rec, sort_keys=True)
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO records "
+            "(water_id, report_id, date, month, species, quantity, length, hatchery, raw) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (water_id, _report_id(conn, rec.get("reportUrl"), report_cache),
+             rec.get("date"), _month(rec.get("date")), rec.get("species"),
+             rec.get("quantity"), rec.get("length"), rec.get("hatchery"), raw))
+        inserted += cur.rowcount
+    return inserted
+
+
+def set_water_meta(conn, water_name, water_data):
+    """Replace the non-record keys (e.g. coords) stored for a water."""
+    water_id = _water_id(conn, water_name, water_data)
+    meta = {k: (None if k == "records" else v) for k, v in water_data.items()}
+    conn.execute("UPDATE waters SET meta = ? WHERE id = ?", (json.dumps(meta), water_id))
+
+
+def import_data(conn, data):
+    """Load a full stocking dataset dict into the store (idempotent)."""
+    report_cache = {}
+    with conn:
+        for water_name, water_data in data.items():
+            set_water_meta(conn, water_name, water_data)
+            add_records(conn, water_name, water_data.get("records", []), report_cache)
+
+
+def _record_from_row(row):
+    date, species, quantity, length, hatchery, url, raw = row
+    if raw:
+        return json.loads(raw)
+    return {"date": date, "species": species, "quantity": quantity,
+            "length": length, "hatchery": hatchery, "reportUrl": url}
+
+
+def water_records(conn, water_name):
+    """Records for a single water, newest first (same order as the JSON)."""
+    rows = conn.execute(
+        "SELECT r.date, r.species, r.quantity, r.length, r.hatchery, p.url, r.raw "
+        "FROM records r JOIN waters w ON w.id = r.water_id "
+        "LEFT JOIN reports p ON p.id = r.report_id "
+        "WHERE w.name = ? ORDER BY r.date DESC, r.id", (water_name,))
+    return [_record_from_row(row) for row in rows]
+
+
+def export_data(conn):
+    """Rebuild the stocking dataset dict exactly as it would appear in JSON."""
+    data = {}
+    waters = conn.execute("SELECT id, name, meta FROM waters ORDER BY position").fetchall()
+    by_id = {}
+    for water_id, name, meta in waters:
+        data[name] = json.loads(meta)
+        data[name]["records"] = []
+        by_id[water_id] = data[name]["records"]
+
+    rows = conn.execute(
+        "SELECT r.water_id, r.date, r.species, r.quantity, r.length, r.hatchery, p.url, r.raw "
+        "FROM records r LEFT JOIN reports p ON p.id = r.report_id "
+        "ORDER BY r.water_id, r.date DESC, r.id")
+    for row in rows:
+        by_id[row[0]].append(_record_from_row(row[1:]))
+    return data
+
+
+def processed_report_urls(conn):
+    """Normalized URLs of every report that contributed at least one record."""
+    return {row[0] for row in conn.execute("SELECT DISTINCT normalized_url FROM reports")}
+
+
+def _contains(text):
+    """LIKE pattern matching `text` anywhere (case-insensitive for ASCII), with % and _ literal."""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def query_records(conn, species=None, month=None, water=None, hatchery=None, year=None):
+    """
+    Record lookup returning (water_name, record) tuples, newest first.
+    `species` and `hatchery` match any name containing them, ignoring case
+    ("Rainbow Trout" finds "Triploid Rainbow Trout"); `water` is exact.
+    """
+    clauses, params = [], []
+    if species:
+        clauses.append("r.species LIKE ? ESCAPE '\\'")
+        params.append(_contains(species))
+    if month:
+        clauses.append("r.month = ?")
+        params.append(int(month))
+    if water:
+        clauses.append("w.name = ?")
+        params.append(water)
+    if hatchery:
+        clauses.append("r.hatchery LIKE ? ESCAPE '\\'")
+        params.append(_contains(hatchery))
+    if year:
+        clauses.append("r.date >= ? AND r.date < ?")
+        params.extend([f"{int(year):04d}-01-01", f"{int(year) + 1:04d}-01-01"])
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    rows = conn.execute(
+        "SELECT w.name, r.date, r.species, r.quantity, r.length, r.hatchery, p.url, r.raw "
+        "FROM records r JOIN waters w ON w.id = r.water_id "
+        f"LEFT JOIN reports p ON p.id = r.report_id {where} "
+        "ORDER BY r.date DESC, r.id", params)
+    return [(row[0], _record_from_row(row[1:])) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=DB_FILE, help=f"SQLite file (default: {DB_FILE})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_migrate = sub.add_parser("migrate", help="Import a stocking JSON file into the store")
+    p_migrate.add_argument("json_file", nargs="?", default=JSON_FILE)
+
+    export_help = ("Write the store back out as stocking JSON: the same data as the migrated file, "
+                   "in json_writer's layout rather than its original bytes")
+    p_export = sub.add_parser("export", help=export_help, description=export_help)
+    p_export.add_argument("json_file", nargs="?", default=JSON_FILE)
+
+    p_query = sub.add_parser("query", help="Record lookup")
+    p_query.add_argument("--species", help="Part of the species name, any case")
+    p_query.add_argument("--month", type=int)
+    p_query.add_argument("--water")
+    p_query.add_argument("--hatchery", help="Part of the hatchery name, any case")
+    p_query.add_argument("--year", type=int)
+
+    args = parser.parse_args()
+    conn = open_store(args.db)
+
+    if args.command == "migrate":
+        with open(args.json_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        import_data(conn, data)
+        total = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        print(f"Migrated {len(data)} water bodies into {args.db} ({total} records stored)")
+    elif args.command == "export":
+        data = export_data(conn)
+        if write_json(args.json_file, data):
+            print(f"Exported {len(data)} water bodies to {args.json_file}")
+        else:
+            print(f"{args.json_file} already up to date")
+    elif args.command == "query":
+        results = query_records(conn, species=args.species, month=args.month, water=args.water,
+                                hatchery=args.hatchery, year=args.year)
+        for water_name, rec in results:
+            print(f"{rec['date']}  {water_name:<45} {rec['species']:<20} {rec['quantity']:>7}  {rec['hatchery']}")
+        print(f"\n{len(results)} records")
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+vercel.json redirects for water pages that no longer exist.
+
+After each page build, the pages no water owns any more (see
+scraper.orphan_pages()) are retired: each gets a permanent redirect to the
+live page it became, if there is one, and is then deleted along with its
+history (scraper.prune_orphan_pages()). The live page is found from
+
+  * cleanup_data's merge groups: every variation of a merged water points at
+    the merged water's page;
+  * the old water name, read back from the orphaned page: it normalizes
+    (cleanup_data.normalize_name()) to a live water's name, e.g.
+    "1,435.00 Trees Lake" or "Tree Lake" -> Trees Lake, or it is a live name
+    with the start of a hatchery name glued on by the parser, e.g.
+    "Alto Lake Rock Lake Trout Rearing" -> Alto Lake;
+  * the redirects already in vercel.json, for names like
+    "Conservancy Park Lake (Aka Tingley Lisboa Springs Trout" whose
+    hatchery-free form is itself an old, redirected URL.
+
+Pages none of these map are only deleted. A redirect looks like
+
+    {"source": "/public/waters/<old slug>.html",
+     "destination": "/public/waters/<live slug>.html", "permanent": true}
+
+Redirects already in vercel.json (hand-written or added by an earlier build)
+are kept, so a URL stays redirected after its page is gone. One whose
+destination was itself retired is pointed at where that page went; one
+whose source is a live page (it would hide the page) or that leads to no
+live page is dropped. Other redirects are left alone, and the file keeps its
+key order, new entries going at the end.
+
+Usage:
+    python redirects.py [stocking_data.json] [vercel.json]
+"""
+
+import json
+import re
+import sys
+
+import cleanup_data
+import scraper
+from json_writer import write_json
+from scraper import water_slug
+
+VERCEL_FILE = "vercel.json"
+
+# Page slugs as water_slug() makes them; older pages with other characters
+# in their file names (e.g. "aztec-pond-#1.html") are not redirected
+_PAGE_URL = re.compile(r'/public/waters/([a-z0-9-]+)\.html')
+
+
+def _page_url(slug):
+    return f"/public/waters/{slug}.html"
+
+
+def merge_redirects(groups):
+    """{old slug: slug it was merged into} from cleanup_data's merge groups."""
+    moved = {}
+    for group in groups.values():
+        if group["best"] is None:
+            continue
+        target = water_slug(group["best"])
+        for name, _ in group["members"]:
+            slug = water_slug(name)
+            if slug != target:
+                moved[slug] = target
+    return moved
+
+
+def name_candidates(name, hatcheries):
+    """
+    Names the water called `name` may really be: `name` itself, then `name`
+    without a trailing run of two or more words that starts one of the
+    `hatcheries` ("Alto Lake Los Ojos Hatchery" -> "Alto Lake"), longest
+    run first.
+    """
+    words = name.split()
+    lowered = [w.lower() for w in words]
+    stripped = set()
+    for hatchery in hatcheries:
+        prefix = hatchery.lower().split()
+        for k in range(2, min(len(prefix), len(words) - 1) + 1):
+            if lowered[-k:] == prefix[:k]:
+                stripped.add(len(words) - k)
+    return [name] + [" ".join(words[:n]) for n in sorted(stripped)]
+
+
+def _redirect_targets(redirects):
+    """{source slug: destination slug} for the water-page entries of `redirects`."""
+    targets = {}
+    for entry in redirects:
+        source = _PAGE_URL.fullmatch(entry.get("source", ""))
+        destination = _PAGE_URL.fullmatch(entry.get("destination", ""))
+        if source and destination:
+            targets.setdefault(source.group(1), destination.group(1))
+    return targets
+
+
+def _resolve(slug, targets, pages):
+    """The live page `slug` ends up at through `targets`, or None."""
+    seen = set()
+    while slug not in pages and slug in targets and slug not in seen:
+        seen.add(slug)
+        slug = targets[slug]
+    return slug if slug in pages else None
+
+
+def orphan_redirects(orphans, names, hatcheries, targets, pages):
+    """
+    {old slug: slug to redirect to} for `orphans` ({page filename: old water
+    name}), matching old names against the live water `names` ({name: slug})
+    through normalize_name() and name_candidates(). A candidate with no live
+    match may still reach a live page through `targets`.
+    """
+    by_normalized = {cleanup_data.normalize_name(name): slug for name, slug in names.items()}
+    moved = {}
+    for filename, name in orphans.items():
+        if not name or not _PAGE_URL.fullmatch(_page_url(filename[:-len(".html")])):
+            continue
+        candidates = name_candidates(name, hatcheries)
+        for candidate in candidates:
+            target = by_normalized.get(cleanup_data.normalize_name(candidate))
+            if target is not None:
+                break
+        else:
+            target = next((water_slug(c) for c in candidates[1:] if _resolve(water_slug(c), targets, pages)), None)
+        if target is not None:
+            moved[filename[:-len(".html")]] = target
+    return moved
+
+
+def update_redirects(redirects, moved, pages):
+    """
+    `redirects` (vercel.json's list) with `moved` ({old slug: new slug}) added
+    and stale water-page entries removed; `pages` is the set of live page
+    slugs. Returns (redirects, number added, number dropped).
+    """
+    targets = _redirect_targets(redirects)
+    existing = set(targets)
+    for slug, target in moved.items():
+        targets.setdefault(slug, target)
+
+    result = []
+    kept = set()
+    dropped = 0
+    for entry in redirects:
+        source = _PAGE_URL.fullmatch(entry.get("source", ""))
+        if not (source and _PAGE_URL.fullmatch(entry.get("destination", ""))):
+            result.append(entry)
+            continue
+        slug = source.group(1)
+        destination = _resolve(targets[slug], targets, pages)
+        if slug in pages or slug in kept or destination is None:
+            dropped += 1
+            continue
+        kept.add(slug)
+        result.append({**entry, "destination": _page_url(destination)})
+    added = 0
+    for slug in sorted(set(moved) - existing - pages):
+        destination = _resolve(moved[slug], targets, pages)
+        if destination is not None:
+            result.append({"source": _page_url(slug), "destination": _page_url(destination), "permanent": True})
+            added += 1
+    return result, added, dropped
+
+
+def retire_orphan_pages(data, manifest, groups=None, path=VERCEL_FILE):
+    """
+    Redirect every page no entry of the page `manifest` owns to the live page
+    it became, if any, then delete it (scraper.prune_orphan_pages()). `data`
+    is the dataset the pages were built from; `groups` are cleanup_data's
+    merge groups, read from its state when not given. Does nothing without a
+    manifest. Returns True if `path` changed.
+    """
+    if not manifest:
+        print("No page manifest; orphaned pages and redirects left as they are")
+        return False
+    if groups is None:
+        groups = cleanup_data.load_state().get("groups", {})
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    redirects = config.get("redirects", [])
+    names = {name: entry["page"][:-len(".html")] for name, entry in manifest.items()}
+    pages = set(names.values())
+    hatcheries = {r['hatchery'] for water in data.values() for r in water.get("records", []) if r.get('hatchery')}
+    orphans = scraper.orphan_pages(manifest)
+
+    moved = merge_redirects(groups)
+    targets = {**moved, **_redirect_targets(redirects)}
+    for slug, target in orphan_redirects(orphans, names, hatcheries, targets, pages).items():
+        moved.setdefault(slug, target)
+    config["redirects"], added, dropped = update_redirects(redirects, moved, pages)
+    changed = write_json(path, config, sort_keys=False)
+
+    redirected = set(_redirect_targets(config["redirects"]))
+    unmapped = sorted(f for f in orphans if f[:-len(".html")] not in redirected)
+    removed = scraper.prune_orphan_pages(manifest)
+    print(f"Redirects: {len(config['redirects'])} in {path}, {added} added, {dropped} dropped")
+    if orphans:
+        print(f"Retired {len(orphans)} orphaned page(s): {len(orphans) - len(unmapped)} redirected, "
+              f"{len(unmapped)} with no live page to point at")
+        for filename in unmapped:
+            print(f"  [no redirect] {filename} ({orphans[filename]})")
+    if len(removed) > len(orphans):
+        print(f"Removed {len(removed) - len(orphans)} orphaned history folder(s)")
+    return changed
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else scraper.OUTPUT_FILE
+    path = sys.argv[2] if len(sys.argv) > 2 else VERCEL_FILE
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    retire_orphan_pages(data, scraper._load_page_manifest(), path=path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,10 @@
 import requests
 from bs4 import BeautifulSoup
+import hashlib
+import html as html_lib
+import inspect
 import json
+import math
 import re
 from datetime import datetime, date, timedelta
 import pdfplumber
@@ -9,6 +13,10 @@ import os
 import shutil
 import time
 import sys
+from functools import lru_cache
+import page_fragments
+import stats_engine
+from json_writer import dumps, write_json, write_text
 
 # This is the single, definitive script for all scraping operations.
 
@@ -20,8 +28,23 @@ BACKUP_FILE = "stocking_data.json.bak"
 TEMPLATE_FILE = "template.html"
 OUTPUT_DIR = "public/waters"
 SITEMAP_FILE = "public/sitemap.xml"
+SITEMAP_DIR = "public/sitemaps"
+SITEMAP_MAX_URLS = 50000  # per sitemap file, the protocol's limit
 MANUAL_COORDS_FILE = "manual_coordinates.json"
 WATER_IMAGES_FILE  = "water_images.json"
+PAGE_MANIFEST_FILE = os.path.join(OUTPUT_DIR, ".page_manifest.json")
+PAGE_MANIFEST_VERSION = 1
+RECENT_DAYS = 182  # the "past 6 months" on a water page
+PAGE_SLOTS = ("WATER_NAME", "TABLE_ROWS", "OLDER_HISTORY", "SUMMARY", "REGULATIONS", "WATER_IMAGE",
+              "META_DESCRIPTION", "PAGE_URL", "SCHEMA_ORG")
+HISTORY_DIR = os.path.join("public", "data", "history")
+HISTORY_VERSION = 1
+HISTORY_INLINE_DAYS = 365  # rows inlined in a page, back from the water's latest stocking
+HISTORY_FIELDS = ("date", "species", "quantity", "length", "hatchery", "report")
+# Older years than the newest HISTORY_DETAIL_YEARS of a water's history are
+# only kept as per-year, per-species totals (the "earlier" chunk)
+HISTORY_DETAIL_YEARS = 3
+EARLIER_FIELDS = ("year", "species", "stockings", "fish", "avg_length", "hatcheries")
 
 def validate_url(url, timeout=5):
     """
@@ -58,6 +81,16 @@ def get_fallback_url(nmdgf_url):
         pass
     return None
 
+def _nmdgf_urls(records):
+    return {r['reportUrl'] for r in records if 'wildlife.dgf.nm.gov' in r.get("reportUrl", "")}
+
+def validate_report_urls(data):
+    """{url: validate_url(url)} for every NMDGF report link in `data`, each checked once."""
+    urls = set()
+    for water in data.values():
+        urls |= _nmdgf_urls(water.get("records", []))
+    return {url: validate_url(url) for url in sorted(urls)}
+
 def get_pdf_links_for_rebuild(start_url):
     """
     Scrapes archive pages starting from a hardcoded year and moving forward.
@@ -388,6 +421,62 @@ def final_parser(text, report_url):
 
     return all_records
 
+def record_key(record):
+    """Hashable identity of a stocking record, used for de-duplication.
+
+    Equivalent to json.dumps(record, sort_keys=True) for our flat records, but
+    without paying for a JSON encode on every comparison.
+    """
+    return tuple(sorted(record.items()))
+
+def _descending_insert_index(records, date_str):
+    """Index at which a record dated `date_str` belongs in a newest-first list.
+
+    Lands AFTER any existing records with the same date, which is where the old
+    append-then-stable-sort approach would have put it.
+    """
+    lo, hi = 0, len(records)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if records[mid]['date'] >= date_str:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def merge_water_records(final_data, water_name, new_records, key_cache=None):
+    """
+    Merge new records for one water body into final_data, keeping its record
+    list de-duplicated and sorted newest-first.
+
+    Existing lists are assumed to already be sorted (every writer keeps them
+    that way), so each new record is binary-inserted instead of re-sorting the
+    whole water. `key_cache` (dict) lets callers merging several reports reuse
+    each water's key set instead of rebuilding it per report.
+
+    Returns the list of records that were actually added.
+    """
+    if water_name not in final_data:
+        final_data[water_name] = {"records": []}
+    records = final_data[water_name].setdefault("records", [])
+
+    if key_cache is not None and water_name in key_cache:
+        existing = key_cache[water_name]
+    else:
+        existing = {record_key(rec) for rec in records}
+        if key_cache is not None:
+            key_cache[water_name] = existing
+
+    added = []
+    for rec in new_records:
+        key = record_key(rec)
+        if key in existing:
+            continue
+        existing.add(key)
+        records.insert(_descending_insert_index(records, rec['date']), rec)
+        added.append(rec)
+    return added
+
 def enrich_data_with_coordinates(data, manual_coords):
     """
     Adds latitude and longitude, prioritizing the manual override file.
@@ -433,12 +522,14 @@ def enrich_data_with_coordinates(data, manual_coords):
     print("--- Geocoding Enrichment Finished ---")
     return data
 
-def generate_summary_stats(records):
+def generate_summary_stats(records, now=None):
     """
     Generate summary statistics from stocking records, including recent activity.
+    stats_engine.summary_stats_all() computes the same thing for every water at once.
 
     Args:
         records: List of stocking records
+        now: Reference time for the recent window (default: datetime.now())
 
     Returns:
         Dict containing summary statistics with both recent (6-month) and lifetime data
@@ -465,7 +556,7 @@ def generate_summary_stats(records):
     earliest_date = dated_records[-1][0]
 
     # --- Recent stats (last 6 months from today) ---
-    today = datetime.now()
+    today = now or datetime.now()
     six_months_ago = today - timedelta(days=182)
     recent_records = [(d, r) for d, r in dated_records if d >= six_months_ago]
 
@@ -561,16 +652,102 @@ def generate_summary_stats(records):
         'lifetime_avg_length': lifetime_avg_length,
     }
 
-def generate_summary_html(water_name, stats, reg_species=None, booklet_species=None, advisory_url=None):
+def recent_rows(records):
+    """
+    [[date, species, fish, length midpoint or None], ...], newest first, for the
+    records within RECENT_DAYS of the water's latest stocking. Whatever the
+    visitor's date, their past-6-months window holds a subset of these.
+    """
+    dated = []
+    for r in records:
+        ordinal = stats_engine.parse_date(r['date'])[0] if 'date' in r else -1
+        if ordinal >= 0:
+            dated.append((ordinal, r))
+    if not dated:
+        return []
+    first = max(ordinal for ordinal, _ in dated) - RECENT_DAYS
+    dated.sort(key=lambda x: x[0], reverse=True)
+    rows = []
+    for ordinal, r in dated:
+        if ordinal < first:
+            break
+        length = stats_engine.parse_length(r.get('length', ''))
+        rows.append([r['date'], r.get('species', 'Unknown'), stats_engine.parse_quantity(r.get('quantity', 0)),
+                     None if math.isnan(length) else length])
+    return rows
+
+def generate_species_html(species_counts, reg_species=None, booklet_species=None, advisory_url=None):
+    """
+    "Species Present" block: stocked species (keys of `species_counts`), then
+    species listed in the regulations or the booklet that are not stocked,
+    and the consumption advisory link.
+    """
+    html = ""
+    stocked_species = sorted(species_counts)
+    # Normalize for deduplication: lowercase and strip trailing 's' for singular/plural matching
+    def _norm(s):
+        return s.lower().rstrip('s')
+    stocked_norm = {_norm(s) for s in stocked_species}
+
+    def _already_covered(name, existing_norm_set):
+        n = _norm(name)
+        return n in existing_norm_set
+
+    # Parse reg_species (comma-separated string or list) from ArcGIS trout_present field
+    wild_species = []
+    if reg_species:
+        if isinstance(reg_species, str):
+            candidates = [s.strip().title() for s in reg_species.split(',')]
+        else:
+            candidates = [s.strip().title() for s in reg_species]
+        wild_species = [s for s in candidates if not _already_covered(s, stocked_norm)]
+
+    # Merge booklet_species from water_species.json, deduplicating against stocked + reg
+    if booklet_species:
+        existing_norm = stocked_norm | {_norm(s) for s in wild_species}
+        for sp in booklet_species:
+            sp_title = sp.strip().title()
+            if not _already_covered(sp_title, existing_norm):
+                wild_species.append(sp_title)
+                existing_norm.add(_norm(sp_title))
+    wild_species = sorted(wild_species)
+
+    if stocked_species or wild_species:
+        html += '<div class="mt-4 pt-3 border-t border-gray-200">'
+        html += '<p class="text-xs font-semibold text-gray-500 uppercase tracking-wide mb-2">Species Present</p>'
+        html += '<div class="flex flex-wrap gap-2">'
+        for sp in stocked_species:
+            html += f'<span class="px-3 py-1 bg-blue-100 text-blue-800 text-xs font-medium rounded-full" title="Stocked by NMDGF">{sp}</span>'
+        for sp in wild_species:
+            html += f'<span class="px-3 py-1 bg-green-100 text-green-800 text-xs font-medium rounded-full" title="Present per fishing regulations">{sp} ✦</span>'
+        html += '</div>'
+        if wild_species:
+            html += '<p class="text-xs text-gray-400 mt-1">✦ Listed in fishing regulations (not stocked)</p>'
+        if advisory_url:
+            html += f'<p class="text-xs mt-2"><a href="{advisory_url}" target="_blank" rel="noopener noreferrer" class="text-red-600 hover:underline font-medium">Consumption Advisory</a></p>'
+        html += '</div>'
+    elif advisory_url:
+        html += f'<div class="mt-4 pt-3 border-t border-gray-200"><p class="text-xs"><a href="{advisory_url}" target="_blank" rel="noopener noreferrer" class="text-red-600 hover:underline font-medium">Consumption Advisory</a></p></div>'
+    return html
+
+def generate_summary_html(water_name, stats, reg_species=None, booklet_species=None, advisory_url=None,
+                          recent=None, species_html=None):
     """
     Generate HTML summary with recent activity up top, compact historical below.
 
+    Nothing here depends on today's date, so a page only changes when its data
+    does: the freshness badge is rendered as "Last stocked <date>" and the page
+    script (template.html) turns it into "Stocked N days ago", and computes the
+    past-6-months line from `recent`, embedded as JSON.
+
     Args:
         water_name: Name of the water body
-        stats: Dict of summary statistics
+        stats: Dict of summary statistics (only the date-independent figures are used)
         reg_species: Species from ArcGIS regulation data (trout_present field)
         booklet_species: Species from NMDGF fishing rules booklet (water_species.json)
         advisory_url: URL to the consumption advisory page in the NMDGF regulations PDF
+        recent: recent_rows() of the water's records
+        species_html: generate_species_html() for these arguments, if already rendered
 
     Returns:
         HTML string with summary
@@ -593,50 +770,13 @@ def generate_summary_html(water_name, stats, reg_species=None, booklet_species=N
     except:
         earliest_year = stats.get('earliest', '')
 
-    # --- Freshness badge ---
-    days = stats.get('days_since_last', 9999)
-    if days == 0:
-        fc = "bg-green-100 text-green-800 border-green-300"
-        fl = "Stocked Today — Prime Fishing Window!"
-    elif days <= 7:
-        fc = "bg-green-100 text-green-800 border-green-300"
-        fl = f"Stocked {days} day{'s' if days > 1 else ''} ago — Prime Fishing Window"
-    elif days <= 21:
-        fc = "bg-yellow-100 text-yellow-800 border-yellow-300"
-        fl = f"Stocked {days} days ago — Fish Are Active"
-    elif days <= 60:
-        fc = "bg-orange-100 text-orange-800 border-orange-300"
-        fl = f"Stocked {days} days ago — Worth a Trip"
-    elif days <= 182:
-        months = round(days / 30)
-        fc = "bg-gray-100 text-gray-600 border-gray-300"
-        fl = f"Last stocked ~{months} month{'s' if months > 1 else ''} ago"
-    else:
-        fc = "bg-gray-100 text-gray-500 border-gray-300"
-        fl = f"Last stocked {most_recent_str}"
-    html += f'<div class="inline-block px-4 py-2 rounded-full border text-sm font-semibold mb-3 {fc}">{fl}</div>'
-
-    # --- Recent activity (one line) ---
-    if stats['recent_stockings'] > 0:
-        recent_species = stats['recent_species_counts']
-        if len(recent_species) == 1:
-            sp_name = list(recent_species.keys())[0]
-            fish_str = f"<strong>{stats['recent_fish']:,} {sp_name}</strong>"
-        else:
-            sorted_sp = sorted(recent_species.items(), key=lambda x: x[1], reverse=True)
-            sp_names = [sp for sp, _ in sorted_sp]
-            if len(sp_names) == 2:
-                sp_joined = f"{sp_names[0]} and {sp_names[1]}"
-            else:
-                sp_joined = ", ".join(sp_names[:-1]) + f", and {sp_names[-1]}"
-            fish_str = f"<strong>{stats['recent_fish']:,} fish</strong> ({sp_joined})"
-
-        stat_parts = [f"<strong>{stats['recent_stockings']}</strong> stocking{'s' if stats['recent_stockings'] > 1 else ''} in the past 6 months", fish_str]
-        if stats.get('recent_avg_length'):
-            stat_parts.append(f"avg <strong>{stats['recent_avg_length']:.1f} in.</strong>")
-        html += '<p class="text-gray-700 mt-1">' + " &nbsp;·&nbsp; ".join(stat_parts) + '</p>'
-    else:
-        html += f'<p class="text-gray-500 mt-1">No stockings in the past 6 months — last stocked <strong>{most_recent_str}</strong>.</p>'
+    # --- Freshness badge and recent activity, filled in by the page script ---
+    html += (f'<div id="freshness-badge" data-last-stocked="{stats["most_recent"]}" '
+             f'class="inline-block px-4 py-2 rounded-full border text-sm font-semibold mb-3 '
+             f'bg-gray-100 text-gray-500 border-gray-300">Last stocked {most_recent_str}</div>')
+    recent_json = dumps(recent or [], inline_depth=0).replace('</', '<\\/')
+    html += f'<script type="application/json" id="recent-stockings">{recent_json}</script>'
+    html += '<p id="recent-activity" class="hidden text-gray-700 mt-1"></p>'
 
     # --- Compact stats line: frequency + peak + history ---
     stats_parts = []
@@ -657,58 +797,16 @@ def generate_summary_html(water_name, stats, reg_species=None, booklet_species=N
     html += '<p class="text-sm text-gray-400 mt-2 pt-2 border-t border-gray-200">' + " &nbsp;·&nbsp; ".join(stats_parts) + '</p>'
 
     # --- Species Present ---
-    stocked_species = sorted(stats.get('species_counts', {}).keys())
-    # Normalize for deduplication: lowercase and strip trailing 's' for singular/plural matching
-    def _norm(s):
-        return s.lower().rstrip('s')
-    stocked_norm = {_norm(s) for s in stocked_species}
-
-    def _already_covered(name, existing_norm_set):
-        n = _norm(name)
-        return n in existing_norm_set
-
-    # Parse reg_species (comma-separated string or list) from ArcGIS trout_present field
-    wild_species = []
-    if reg_species:
-        if isinstance(reg_species, str):
-            candidates = [s.strip().title() for s in reg_species.split(',')]
-        else:
-            candidates = [s.strip().title() for s in reg_species]
-        wild_species = [s for s in candidates if not _already_covered(s, stocked_norm)]
-
-    # Merge booklet_species from water_species.json, deduplicating against stocked + reg
-    if booklet_species:
-        existing_norm = stocked_norm | {_norm(s) for s in wild_species}
-        for sp in booklet_species:
-            sp_title = sp.strip().title()
-            if not _already_covered(sp_title, existing_norm):
-                wild_species.append(sp_title)
-                existing_norm.add(_norm(sp_title))
-    wild_species = sorted(wild_species)
-
-    if stocked_species or wild_species:
-        html += '<div class="mt-4 pt-3 border-t border-gray-200">'
-        html += '<p class="text-xs font-semibold text-gray-500 uppercase tracking-wide mb-2">Species Present</p>'
-        html += '<div class="flex flex-wrap gap-2">'
-        for sp in stocked_species:
-            html += f'<span class="px-3 py-1 bg-blue-100 text-blue-800 text-xs font-medium rounded-full" title="Stocked by NMDGF">{sp}</span>'
-        for sp in wild_species:
-            html += f'<span class="px-3 py-1 bg-green-100 text-green-800 text-xs font-medium rounded-full" title="Present per fishing regulations">{sp} ✦</span>'
-        html += '</div>'
-        if wild_species:
-            html += '<p class="text-xs text-gray-400 mt-1">✦ Listed in fishing regulations (not stocked)</p>'
-        if advisory_url:
-            html += f'<p class="text-xs mt-2"><a href="{advisory_url}" target="_blank" rel="noopener noreferrer" class="text-red-600 hover:underline font-medium">Consumption Advisory</a></p>'
-        html += '</div>'
-    elif advisory_url:
-        html += f'<div class="mt-4 pt-3 border-t border-gray-200"><p class="text-xs"><a href="{advisory_url}" target="_blank" rel="noopener noreferrer" class="text-red-600 hover:underline font-medium">Consumption Advisory</a></p></div>'
+    if species_html is None:
+        species_html = generate_species_html(stats.get('species_counts', {}), reg_species, booklet_species, advisory_url)
+    html += species_html
 
     html += '</div>'
     return html
 
 def generate_meta_description(water_name, stats):
     """
-    Generate SEO meta description focused on recent activity.
+    Generate SEO meta description from the latest stocking and lifetime totals.
 
     Args:
         water_name: Name of the water body
@@ -721,9 +819,7 @@ def generate_meta_description(water_name, stats):
         return f"Complete stocking history for {water_name} in New Mexico. View dates, species, and quantities."
 
     primary_species = ""
-    if stats['recent_species_counts']:
-        primary_species = max(stats['recent_species_counts'].items(), key=lambda x: x[1])[0]
-    elif stats['species_counts']:
+    if stats['species_counts']:
         primary_species = max(stats['species_counts'].items(), key=lambda x: x[1])[0]
 
     most_recent_str = ""
@@ -732,15 +828,10 @@ def generate_meta_description(water_name, stats):
     except:
         most_recent_str = stats['most_recent']
 
-    if stats['recent_stockings'] > 0:
-        description = f"{water_name}: stocked {stats['recent_stockings']} times in the last 6 months"
-        if primary_species:
-            description += f" with {primary_species}"
-        description += f". Last stocked {most_recent_str}."
-    else:
-        description = f"{water_name}: last stocked {most_recent_str}."
-        if primary_species:
-            description += f" {stats['total_stockings']} total stockings of {primary_species}."
+    # No "in the last 6 months" figures: the description must not change with the date
+    description = f"{water_name}: last stocked {most_recent_str}."
+    if primary_species:
+        description += f" {stats['total_stockings']} total stockings of {primary_species}."
 
     description += " View complete NM stocking history."
 
@@ -979,6 +1070,10 @@ def generate_water_image_html(water_name, water_images):
         f'</span></div></div>'
     )
 
+def water_slug(water_name):
+    """File-name slug of a water's page (public/waters/<slug>.html) and data files."""
+    return re.sub(r'[^a-z0-9]+', '-', water_name.lower()).strip('-')
+
 def _canonical_water_key(name):
     """Normalize a water-body name for fuzzy matching across data sources.
 
@@ -1029,10 +1124,252 @@ def _resolve_by_canonical(source, canonical_names):
     return resolved, unmatched
 
 
-def generate_static_pages(data):
+def _page_code_hash():
+    """Hash of the functions that render a page; a change re-renders every page."""
+    functions = (generate_static_pages, render_page, _row_html, compile_template, fill_template, _display_date,
+                 recent_rows, _roll_up, write_history, generate_summary_html, generate_species_html, generate_meta_description, generate_schema_org, generate_regulation_html,
+                 generate_water_image_html)
+    source = "".join(inspect.getsource(f) for f in functions)
+    return hashlib.sha256(f"{PAGE_MANIFEST_VERSION}:{source}".encode('utf-8')).hexdigest()
+
+def _load_page_manifest():
+    try:
+        with open(PAGE_MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest.get("pages", {}) if isinstance(manifest, dict) else {}
+
+def compile_template(template_html):
+    """
+    Split the page template at its {{SLOT}} placeholders (PAGE_SLOTS) into
+    [text, slot name, text, slot name, ..., text], once per build.
+    """
+    return re.split(r'\{\{(' + '|'.join(PAGE_SLOTS) + r')\}\}', template_html)
+
+def fill_template(compiled, values):
+    """The page for a compile_template() result and {slot name: html}."""
+    parts = compiled[:]
+    parts[1::2] = [values[slot] for slot in compiled[1::2]]
+    return "".join(parts)
+
+@lru_cache(maxsize=None)
+def _display_date(date_str):
+    """"2025-08-29" -> "Aug 29, 2025"; stocking dates repeat across waters."""
+    return datetime.strptime(date_str, "%Y-%m-%d").strftime("%b %d, %Y")
+
+# What render_page() needs besides the water itself; set in every worker
+# process by _init_page_worker()
+_page_context = None
+
+def _init_page_worker(context):
+    global _page_context
+    _page_context = context
+
+def _row_html(record, url):
+    """
+    One stocking-history table row; `url` is the report link to use, or None.
+    Cell styles and the row click handler live in template.html, once per page.
+    """
+    report_link_html = ""
+    if url:
+        # rel="nofollow" so Google doesn't pass authority to the NMDGF PDF.
+        # Hidden anchor — gives Google a proper tag to read, no visible UI change.
+        report_link_html = f'<a href="{url}" target="_blank" rel="nofollow noopener noreferrer" hidden></a>'
+    return (f'<tr class="clickable-row"><td>{_display_date(record["date"])}</td><td>{record["species"]}</td>'
+            f'<td>{record["quantity"]}</td><td>{record["length"]}</td><td>{record["hatchery"]}{report_link_html}</td></tr>\n')
+
+def render_page(job):
+    """
+    Render one water page from (water_name, water_data, summary_stats,
+    summary_html, meta_description, fragments) and the worker's
+    _page_context, reusing `fragments`, the water's cached blocks (see
+    page_fragments.py).
+
+    Only the rows of the HISTORY_INLINE_DAYS up to the water's latest stocking
+    go into the page. Older records become history chunks that the page loads
+    when asked to show them: one per year for the newest HISTORY_DETAIL_YEARS
+    years of the water's history, and one "earlier" chunk of per-year,
+    per-species totals for everything before (see _roll_up()).
+
+    Returns {"filename", "html", "validated", "fallback", "fragments" (used),
+    "history" ({year or "earlier": chunk payload}, newest first)}.
+    """
+    water_name, water_data, summary_stats, summary_html, meta_description, fragments = job
+    context = _page_context
+    filename = water_slug(water_name) + ".html"
+    records = water_data.get("records", [])
+    coords = water_data.get("coords")
+    validated_count = 0
+    fallback_count = 0
+    used = {}
+
+    def cached(kind, key, render):
+        return page_fragments.cached(fragments, used, kind, key, render)
+
+    ordinals = [stats_engine.parse_date(r['date'])[0] for r in records]
+    inline_from = max(ordinals, default=0) - HISTORY_INLINE_DAYS
+    rows = []
+    history = {}
+    for record, ordinal in zip(records, ordinals):
+        url = record.get("reportUrl") or None
+
+        # NMDGF URLs were validated up front; fall back to the local copy of broken ones
+        if url and 'wildlife.dgf.nm.gov' in url:
+            if context["url_status"].get(url):
+                validated_count += 1
+            else:
+                fallback = get_fallback_url(url)
+                if fallback:
+                    url = fallback
+                    fallback_count += 1
+
+        if ordinal < inline_from:
+            chunk = history.setdefault(record['date'][:4], [])
+            chunk.append([record['date'], record['species'], record['quantity'], record['length'],
+                          record['hatchery'], url])
+            continue
+
+        # A row is a function of the record's shown fields and its link
+        key = "\t".join((record['date'], record['species'], str(record['quantity']), str(record['length']),
+                         str(record['hatchery']), url or ""))
+        rows.append(cached("row", key, lambda: _row_html(record, url)))
+
+    # Detail chunks for the newest HISTORY_DETAIL_YEARS years, totals before that
+    years = sorted(history, reverse=True)
+    detail_from = str(date.fromordinal(max(ordinals)).year - HISTORY_DETAIL_YEARS + 1) if records else ""
+    chunks = {year: {"v": HISTORY_VERSION, "water": water_name, "year": int(year),
+                     "fields": list(HISTORY_FIELDS), "rows": history[year]}
+              for year in years if year >= detail_from}
+    earlier = [year for year in years if year < detail_from]
+    if earlier:
+        chunks["earlier"] = {"v": HISTORY_VERSION, "water": water_name, "through": int(earlier[0]),
+                             "fields": list(EARLIER_FIELDS), "rows": _roll_up(history, earlier)}
+
+    older_html = ""
+    if chunks:
+        older = sum(len(chunk) for chunk in history.values())
+        span = years[0] if len(years) == 1 else f"{years[-1]}–{years[0]}"
+        older_html = (f'<div id="older-stockings" class="mt-4 text-center" data-water="{water_name}" '
+                      f'data-years="{",".join(chunks)}"><button type="button" '
+                      f'class="px-4 py-2 text-sm font-medium text-blue-600 border border-blue-300 rounded-lg hover:bg-blue-50">'
+                      f'Show older stockings <span class="text-gray-500">({older:,} from {span})</span></button></div>')
+
+    # Generate regulation HTML if available
+    regulation_html = cached("regulations", page_fragments.content_key(water_name, context["regulations"].get(water_name)),
+                             lambda: generate_regulation_html(water_name, context["regulations"]))
+
+    # Generate page URL for social media tags
+    page_url = f"https://stockingreport.com/public/waters/{filename}"
+    schema_inputs = (water_name, coords, page_url, summary_stats and [
+        sorted(summary_stats['species_counts']), summary_stats['earliest'], summary_stats['most_recent'],
+        summary_stats['total_stockings'], summary_stats['total_fish']])
+    schema_org = cached("schema", page_fragments.content_key(*schema_inputs),
+                        lambda: generate_schema_org(water_name, summary_stats, coords, page_url))
+
+    water_image_html = cached("image", page_fragments.content_key(water_name, context["water_images"].get(water_name)),
+                              lambda: generate_water_image_html(water_name, context["water_images"]))
+
+    page_html = fill_template(context["template"], {
+        "WATER_NAME": water_name,
+        "TABLE_ROWS": "".join(rows),
+        "OLDER_HISTORY": older_html,
+        "SUMMARY": summary_html,
+        "REGULATIONS": regulation_html,
+        "WATER_IMAGE": water_image_html,
+        "META_DESCRIPTION": meta_description,
+        "PAGE_URL": page_url,
+        "SCHEMA_ORG": schema_org,
+    })
+    return {
+        "filename": filename,
+        "html": page_html,
+        "validated": validated_count,
+        "fallback": fallback_count,
+        "fragments": used,
+        "history": chunks,
+    }
+
+def _roll_up(history, years):
+    """
+    [[year, species, stockings, fish, avg length or None, [hatcheries]], ...]
+    for the history rows of `years` (newest first), species by name.
+    """
+    rows = []
+    for year in years:
+        by_species = {}
+        for _, species, quantity, length, hatchery, _ in history[year]:
+            total = by_species.setdefault(species, [0, 0, [], set()])
+            total[0] += 1
+            total[1] += stats_engine.parse_quantity(quantity)
+            midpoint = stats_engine.parse_length(length)
+            if not math.isnan(midpoint):
+                total[2].append(midpoint)
+            if hatchery:
+                total[3].add(hatchery)
+        for species in sorted(by_species):
+            stockings, fish, lengths, hatcheries = by_species[species]
+            avg_length = round(math.fsum(lengths) / len(lengths), 1) if lengths else None
+            rows.append([int(year), species, stockings, fish, avg_length, sorted(hatcheries)])
+    return rows
+
+def write_history(slug, chunks):
+    """
+    Write a water's older-history chunks to HISTORY_DIR/<slug>/<key>.json
+    (a year, or "earlier") and remove the ones it no longer has. Returns the
+    chunk keys, newest first.
+    """
+    directory = os.path.join(HISTORY_DIR, slug)
+    for year, payload in chunks.items():
+        write_json(os.path.join(directory, f"{year}.json"), payload, inline_depth=2)
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if filename.endswith(".json") and filename[:-len(".json")] not in chunks:
+                os.remove(os.path.join(directory, filename))
+    return list(chunks)
+
+def render_pages(jobs, context, workers=1):
+    """
+    render_page() for every job, in order. With workers > 1 the jobs are
+    split across a process pool whose workers receive `context` once, through
+    the pool initializer; the pages are the same as with workers=1.
+    """
+    workers = min(workers or 1, len(jobs))
+    if workers <= 1:
+        _init_page_worker(context)
+        return [render_page(job) for job in jobs]
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    chunksize = max(1, len(jobs) // (workers * 4))
+    # The pipeline calls this from a build-graph thread while other stages run;
+    # forking a multi-threaded process can leave a child stuck on a lock some
+    # other thread held, so the workers are spawned fresh instead
+    spawn = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=spawn, initializer=_init_page_worker,
+                             initargs=(context,)) as pool:
+        return list(pool.map(render_page, jobs, chunksize=chunksize))
+
+def generate_static_pages(data, regulations_data=None, stats=None, force=False, workers=1, merge_groups=None,
+                          url_status=None):
     """
     Generates an individual HTML page for each water body.
-    Validates NMDGF URLs and falls back to local copies when needed.
+    Validates NMDGF URLs and falls back to local copies when needed;
+    `url_status` is validate_report_urls(data) if already done.
+    `regulations_data` is the "matched_waters" dict; it is read from
+    matched_regulations.json when not given. `stats` maps water names to
+    summary stats (see aggregates.py); they are computed here when not given.
+
+    Older records go to per-year chunks under HISTORY_DIR (see render_page()).
+
+    Each page's inputs (records, coords, regulation block, booklet species,
+    advisory link, image entry, summary text, the local copies its broken
+    report links fall back to, template and rendering code) are hashed into
+    PAGE_MANIFEST_FILE, and a page whose hash is unchanged is not rendered
+    again unless `force` is set. Every report link is validated on each run,
+    so a page whose links broke or came back is rendered again. The remaining pages are rendered by `workers` processes
+    (see render_pages()). Pages and history no manifest entry owns are then
+    redirected where possible and removed (see redirects.retire_orphan_pages();
+    `merge_groups` are cleanup_data's, read from its state when not given).
     """
     print("\n--- Starting Static Page Generation ---")
     if not os.path.exists(TEMPLATE_FILE):
@@ -1041,11 +1378,19 @@ def generate_static_pages(data):
 
     with open(TEMPLATE_FILE, "r", encoding="utf-8") as f:
         template_html = f.read()
+    shared_inputs = [hashlib.sha256(template_html.encode('utf-8')).hexdigest(), _page_code_hash()]
+    previous_manifest = _load_page_manifest()
+    manifest = {}
+    today = date.today().isoformat()
+    fragment_rules = hashlib.sha256(dumps(shared_inputs, inline_depth=0).encode('utf-8')).hexdigest()
+    fragments = {} if force else page_fragments.load_fragments(fragment_rules)
+    used_fragments = {}
 
     # Load regulation data if available
-    regulations_data = {}
     regulations_file = "matched_regulations.json"
-    if os.path.exists(regulations_file):
+    if regulations_data is not None:
+        print(f"Using regulation data for {len(regulations_data)} water bodies.")
+    elif os.path.exists(regulations_file):
         try:
             with open(regulations_file, 'r', encoding='utf-8') as f:
                 regulations_json = json.load(f)
@@ -1053,6 +1398,8 @@ def generate_static_pages(data):
             print(f"Loaded regulation data for {len(regulations_data)} water bodies.")
         except Exception as e:
             print(f"Warning: Could not load regulation data: {e}")
+    if regulations_data is None:
+        regulations_data = {}
 
     # Load booklet species data from NMDGF fishing rules PDF
     water_species_data = {}
@@ -1106,21 +1453,29 @@ def generate_static_pages(data):
             reason = f"ambiguous -> {targets}" if targets else "no matching stocked water"
             print(f"  [species-match] {src_label}: '{key}' not attached ({reason}).")
 
-    # Cache for URL validation to avoid checking same URL multiple times
-    url_validation_cache = {}
-    validated_count = 0
-    fallback_count = 0
+    # Summary stats for every water in one batch (per water without NumPy)
+    if url_status is None:
+        url_status = validate_report_urls(data)
+    # Broken links -> the local copy render_page() links instead (None: kept as is)
+    fallbacks = {url: get_fallback_url(url) for url, valid in url_status.items() if not valid}
+
+    if stats is not None:
+        all_stats = stats
+    elif stats_engine.np is not None:
+        all_stats = stats_engine.summary_stats_all(data)
+    else:
+        all_stats = {name: generate_summary_stats(w.get("records", [])) for name, w in data.items()}
 
-    generated_count = 0
+    jobs = []
+    unchanged_count = 0
     for water_name, water_data in data.items():
-        print(f"  -> Generating page for {water_name}...")
-        filename = re.sub(r'[^a-z0-9]+', '-', water_name.lower()).strip('-') + ".html"
+        filename = water_slug(water_name) + ".html"
         filepath = os.path.join(OUTPUT_DIR, filename)
 
         # Generate summary statistics
         records = water_data.get("records", [])
         coords = water_data.get("coords")
-        summary_stats = generate_summary_stats(records)
+        summary_stats = all_stats[water_name]
 
         # Pull native/wild species from regulation data if available
         reg_species = None
@@ -1138,105 +1493,231 @@ def generate_static_pages(data):
         advisory_page = consumption_advisories.get(water_name)
         advisory_url = f"{advisory_pdf_url}#page={advisory_page}" if advisory_page and advisory_pdf_url else None
 
-        summary_html = generate_summary_html(water_name, summary_stats, reg_species=reg_species, booklet_species=booklet_species, advisory_url=advisory_url)
+        # Only a page that is rendered records the fragments it used
+        water_fragments = fragments.get(water_name, {})
+        water_used = {}
+        species_html = None
+        if summary_stats:
+            species_key = page_fragments.content_key(sorted(summary_stats['species_counts']), reg_species,
+                                                     booklet_species, advisory_url)
+            species_html = page_fragments.cached(water_fragments, water_used, "species", species_key,
+                                                 lambda: generate_species_html(summary_stats['species_counts'], reg_species,
+                                                                               booklet_species, advisory_url))
+        summary_html = generate_summary_html(water_name, summary_stats, reg_species=reg_species, booklet_species=booklet_species,
+                                             advisory_url=advisory_url, recent=recent_rows(records), species_html=species_html)
         meta_description = generate_meta_description(water_name, summary_stats)
 
-        table_rows_html = ""
-        for record in records:
-            date_obj = datetime.strptime(record['date'], "%Y-%m-%d")
-            display_date = date_obj.strftime("%b %d, %Y")
-
-            report_link_html = ""
-            if record.get("reportUrl"):
-                url = record['reportUrl']
-
-                # If it's an NMDGF URL, validate it and potentially fall back to local
-                if 'wildlife.dgf.nm.gov' in url:
-                    # Check cache first
-                    if url not in url_validation_cache:
-                        url_validation_cache[url] = validate_url(url)
-
-                    if url_validation_cache[url]:
-                        validated_count += 1
-                    else:
-                        fallback = get_fallback_url(url)
-                        if fallback:
-                            url = fallback
-                            fallback_count += 1
-
-                # rel="nofollow" so Google doesn't pass authority to the NMDGF PDF.
-                # Hidden anchor — gives Google a proper tag to read, no visible UI change.
-                report_link_html = f'<a href="{url}" target="_blank" rel="nofollow noopener noreferrer" style="display:none" onclick="event.stopPropagation()"></a>'
-
-            table_rows_html += f"""
-                <tr class="clickable-row hover:bg-gray-50" onclick="this.querySelector('a[target]')?.click()">
-                    <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-600">{display_date}</td>
-                    <td class="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-800">{record['species']}</td>
-                    <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-600">{record['quantity']}</td>
-                    <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-600">{record['length']}</td>
-                    <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-600">{record['hatchery']}{report_link_html}</td>
-                </tr>
-            """
-
-        # Generate regulation HTML if available
-        regulation_html = generate_regulation_html(water_name, regulations_data)
-
-        # Generate page URL for social media tags
-        page_url = f"https://stockingreport.com/public/waters/{filename}"
-        schema_org = generate_schema_org(water_name, summary_stats, coords, page_url)
-
-        water_image_html = generate_water_image_html(water_name, water_images)
-
-        page_html = template_html.replace("{{WATER_NAME}}", water_name)
-        page_html = page_html.replace("{{TABLE_ROWS}}", table_rows_html)
-        page_html = page_html.replace("{{SUMMARY}}", summary_html)
-        page_html = page_html.replace("{{REGULATIONS}}", regulation_html)
-        page_html = page_html.replace("{{WATER_IMAGE}}", water_image_html)
-        page_html = page_html.replace("{{META_DESCRIPTION}}", meta_description)
-        page_html = page_html.replace("{{PAGE_URL}}", page_url)
-        page_html = page_html.replace("{{SCHEMA_ORG}}", schema_org)
-
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(page_html)
-        generated_count += 1
-
-    print(f"Generated {generated_count} static pages in '{OUTPUT_DIR}'.")
+        # Everything below depends only on these (the summary text stands in for
+        # the stats); skip the page if none of them changed since it was written
+        page_inputs = shared_inputs + [
+            water_name, records, coords, regulations_data.get(water_name), booklet_species,
+            advisory_url, water_images.get(water_name), summary_html, meta_description,
+            sorted((url, fallbacks[url]) for url in _nmdgf_urls(records) if url in fallbacks),
+        ]
+        fingerprint = hashlib.sha256(dumps(page_inputs, inline_depth=0).encode('utf-8')).hexdigest()
+        previous = previous_manifest.get(water_name, {})
+        if (not force and previous.get("page") == filename and previous.get("fingerprint") == fingerprint
+                and os.path.exists(filepath)):
+            manifest[water_name] = previous
+            unchanged_count += 1
+            continue
+        manifest[water_name] = {"page": filename, "fingerprint": fingerprint}
+        if previous.get("lastmod") and previous.get("page") == filename:
+            manifest[water_name]["lastmod"] = previous["lastmod"]
+        print(f"  -> Generating page for {water_name}...")
+        used_fragments[water_name] = water_used
+        jobs.append((water_name, water_data, summary_stats, summary_html, meta_description, water_fragments))
+
+    # The links were validated above, so the workers do no network I/O
+    report_urls = set()
+    for _, water_data, *_ in jobs:
+        report_urls |= _nmdgf_urls(water_data.get("records", []))
+    context = {
+        "template": compile_template(template_html),
+        "regulations": regulations_data,
+        "water_images": water_images,
+        "url_status": {url: url_status.get(url, False) for url in sorted(report_urls)},
+    }
+
+    validated_count = 0
+    fallback_count = 0
+    for job, page in zip(jobs, render_pages(jobs, context, workers)):
+        entry = manifest[job[0]]
+        # lastmod: the day the page's bytes last changed (for the sitemap); a
+        # page first seen unchanged gets its latest stocking date
+        changed = write_text(os.path.join(OUTPUT_DIR, page["filename"]), page["html"])
+        if changed or "lastmod" not in entry:
+            entry["lastmod"] = today if changed or not job[2] else job[2]["most_recent"]
+        validated_count += page["validated"]
+        fallback_count += page["fallback"]
+        page_fragments.merge_used(used_fragments[job[0]], page["fragments"])
+        entry["history"] = write_history(page["filename"][:-len(".html")], page["history"])
+    generated_count = len(jobs)
+    if jobs:
+        page_fragments.save_fragments(fragments, used_fragments, fragment_rules, data.keys())
+
+    write_json(PAGE_MANIFEST_FILE, {"version": PAGE_MANIFEST_VERSION, "pages": manifest}, inline_depth=2)
+    print(f"Generated {generated_count} static pages in '{OUTPUT_DIR}' ({unchanged_count} unchanged, skipped).")
+    # redirects imports this module (via cleanup_data), so it is imported here
+    import redirects
+    redirects.retire_orphan_pages(data, manifest, merge_groups)
     print(f"URL validation: {validated_count} NMDGF URLs valid, {fallback_count} fell back to local copies")
     print("--- Static Page Generation Finished ---")
 
-def generate_sitemap(data):
+def benchmark_pages(data, scale=1, max_workers=None):
+    """
+    Time render_page() on the largest waters, then render_pages() over every
+    water at 1, 2, 4, ... workers up to
+    `max_workers` (default: the CPU count), with `scale` copies of the dataset, and check the pages match the
+    serial ones. Report links count as valid, so no network I/O is timed.
+    """
+    with open(TEMPLATE_FILE, "r", encoding="utf-8") as f:
+        template_html = f.read()
+    scaled = stats_engine.scale_dataset(data, scale)
+    all_stats = stats_engine.summary_stats_all(scaled)
+    jobs = [(name, water, all_stats[name],
+             generate_summary_html(name, all_stats[name], recent=recent_rows(water.get("records", []))),
+             generate_meta_description(name, all_stats[name]), {})
+            for name, water in scaled.items()]
+    urls = {r['reportUrl'] for water in scaled.values() for r in water.get("records", []) if r.get('reportUrl')}
+    context = {"template": compile_template(template_html), "regulations": {}, "water_images": {},
+               "url_status": dict.fromkeys(urls, True)}
+
+    # Single pages: the largest waters, rendered in-process
+    _init_page_worker(context)
+    print(f"{'largest pages':<44} {'rows':>5} {'ms/page':>8}")
+    for job in sorted(jobs, key=lambda job: len(job[1].get("records", [])), reverse=True)[:5]:
+        start = time.perf_counter()
+        for _ in range(100):
+            render_page(job)
+        print(f"{job[0][:44]:<44} {len(job[1].get('records', [])):>5} {(time.perf_counter() - start) * 10:>8.2f}")
+
+    counts = [1]
+    while counts[-1] * 2 <= (max_workers or os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+    print(f"{len(jobs)} pages, {sum(len(w.get('records', [])) for w in scaled.values()):,} rows")
+    print(f"{'workers':>8} {'seconds':>9} {'speedup':>8}")
+    serial_pages = serial_time = None
+    for workers in counts:
+        start = time.perf_counter()
+        pages = render_pages(jobs, context, workers)
+        elapsed = time.perf_counter() - start
+        if serial_pages is None:
+            serial_pages, serial_time = pages, elapsed
+        elif pages != serial_pages:
+            print(f"{workers} workers: pages differ from the serial run")
+            return 1
+        print(f"{workers:>8} {elapsed:>8.3f}s {serial_time / elapsed:>7.1f}x")
+    return 0
+
+def _sitemap_xml(tag, entries):
+    """<urlset> / <sitemapindex> document for [(loc, lastmod or None), ...]."""
+    item = "url" if tag == "urlset" else "sitemap"
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', f'<{tag} xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    for loc, lastmod in entries:
+        lines.append(f'  <{item}>')
+        lines.append(f'    <loc>{loc}</loc>')
+        if lastmod:
+            lines.append(f'    <lastmod>{lastmod}</lastmod>')
+        lines.append(f'  </{item}>')
+    lines.append(f'</{tag}>')
+    return "\n".join(lines)
+
+def orphan_pages(manifest):
+    """
+    {filename: water name} for the pages in OUTPUT_DIR that no entry of the
+    page `manifest` ({water name: entry}) owns, the name read back from the
+    page's <title> (None if it has none).
     """
-    Generates a sitemap.xml file from the data.
+    if not manifest:
+        return {}
+    pages = {entry["page"] for entry in manifest.values()}
+    orphans = {}
+    if os.path.isdir(OUTPUT_DIR):
+        for filename in sorted(os.listdir(OUTPUT_DIR)):
+            if filename.endswith(".html") and filename not in pages:
+                with open(os.path.join(OUTPUT_DIR, filename), 'r', encoding='utf-8', errors='replace') as f:
+                    m = re.search(r'<title>(.*?) - NM Stocking Report</title>', f.read())
+                orphans[filename] = html_lib.unescape(m.group(1)).strip() if m else None
+    return orphans
+
+def prune_orphan_pages(manifest):
+    """
+    Delete the pages in OUTPUT_DIR and the history folders in HISTORY_DIR
+    that no entry of the page `manifest` ({water name: entry}) owns, e.g.
+    pages of names cleanup_data.py has since merged away (redirects.py points
+    their URLs at a live page first). Returns the removed paths; nothing is
+    removed for an empty manifest.
+    """
+    if not manifest:
+        return []
+    pages = {entry["page"] for entry in manifest.values()}
+    slugs = {page[:-len(".html")] for page in pages}
+    removed = []
+    if os.path.isdir(OUTPUT_DIR):
+        for filename in sorted(os.listdir(OUTPUT_DIR)):
+            if filename.endswith(".html") and filename not in pages:
+                os.remove(os.path.join(OUTPUT_DIR, filename))
+                removed.append(os.path.join(OUTPUT_DIR, filename))
+    if os.path.isdir(HISTORY_DIR):
+        for slug in sorted(os.listdir(HISTORY_DIR)):
+            path = os.path.join(HISTORY_DIR, slug)
+            if slug not in slugs and os.path.isdir(path):
+                shutil.rmtree(path)
+                removed.append(path)
+    return removed
+
+def generate_sitemap(data, manifest=None):
+    """
+    Generates the sitemap from the data. Each water page's <lastmod> is the
+    date its page last actually changed, from the page manifest
+    (PAGE_MANIFEST_FILE, or `manifest`), falling back to its latest stocking;
+    the home page gets the newest of those. Up to SITEMAP_MAX_URLS URLs go
+    into SITEMAP_FILE itself; beyond that SITEMAP_FILE becomes a sitemap
+    index over SITEMAP_DIR/sitemap-<n>.xml. Files are only written when their
+    content changes.
     """
     print("\n--- Starting Sitemap Generation ---")
-    
-    urls = ["https://stockingreport.com/"]
-    
-    for water_name in data.keys():
-        filename = re.sub(r'[^a-z0-9]+', '-', water_name.lower()).strip('-') + ".html"
-        url = f"https://stockingreport.com/public/waters/{filename}"
-        urls.append(url)
+    if manifest is None:
+        manifest = _load_page_manifest()
 
-    xml_content = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml_content += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-    
-    today = date.today().isoformat()
-    
-    for url in urls:
-        xml_content += '  <url>\n'
-        xml_content += f'    <loc>{url}</loc>\n'
-        xml_content += f'    <lastmod>{today}</lastmod>\n'
-        xml_content += '  </url>\n'
-        
-    xml_content += '</urlset>'
-    
-    try:
-        with open(SITEMAP_FILE, "w") as f:
-            f.write(xml_content)
-        print(f"Successfully generated sitemap with {len(urls)} URLs: {SITEMAP_FILE}")
-    except IOError as e:
-        print(f"Error writing sitemap file: {e}")
-        
+    pages = []
+    for water_name, water_data in data.items():
+        filename = water_slug(water_name) + ".html"
+        lastmod = manifest.get(water_name, {}).get("lastmod")
+        if not lastmod:
+            dates = [r['date'] for r in water_data.get("records", []) if stats_engine.parse_date(r.get('date', ''))[0] >= 0]
+            lastmod = max(dates, default=None)
+        pages.append((f"https://stockingreport.com/public/waters/{filename}", lastmod))
+    newest = max((lastmod for _, lastmod in pages if lastmod), default=None)
+    urls = [("https://stockingreport.com/", newest)] + pages
+
+    children = [urls[i:i + SITEMAP_MAX_URLS] for i in range(0, len(urls), SITEMAP_MAX_URLS)]
+    written = []
+    if len(children) <= 1:
+        if write_text(SITEMAP_FILE, _sitemap_xml("urlset", urls)):
+            written.append(SITEMAP_FILE)
+        kept = set()
+    else:
+        index = []
+        for n, child in enumerate(children, 1):
+            path = os.path.join(SITEMAP_DIR, f"sitemap-{n}.xml")
+            if write_text(path, _sitemap_xml("urlset", child)):
+                written.append(path)
+            index.append((f"https://stockingreport.com/{path.replace(os.sep, '/')}",
+                          max((lastmod for _, lastmod in child if lastmod), default=None)))
+        if write_text(SITEMAP_FILE, _sitemap_xml("sitemapindex", index)):
+            written.append(SITEMAP_FILE)
+        kept = {f"sitemap-{n}.xml" for n in range(1, len(children) + 1)}
+    if os.path.isdir(SITEMAP_DIR):
+        for filename in os.listdir(SITEMAP_DIR):
+            if filename.endswith(".xml") and filename not in kept:
+                os.remove(os.path.join(SITEMAP_DIR, filename))
+                written.append(os.path.join(SITEMAP_DIR, filename))
+
+    layout = "one file" if len(children) <= 1 else f"an index of {len(children)} sitemaps"
+    print(f"Sitemap: {len(urls)} URLs in {layout}; "
+          + (f"updated {', '.join(written)}" if written else "unchanged"))
     print("--- Sitemap Generation Finished ---")
 
 def run_scraper(rebuild=False):
@@ -1287,8 +1768,7 @@ def run_scraper(rebuild=False):
         if not new_pdf_links:
             print("\nNo new reports to process. Data is up-to-date.")
             try:
-                with open(OUTPUT_FILE, "w") as f:
-                    json.dump(final_data, f, indent=4)
+                write_json(OUTPUT_FILE, final_data)
                 print("Re-saved existing data to ensure file is not empty.")
                 generate_static_pages(final_data)
                 generate_sitemap(final_data)
@@ -1301,6 +1781,8 @@ def run_scraper(rebuild=False):
         all_pdf_links = new_pdf_links
 
     # Process the selected links (either all for rebuild, or new for daily)
+    changed_waters = set()
+    key_cache = {}
     for link in all_pdf_links:
         raw_text = extract_text_from_pdf(link)
         if raw_text:
@@ -1310,34 +1792,22 @@ def run_scraper(rebuild=False):
                 continue
 
             for water_body, data in parsed_data.items():
-                if water_body not in final_data:
-                    final_data[water_body] = data
-                else:
-                    existing_records_set = {json.dumps(rec, sort_keys=True) for rec in final_data[water_body]['records']}
-                    for new_record in data['records']:
-                        new_record_str = json.dumps(new_record, sort_keys=True)
-                        if new_record_str not in existing_records_set:
-                            final_data[water_body]['records'].append(new_record)
+                if merge_water_records(final_data, water_body, data['records'], key_cache):
+                    changed_waters.add(water_body)
         time.sleep(1)
     
-    print("\nScrape complete. Saving data...")
+    print(f"\nScrape complete. {len(changed_waters)} water bodies changed. Saving data...")
     
     if final_data:
         # **THE FIX IS HERE**: The call to enrich data with coordinates is restored.
         final_data = enrich_data_with_coordinates(final_data, manual_coords)
 
-        for water_body in final_data:
-            unique_records = list({json.dumps(rec, sort_keys=True): rec for rec in final_data[water_body]['records']}.values())
-            unique_records.sort(key=lambda x: x['date'], reverse=True)
-            final_data[water_body]['records'] = unique_records
-        
         try:
             if os.path.exists(OUTPUT_FILE):
                 shutil.copy(OUTPUT_FILE, BACKUP_FILE)
                 print(f"Created backup: {BACKUP_FILE}")
 
-            with open(OUTPUT_FILE, "w") as f:
-                json.dump(final_data, f, indent=4)
+            write_json(OUTPUT_FILE, final_data)
             print(f"Successfully saved new data file: {OUTPUT_FILE}")
 
             print("Proceeding to generate static pages and sitemap...")
@@ -1353,7 +1823,12 @@ def run_scraper(rebuild=False):
     print("--- Scrape Job Finished ---")
 
 if __name__ == "__main__":
-    if "--rebuild" in sys.argv:
+    if "--benchmark-pages" in sys.argv:
+        # python scraper.py --benchmark-pages [scale] [max workers]
+        args = [int(a) for a in sys.argv[1:] if not a.startswith('--')]
+        with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
+            sys.exit(benchmark_pages(json.load(f), *args))
+    elif "--rebuild" in sys.argv:
         run_scraper(rebuild=True)
     else:
         run_scraper(rebuild=False)
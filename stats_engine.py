@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Summary statistics for every water in one batch.
+
+scraper.generate_summary_stats() works on one water at a time and makes
+several Python passes over its records (strptime on every date, two length
+loops, counters, a sort). summary_stats_all() computes the same dicts for the
+whole dataset at once: each distinct date / quantity / length string is
+parsed once, the records become NumPy columns (date ordinal, month, quantity,
+length midpoint, water / species / hatchery codes) and every figure is a
+grouped reduction over them.
+
+The output is identical to generate_summary_stats(), down to dict key order
+(species and peak-month ties keep first-seen order, newest record first).
+Length averages add each water's lengths newest first, in the same order.
+
+Usage:
+    python stats_engine.py [stocking_data.json]                # compare with generate_summary_stats
+    python stats_engine.py --benchmark [stocking_data.json]    # time both at 1x, 10x and 100x
+"""
+
+import json
+import sys
+import time
+from datetime import datetime, date, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # scraper falls back to generate_summary_stats()
+    np = None
+
+BENCHMARK_SCALES = (1, 10, 100)
+
+_MISSING = object()  # record without a date key
+
+
+def parse_date(value):
+    """(ordinal, month) of a "%Y-%m-%d" date, (-1, 0) if it does not parse."""
+    try:
+        d = datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return -1, 0
+    return d.toordinal(), d.month
+
+
+def parse_quantity(value):
+    """Fish count; 0 where the scraper's int() fails."""
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return 0
+
+
+def parse_length(value):
+    """Midpoint of "6-8", or the single length; NaN where the scraper skips it."""
+    if '-' in str(value):
+        try:
+            parts = str(value).split('-')
+            return (float(parts[0]) + float(parts[1])) / 2
+        except (ValueError, IndexError):
+            return float('nan')
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return float('nan')
+
+
+def recent_cutoff(now):
+    """
+    First date ordinal inside the 6-month recent window. Records are midnight
+    datetimes, so d >= now - 182 days means the cutoff's day, or the day after
+    unless the cutoff falls exactly on midnight.
+    """
+    cutoff = now - timedelta(days=182)
+    return cutoff.toordinal() + (cutoff.time() != datetime.min.time())
+
+
+def year_month(ordinals):
+    """(year, month) arrays for an array of date ordinals."""
+    days = np.datetime64('0001-01-01') + (ordinals - 1).astype('timedelta64[D]')
+    months = days.astype('datetime64[M]').astype(np.int64)
+    return months // 12 + 1970, months % 12 + 1
+
+
+def _encode(values):
+    """(distinct values in first-seen order, code array)."""
+    distinct = list(dict.fromkeys(values))
+    index = {v: i for i, v in enumerate(distinct)}
+    return distinct, np.fromiter(map(index.__getitem__, values), dtype=np.int64, count=len(values))
+
+
+def build_arrays(data):
+    """
+    Record columns for `data`, one row per record in dataset order.
+    Returns (columns, tables): columns maps name -> array, tables holds the
+    value lists the species / hatchery codes index into.
+    """
+    records = [r for water in data.values() for r in water.get("records", [])]
+    sizes = [len(water.get("records", [])) for water in data.values()]
+
+    # Parse each distinct value once, then expand through the codes
+    dates, date_codes = _encode([r.get('date', _MISSING) for r in records])
+    parsed_dates = np.array([(-1, 0) if d is _MISSING else parse_date(d) for d in dates],
+                            dtype=np.int64).reshape(-1, 2)
+    quantities, qty_codes = _encode([r.get('quantity', 0) for r in records])
+    lengths, len_codes = _encode([r.get('length', '') for r in records])
+    species, species_codes = _encode([r.get('species', 'Unknown') for r in records])
+    hatcheries, hatchery_codes = _encode([r.get('hatchery') or None for r in records])  # None: not counted
+
+    columns = {
+        "water": np.repeat(np.arange(len(sizes), dtype=np.int64), sizes),
+        "date": parsed_dates[date_codes, 0],
+        "month": parsed_dates[date_codes, 1],
+        "quantity": np.array([parse_quantity(q) for q in quantities], dtype=np.int64)[qty_codes],
+        "length": np.array([parse_length(v) for v in lengths], dtype=np.float64)[len_codes],
+        "species": species_codes,
+        "hatchery": hatchery_codes,
+    }
+    tables = {"waters": list(data), "species": species, "hatcheries": hatcheries}
+    return columns, tables
+
+
+def arrays_for(data, snapshot=None):
+    """
+    build_arrays(data), read from `snapshot` (columnar.load_snapshot()) when it
+    was written from the same waters, so the records are not parsed again.
+    """
+    if snapshot is None or snapshot["tables"]["waters"] != list(data):
+        return build_arrays(data)
+    return snapshot, snapshot["tables"]
+
+
+def _first_seen_counts(water, code, n_codes):
+    """
+    Distinct (water, code) pairs in order of first appearance, with counts.
+    Rows must already be grouped by water. Returns (water, code, count, first).
+    """
+    keys = water * n_codes + code
+    uniq, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    order = np.argsort(first, kind='stable')
+    uniq, first, counts = uniq[order], first[order], counts[order]
+    return uniq // n_codes, uniq % n_codes, counts, first
+
+
+def _counts_by_water(water, code, n_codes, names):
+    result = {}
+    for w, c, n, _ in zip(*(a.tolist() for a in _first_seen_counts(water, code, n_codes))):
+        result.setdefault(w, {})[names[c]] = n
+    return result
+
+
+def _mean_lengths(water, lengths, n_waters):
+    """round(sum / count, 1) per water over non-NaN lengths, summed in row order."""
+    valid = ~np.isnan(lengths)
+    water, lengths = water[valid], lengths[valid]
+    counts = np.bincount(water, minlength=n_waters)
+    bounds = np.concatenate(([0], np.cumsum(counts))).tolist()
+    values = lengths.tolist()
+    sums = [sum(values[bounds[i]:bounds[i + 1]]) for i in range(n_waters)]
+    return [round(s / n, 1) if n else None for s, n in zip(sums, counts.tolist())]
+
+
+def summary_stats_all(data, now=None, snapshot=None):
+    """
+    {water name: generate_summary_stats(records, now)} for every water in
+    `data`, computed in one batch (columns from `snapshot`, see arrays_for()).
+    """
+    now = now or datetime.now()
+    names = list(data)
+    n_waters = len(names)
+    if not n_waters:
+        return {}
+    columns, tables = arrays_for(data, snapshot)
+    total_stockings = np.bincount(columns["water"], minlength=n_waters).tolist()
+
+    # Dated rows, each water's newest first; ties keep record order, as the
+    # scraper's stable reverse sort does
+    dated = np.flatnonzero(columns["date"] >= 0)
+    order = dated[np.lexsort((dated, -columns["date"][dated], columns["water"][dated]))]
+    water = columns["water"][order]
+    ordinal = columns["date"][order]
+    quantity = columns["quantity"][order]
+    length = columns["length"][order]
+    species = columns["species"][order]
+
+    n_dated = np.bincount(water, minlength=n_waters)
+    starts = np.concatenate(([0], np.cumsum(n_dated)[:-1]))
+    has_dates = n_dated > 0
+    most_recent = np.where(has_dates, ordinal[np.minimum(starts, len(ordinal) - 1)], 0).tolist()
+    earliest = np.where(has_dates, ordinal[np.maximum(starts + n_dated - 1, 0)], 0).tolist()
+    total_fish = np.bincount(water, weights=quantity, minlength=n_waters)
+
+    recent = ordinal >= recent_cutoff(now)
+    recent_water = water[recent]
+    recent_stockings = np.bincount(recent_water, minlength=n_waters).tolist()
+    recent_fish = np.bincount(recent_water, weights=quantity[recent], minlength=n_waters)
+
+    n_species = len(tables["species"])
+    species_counts = _counts_by_water(water, species, n_species, tables["species"])
+    recent_species_counts = _counts_by_water(recent_water, species[recent], n_species, tables["species"])
+
+    hatcheries = {}
+    n_hatcheries = len(tables["hatcheries"])
+    for key in np.unique(water * n_hatcheries + columns["hatchery"][order]).tolist():
+        w, h = divmod(key, n_hatcheries)
+        if tables["hatcheries"][h] is not None:
+            hatcheries.setdefault(w, set()).add(tables["hatcheries"][h])
+
+    # The gaps between consecutive unique dates add up to last - first
+    span = int(ordinal.max()) + 1 if len(ordinal) else 1
+    unique_days = np.bincount(np.unique(water * span + ordinal) // span, minlength=n_waters).tolist()
+
+    # Top three months by count; ties in first-seen order, like sorted() on the
+    # scraper's insertion-ordered dict
+    peak_months = {}
+    m_water, m_month, m_count, m_first = _first_seen_counts(water, columns["month"][order], 13)
+    for i in np.lexsort((m_first, -m_count, m_water)).tolist():
+        months = peak_months.setdefault(int(m_water[i]), [])
+        if len(months) < 3:
+            months.append(int(m_month[i]))
+
+    recent_avg_length = _mean_lengths(recent_water, length[recent], n_waters)
+    lifetime_avg_length = _mean_lengths(water, length, n_waters)
+
+    today_ordinal = now.toordinal()
+    results = {}
+    for w, name in enumerate(names):
+        if not has_dates[w]:
+            results[name] = None
+            continue
+        gaps = unique_days[w] - 1
+        results[name] = {
+            'total_stockings': total_stockings[w],
+            'total_fish': int(total_fish[w]),
+            'species_counts': species_counts.get(w, {}),
+            'hatcheries': sorted(hatcheries.get(w, ())),
+            'most_recent': date.fromordinal(most_recent[w]).strftime('%Y-%m-%d'),
+            'earliest': date.fromordinal(earliest[w]).strftime('%Y-%m-%d'),
+            'recent_stockings': recent_stockings[w],
+            'recent_fish': int(recent_fish[w]),
+            'recent_species_counts': recent_species_counts.get(w, {}),
+            'recent_avg_length': recent_avg_length[w],
+            'days_since_last': today_ordinal - most_recent[w],
+            'avg_days_between': round((most_recent[w] - earliest[w]) / gaps) if gaps >= 1 else None,
+            'peak_months': peak_months.get(w, []),
+            'lifetime_avg_length': lifetime_avg_length[w],
+        }
+    return results
+
+
+def scale_dataset(data, factor):
+    """`factor` copies of every water (renamed), for benchmarking."""
+    if factor == 1:
+        return data
+    return {f"{name} #{k}" if k else name: water
+            for k in range(factor) for name, water in data.items()}
+
+
+def check(data, now=None):
+    """Names of waters whose batch stats differ from generate_summary_stats()."""
+    from scraper import generate_summary_stats
+    now = now or datetime.now()
+    batch = summary_stats_all(data, now)
+    return [name for name, water in data.items()
+            if json.dumps(batch[name]) != json.dumps(generate_summary_stats(water.get("records", []), now))]
+
+
+def benchmark(data, scales=BENCHMARK_SCALES):
+    from scraper import generate_summary_stats
+    now = datetime.now()
+    print(f"{'scale':>6} {'records':>10} {'per-water':>12} {'batch':>10} {'speedup':>8}")
+    for factor in scales:
+        scaled = scale_dataset(data, factor)
+        n_records = sum(len(w.get("records", [])) for w in scaled.values())
+        start = time.perf_counter()
+        for water in scaled.values():
+            generate_summary_stats(water.get("records", []), now)
+        per_water = time.perf_counter() - start
+        start = time.perf_counter()
+        summary_stats_all(scaled, now)
+        batch = time.perf_counter() - start
+        print(f"{factor:>5}x {n_records:>10,} {per_water:>11.3f}s {batch:>9.3f}s {per_water / batch:>7.1f}x")
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    source = args[0] if args else "stocking_data.json"
+    if np is None:
+        print("NumPy is not installed")
+        return 1
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if "--benchmark" in sys.argv:
+        benchmark(data)
+        return 0
+    mismatched = check(data)
+    if mismatched:
+        print(f"{len(mismatched)} water(s) differ from generate_summary_stats(): {mismatched[:10]}")
+        return 1
+    print(f"Batch stats match generate_summary_stats() for all {len(data)} waters")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
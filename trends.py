@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Fixed-length stocking trend series for sparkline charts.
+
+For every water, and for the whole state, this writes the weekly and
+monthly fish and stocking counts as integer arrays with a base date:
+
+    public/data/trends/waters/<slug>.json, public/data/trends/statewide.json
+    {"v": 1,
+     "weekly":  {"base": "YYYY-MM-DD", "fish": [52 ints], "stockings": [52 ints]},
+     "monthly": {"base": "YYYY-MM",    "fish": [36 ints], "stockings": [36 ints]}}
+
+Weeks start on Monday. A series ends with the week / month of the water's
+latest stocking (the state's latest for statewide.json), so a water's file
+only changes when its records do, and json_writer leaves every other file
+untouched. All series come from one grouped bincount over the
+stats_engine columns (the columnar snapshot's, in the pipeline).
+
+Usage:
+    python trends.py [stocking_data.json] [public/data/trends]
+"""
+
+import json
+import os
+import sys
+from datetime import date
+
+import stats_engine
+from json_writer import write_json
+from scraper import water_slug
+from stats_engine import np
+
+TRENDS_DIR = os.path.join("public", "data", "trends")
+FORMAT_VERSION = 1
+
+WEEKS = 52
+MONTHS = 36
+
+
+def _week_start(ordinals):
+    """Ordinal of the Monday starting each date's week (ordinal 1 is a Monday)."""
+    return ordinals - (ordinals - 1) % 7
+
+
+def _series(group, index, quantity, n_groups, length):
+    """(fish, stockings) arrays of shape (n_groups, length); out-of-range rows are dropped."""
+    keep = (index >= 0) & (index < length)
+    flat = group[keep] * length + index[keep]
+    fish = np.bincount(flat, weights=quantity[keep], minlength=n_groups * length)
+    stockings = np.bincount(flat, minlength=n_groups * length)
+    return fish.astype(np.int64).reshape(n_groups, length), stockings.reshape(n_groups, length)
+
+
+def build_trends(data, snapshot=None):
+    """
+    {water name: series payload}, plus the statewide payload under None.
+    `snapshot` is columnar.load_snapshot() of `data`, if at hand.
+    """
+    names = list(data)
+    columns, _ = stats_engine.arrays_for(data, snapshot)
+    dated = columns["date"] >= 0
+    # Row n_waters is the statewide copy of every record
+    n_groups = len(names) + 1
+    group = np.concatenate((columns["water"][dated], np.full(dated.sum(), len(names))))
+    ordinal = np.tile(columns["date"][dated], 2)
+    quantity = np.tile(columns["quantity"][dated], 2)
+    if not len(ordinal):
+        return {}
+
+    last = np.full(n_groups, -1, dtype=np.int64)
+    np.maximum.at(last, group, ordinal)
+    has_records = last >= 0
+    last = np.where(has_records, last, ordinal.max())
+
+    week_base = _week_start(last) - 7 * (WEEKS - 1)
+    week_index = (_week_start(ordinal) - week_base[group]) // 7
+    weekly_fish, weekly_stockings = _series(group, week_index, quantity, n_groups, WEEKS)
+
+    year, month = stats_engine.year_month(ordinal)
+    last_year, last_month = stats_engine.year_month(last)
+    month_base = last_year * 12 + last_month - 1 - (MONTHS - 1)
+    month_index = year * 12 + month - 1 - month_base[group]
+    monthly_fish, monthly_stockings = _series(group, month_index, quantity, n_groups, MONTHS)
+
+    trends = {}
+    for g in np.flatnonzero(has_records).tolist():
+        base_year, base_month = divmod(int(month_base[g]), 12)
+        trends[names[g] if g < len(names) else None] = {
+            "v": FORMAT_VERSION,
+            "weekly": {"base": date.fromordinal(int(week_base[g])).isoformat(),
+                       "fish": weekly_fish[g].tolist(), "stockings": weekly_stockings[g].tolist()},
+            "monthly": {"base": f"{base_year:04d}-{base_month + 1:02d}",
+                        "fish": monthly_fish[g].tolist(), "stockings": monthly_stockings[g].tolist()},
+        }
+    return trends
+
+
+def write_trends(data, out_dir=TRENDS_DIR, snapshot=None):
+    """
+    Write every series and remove files of waters no longer in `data`.
+    Returns the number of files written or removed, or None without NumPy.
+    """
+    if np is None:
+        print("NumPy not installed; skipping trend series")
+        return None
+    waters_dir = os.path.join(out_dir, "waters")
+    changed = 0
+    expected = set()
+    for name, payload in build_trends(data, snapshot).items():
+        if name is None:
+            path = os.path.join(out_dir, "statewide.json")
+        else:
+            path = os.path.join(waters_dir, water_slug(name) + ".json")
+            expected.add(os.path.basename(path))
+        changed += write_json(path, payload, inline_depth=2)
+    if os.path.isdir(waters_dir):
+        for filename in os.listdir(waters_dir):
+            if filename.endswith(".json") and filename not in expected:
+                os.remove(os.path.join(waters_dir, filename))
+                changed += 1
+    return changed
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else "stocking_data.json"
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else TRENDS_DIR
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    changed = write_trends(data, out_dir)
+    if changed is None:
+        return 1
+    print(f"Trend series for {len(data)} waters in {out_dir} ({changed} file(s) changed)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
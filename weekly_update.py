@@ -3,30 +3,34 @@
 Weekly incremental update script.
 
 This script:
-1. Loads the existing clean stocking data
+1. Loads the existing clean stocking data (snapshot + record journal)
 2. Fetches only NEW reports from the first page of the archive
-3. Parses new PDFs and adds records
+3. Parses new PDFs, adds records and journals one batch per report
 4. Updates the JSON file, static pages, and sitemap
 
 Run this weekly via GitHub Actions or cron job.
 """
 
 import json
-import shutil
 import os
 import requests
 from datetime import datetime
+import fetch_regulations
+import match_regulations
+import record_store
+import record_journal
+from json_writer import write_json
 from scraper import (
     get_pdf_links_from_first_page,
     extract_text_from_pdf,
     final_parser,
     is_valid_length,
     enrich_data_with_coordinates,
+    merge_water_records,
     generate_static_pages,
     generate_sitemap,
     ARCHIVE_PAGE_URL,
     OUTPUT_FILE,
-    BACKUP_FILE,
     OUTPUT_DIR,
     MANUAL_COORDS_FILE
 )
@@ -64,36 +68,21 @@ def download_pdf(url, filename):
         print(f"Error: {e}")
         return False
 
-def weekly_update():
-    """Run weekly incremental update."""
-    print("=" * 80)
-    print("WEEKLY STOCKING DATA UPDATE")
-    print(f"Run time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 80)
-
-    # Create directories if needed
-    if not os.path.exists("public"):
-        os.makedirs("public")
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-
-    # Load existing clean data
-    print(f"\nLoading existing data from {CLEAN_DATA_FILE}...")
-    try:
-        with open(CLEAN_DATA_FILE, 'r') as f:
-            final_data = json.load(f)
-        print(f"Loaded {len(final_data)} water bodies")
-    except FileNotFoundError:
-        print(f"No existing data found, starting fresh")
-        final_data = {}
-
-    # Load manual coordinates
+def load_manual_coords():
     manual_coords = {}
     if os.path.exists(MANUAL_COORDS_FILE):
         print(f"Loading manual coordinates from {MANUAL_COORDS_FILE}...")
         with open(MANUAL_COORDS_FILE, "r") as f:
             manual_coords = json.load(f)
+    return manual_coords
+
+def ingest_new_reports(final_data, manual_coords):
+    """
+    Fetch the first archive page and merge every report not yet in
+    `final_data` (in place), journaling one batch per report.
 
+    Returns the number of new records, or None if the archive could not be read.
+    """
     # Get URLs already processed
     processed_urls = set()
     for water_data in final_data.values():
@@ -103,6 +92,13 @@ def weekly_update():
                 url = record["reportUrl"].split('&refresh=')[0].split('?refresh=')[0]
                 processed_urls.add(url)
 
+    # Optional SQLite mirror (see record_store.py): only used if it has been migrated
+    store = None
+    if os.path.exists(record_store.DB_FILE):
+        store = record_store.open_store(record_store.DB_FILE)
+        processed_urls |= record_store.processed_report_urls(store)
+        print(f"Using record store {record_store.DB_FILE}")
+
     print(f"Already processed {len(processed_urls)} unique report URLs")
 
     # Fetch PDF links from first archive page only
@@ -111,7 +107,9 @@ def weekly_update():
 
     if not all_pdf_links:
         print("No PDF links found. Aborting.")
-        return
+        if store:
+            store.close()
+        return None
 
     # Filter to only new PDFs
     new_pdf_links = []
@@ -123,14 +121,9 @@ def weekly_update():
 
     if not new_pdf_links:
         print("\nNo new reports to process. Data is already up-to-date!")
-        # Still regenerate pages/sitemap in case template changed
-        print("\nRegenerating static pages and sitemap...")
-        generate_static_pages(final_data)
-        generate_sitemap(final_data)
-        print("\n" + "=" * 80)
-        print("UPDATE COMPLETE - No changes")
-        print("=" * 80)
-        return
+        if store:
+            store.close()
+        return 0
 
     print(f"\nFound {len(new_pdf_links)} NEW reports to process:")
     for i, link in enumerate(new_pdf_links, 1):
@@ -151,6 +144,8 @@ def weekly_update():
     # Process new PDFs
     print("\n--- Processing New Reports ---\n")
     new_records_count = 0
+    changed_waters = set()
+    key_cache = {}
 
     for i, link in enumerate(new_pdf_links, 1):
         print(f"[{i}/{len(new_pdf_links)}] Processing {link}...")
@@ -166,6 +161,7 @@ def weekly_update():
             continue
 
         # Merge into final data
+        report_added = {}
         for water_body, data in parsed_data.items():
             # Filter out malformed records (e.g. OCR misreads length as "HATCHERY")
             valid_records = [r for r in data['records'] if is_valid_length(r.get('length'))]
@@ -175,94 +171,148 @@ def weekly_update():
             if not valid_records:
                 continue
 
-            if water_body not in final_data:
-                final_data[water_body] = {"records": valid_records}
-                new_records_count += len(valid_records)
-                print(f"  [+] New water body: {water_body} ({len(valid_records)} records)")
+            # Insert into the already-sorted record list, skipping duplicates
+            is_new_water = water_body not in final_data
+            added = merge_water_records(final_data, water_body, valid_records, key_cache)
+            if not added:
+                continue
+            new_records_count += len(added)
+            changed_waters.add(water_body)
+            report_added[water_body] = added
+            if store:
+                record_store.add_records(store, water_body, added)
+            if is_new_water:
+                print(f"  [+] New water body: {water_body} ({len(added)} records)")
             else:
-                # Add new records, avoiding duplicates
-                existing_records_set = {json.dumps(rec, sort_keys=True) for rec in final_data[water_body]['records']}
-                added = 0
-                for new_record in valid_records:
-                    new_record_str = json.dumps(new_record, sort_keys=True)
-                    if new_record_str not in existing_records_set:
-                        final_data[water_body]['records'].append(new_record)
-                        added += 1
-                        new_records_count += 1
-
-                if added > 0:
-                    print(f"  [+] {water_body}: added {added} new records")
+                print(f"  [+] {water_body}: added {len(added)} new records")
+
+        # One journal batch per report, so a crash later in the run loses nothing
+        if report_added:
+            batch_no = record_journal.append_batch(link, report_added)
+            print(f"  Journaled as batch #{batch_no}")
 
     print(f"\n--- Processing Complete ---")
     print(f"New records added: {new_records_count}")
+    print(f"Water bodies changed: {len(changed_waters)}")
     print(f"Total water bodies: {len(final_data)}")
 
     if new_records_count > 0:
         # Enrich any new water bodies with coordinates
-        final_data = enrich_data_with_coordinates(final_data, manual_coords)
+        enrich_data_with_coordinates(final_data, manual_coords)
+
+        if store:
+            with store:
+                for water_body in changed_waters:
+                    record_store.set_water_meta(store, water_body, final_data[water_body])
+            print(f"Updated record store for {len(changed_waters)} water bodies")
+    if store:
+        store.close()
+
+    return new_records_count
+
+def update_regulations(stocking_data):
+    """
+    Fetch regulations from ArcGIS and match them against `stocking_data`.
+    Returns (raw, lookup, matched) ready to be written, or None if the fetch
+    failed (the existing regulation files are then left alone).
+    """
+    print("\nFetching fishing regulations from NM Game & Fish ArcGIS...")
+    try:
+        raw, lookup = fetch_regulations.fetch_regulations()
+        if not lookup["waters"]:
+            # Every layer query failed (they return [] on errors)
+            print("Warning: ArcGIS returned no regulation data; keeping existing files")
+            return None
+        print("Regulations fetched successfully")
+        matched = match_regulations.build_matched_regulations(stocking_data, lookup)
+        print("Regulations matched successfully")
+        return raw, lookup, matched
+    except Exception as e:
+        print(f"Warning: Could not update regulations: {e}")
+        print("Continuing with existing regulation data...")
+        return None
+
+def save_regulations(raw, lookup, matched):
+    write_json(fetch_regulations.RAW_OUTPUT_FILE, raw)
+    write_json(fetch_regulations.LOOKUP_OUTPUT_FILE, lookup)
+    write_json(match_regulations.OUTPUT_FILE, matched)
+
+def save_dataset(final_data):
+    """Compact the journal if it is due, then write the published data file."""
+    # New records are already durable in the journal; the clean snapshot is
+    # only rewritten when the journal is due for compaction. Rolling back is
+    # `python record_journal.py rollback N`, so no backup copies are needed.
+    if record_journal.needs_compaction():
+        record_journal.compact(final_data, CLEAN_DATA_FILE)
+        print(f"Compacted journal into {CLEAN_DATA_FILE}")
+    else:
+        print(f"Records journaled in {record_journal.JOURNAL_FILE} (snapshot unchanged)")
 
-        # Sort records by date for each water body
-        for water_body in final_data:
-            unique_records = list({json.dumps(rec, sort_keys=True): rec for rec in final_data[water_body]['records']}.values())
-            unique_records.sort(key=lambda x: x['date'], reverse=True)
-            final_data[water_body]['records'] = unique_records
+    # The website reads this file directly, so it is always written in full
+    write_json(OUTPUT_FILE, final_data)
+    print(f"Saved: {OUTPUT_FILE}")
 
-        # Backup and save
-        print(f"\nSaving updated data...")
-        try:
-            # Backup old clean file
-            if os.path.exists(CLEAN_DATA_FILE):
-                backup = CLEAN_DATA_FILE.replace('.json', '_backup.json')
-                shutil.copy(CLEAN_DATA_FILE, backup)
-                print(f"Created backup: {backup}")
-
-            # Save clean data
-            with open(CLEAN_DATA_FILE, "w") as f:
-                json.dump(final_data, f, indent=4)
-            print(f"Saved: {CLEAN_DATA_FILE}")
-
-            # Also update the regular output file for compatibility
-            if os.path.exists(OUTPUT_FILE):
-                shutil.copy(OUTPUT_FILE, BACKUP_FILE)
-            with open(OUTPUT_FILE, "w") as f:
-                json.dump(final_data, f, indent=4)
-            print(f"Saved: {OUTPUT_FILE}")
-
-            # Fetch and match fishing regulations
-            print("\nFetching fishing regulations from NM Game & Fish ArcGIS...")
-            try:
-                import subprocess
-                # Fetch regulations from ArcGIS
-                result = subprocess.run(["python", "fetch_regulations.py"], capture_output=True, text=True)
-                if result.returncode == 0:
-                    print("Regulations fetched successfully")
-                    # Match with stocking data
-                    result = subprocess.run(["python", "match_regulations.py"], capture_output=True, text=True)
-                    if result.returncode == 0:
-                        print("Regulations matched successfully")
-                    else:
-                        print(f"Warning: Regulation matching failed: {result.stderr}")
-                else:
-                    print(f"Warning: Regulation fetch failed: {result.stderr}")
-            except Exception as e:
-                print(f"Warning: Could not update regulations: {e}")
-                print("Continuing with existing regulation data...")
-
-            # Generate static pages and sitemap
-            print("\nGenerating static pages and sitemap...")
-            generate_static_pages(final_data)
-            generate_sitemap(final_data)
-
-            print("\n" + "=" * 80)
-            print("UPDATE COMPLETE!")
-            print("=" * 80)
-            print(f"Added {new_records_count} new stocking records")
-            print(f"Total water bodies: {len(final_data)}")
-
-        except IOError as e:
-            print(f"Error writing files: {e}")
-    else:
-        print("\nNo new records were added.")
+def weekly_update():
+    """Run weekly incremental update."""
+    print("=" * 80)
+    print("WEEKLY STOCKING DATA UPDATE")
+    print(f"Run time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 80)
+
+    # Create directories if needed
+    if not os.path.exists("public"):
+        os.makedirs("public")
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
+
+    # Load existing clean data (snapshot + any batches journaled since it was written)
+    print(f"\nLoading existing data from {CLEAN_DATA_FILE} + {record_journal.JOURNAL_FILE}...")
+    if not os.path.exists(CLEAN_DATA_FILE):
+        print(f"No existing snapshot found, starting fresh")
+    final_data = record_journal.load_dataset(CLEAN_DATA_FILE)
+    journaled = len(record_journal.read_batches())
+    print(f"Loaded {len(final_data)} water bodies ({journaled} journaled batch(es) replayed)")
+
+    manual_coords = load_manual_coords()
+
+    new_records_count = ingest_new_reports(final_data, manual_coords)
+    if new_records_count is None:
+        return
+
+    if new_records_count == 0:
+        # Pages whose inputs changed (e.g. the template) are still re-rendered;
+        # the page manifest lets the rest be skipped
+        print("\nRegenerating static pages and sitemap...")
+        generate_static_pages(final_data)
+        generate_sitemap(final_data)
+        print("\n" + "=" * 80)
+        print("UPDATE COMPLETE - No changes")
+        print("=" * 80)
+        return
+
+    print(f"\nSaving updated data...")
+    try:
+        save_dataset(final_data)
+
+        # Fetch and match fishing regulations (in-process; pipeline.py runs
+        # the same steps without this script)
+        regulations = update_regulations(final_data)
+        if regulations:
+            save_regulations(*regulations)
+
+        # Generate static pages and sitemap
+        print("\nGenerating static pages and sitemap...")
+        generate_static_pages(final_data)
+        generate_sitemap(final_data)
+
+        print("\n" + "=" * 80)
+        print("UPDATE COMPLETE!")
+        print("=" * 80)
+        print(f"Added {new_records_count} new stocking records")
+        print(f"Total water bodies: {len(final_data)}")
+
+    except IOError as e:
+        print(f"Error writing files: {e}")
 
 if __name__ == "__main__":
     weekly_update()